@@ -162,6 +162,7 @@ def init_task_session(
             "latest_message_id": _max_message_id(normalized_source_ids, fallback=msg_id),
             "source_message_ids": normalized_source_ids,
             "timestamp": ts,
+            "ts_epoch": _timestamp_epoch(ts),
             "instruction": instruction,
             "keywords": _extract_keywords(instruction),
             "result_summary": "(작업 진행 중...)",
@@ -338,6 +339,7 @@ def record_task_change(
             "latest_message_id": _max_message_id(normalized_source_ids, fallback=msg_id),
             "source_message_ids": normalized_source_ids,
             "timestamp": ts,
+            "ts_epoch": _timestamp_epoch(ts),
             "instruction": instruction,
             "keywords": _extract_keywords(instruction),
             "result_summary": result_text[:300],
@@ -401,9 +403,11 @@ def sync_instrunction(
         meta["codex_session"] = codex_session
     if latest_change:
         notes = meta.get("change_notes", [])
+        now = datetime.now()
         notes.append(
             {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+                "ts_epoch": int(now.timestamp()),
                 "note": latest_change.strip(),
             }
         )
@@ -450,7 +454,7 @@ def find_relevant_tasks(
     exclude = exclude_message_ids or set()
     exclude_tasks = {_normalize_task_id(task_id=v) for v in (exclude_task_ids or set()) if _normalize_task_id(task_id=v)}
     scored: list[dict[str, Any]] = []
-    now = datetime.now()
+    now_epoch = int(datetime.now().timestamp())
 
     for task in index.get("tasks", []):
         task_id = _entry_task_id(task)
@@ -478,7 +482,8 @@ def find_relevant_tasks(
 
         overlap_ratio = len(inter) / max(1, len(query_tokens))
         jaccard = len(inter) / max(1, len(query_tokens | doc_tokens))
-        recency = _recency_score(task.get("timestamp"), now)
+        task_epoch = _entry_epoch(task)
+        recency = _recency_score(task_epoch, now_epoch)
 
         score = (0.65 * overlap_ratio) + (0.25 * jaccard) + (0.10 * recency)
         if score < min_score:
@@ -494,6 +499,7 @@ def find_relevant_tasks(
                 "result_excerpt": _short(task.get("result_summary", ""), 140),
                 "task_dir": task.get("task_dir"),
                 "timestamp": task.get("timestamp"),
+                "ts_epoch": task_epoch,
                 "files": task.get("files", [])[:5],
             }
         )
@@ -501,7 +507,7 @@ def find_relevant_tasks(
     scored.sort(
         key=lambda x: (
             x["score"],
-            _parse_epoch(x.get("timestamp")),
+            x.get("ts_epoch") or 0,
             x.get("task_id") or "",
         ),
         reverse=True,
@@ -1196,8 +1202,27 @@ def _parse_epoch(value: Any) -> float:
     return 0.0
 
 
-def _task_sort_key(entry: dict[str, Any]) -> tuple[float, int, str]:
-    ts = _parse_epoch(entry.get("timestamp"))
+def _timestamp_epoch(value: Any) -> int:
+    return int(_parse_epoch(value))
+
+
+def _entry_epoch(entry: dict[str, Any], field: str = "timestamp", epoch_field: str = "ts_epoch") -> int:
+    """
+    Return the integer epoch stored next to a timestamp field.
+
+    Entries written before epoch fields existed are backfilled in place, so the
+    next index save persists them and the text is not parsed again.
+    """
+    value = entry.get(epoch_field)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    epoch = _timestamp_epoch(entry.get(field))
+    entry[epoch_field] = epoch
+    return epoch
+
+
+def _task_sort_key(entry: dict[str, Any]) -> tuple[int, int, str]:
+    ts = _entry_epoch(entry)
     latest_message_id = _safe_int(entry.get("latest_message_id"), _safe_int(entry.get("message_id"), 0))
     return (ts, latest_message_id, _entry_task_id(entry))
 
@@ -1384,12 +1409,17 @@ def _compose_display_fields(
 
     changed = display_title != prev_title or title_state != prev_state
     title_updated_at = event_ts if changed or not prev_updated_at else prev_updated_at
+    if title_updated_at == prev_updated_at and prev_updated_at:
+        title_updated_epoch = _entry_epoch(dict(previous), field="title_updated_at", epoch_field="title_updated_epoch")
+    else:
+        title_updated_epoch = _timestamp_epoch(title_updated_at)
 
     return {
         "display_title": display_title or "새 작업",
         "display_subtitle": subtitle,
         "title_state": title_state,
         "title_updated_at": title_updated_at,
+        "title_updated_epoch": title_updated_epoch,
         "work_status": work_status,
         "ops_status": ops_status,
     }
@@ -1436,14 +1466,10 @@ def _normalize_timestamp(timestamp: str | None) -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def _recency_score(timestamp: Any, now: datetime) -> float:
-    if not timestamp:
-        return 0.0
-    try:
-        dt = datetime.strptime(str(timestamp), "%Y-%m-%d %H:%M:%S")
-    except ValueError:
+def _recency_score(ts_epoch: int, now_epoch: int) -> float:
+    if ts_epoch <= 0:
         return 0.0
-    days = max(0.0, (now - dt).total_seconds() / 86400.0)
+    days = max(0.0, (now_epoch - ts_epoch) / 86400.0)
     return 1.0 / (1.0 + (days / 7.0))
 
 
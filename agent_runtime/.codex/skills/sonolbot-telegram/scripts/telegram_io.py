@@ -12,20 +12,32 @@ Key design:
 
 from __future__ import annotations
 
+import atexit
+import copy
 import json
 import os
+import queue
 import random
 import re
+import shutil
 import socket
+import sqlite3
 import sys
+import threading
 import time
 import errno
-from contextlib import contextmanager
+import hashlib
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from contextlib import ExitStack, contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 try:
     import fcntl  # type: ignore
@@ -41,6 +53,9 @@ except Exception:
 MAX_TELEGRAM_TEXT_LEN = 4096
 MAX_TELEGRAM_FILE_BYTES = 50 * 1024 * 1024
 LOG_RETENTION_DAYS = 7
+DEFAULT_LOG_FLUSH_INTERVAL_SEC = 1.0
+DEFAULT_LOG_BUFFER_BYTES = 64 * 1024
+LOG_BUFFER_HARD_LIMIT_FACTOR = 8
 MESSAGE_RETENTION_DAYS = 7
 DEFAULT_REQUEST_MAX_ATTEMPTS = 4
 DEFAULT_REQUEST_RETRY_DELAY_SEC = 1.0
@@ -51,6 +66,13 @@ DEFAULT_SEND_TEXT_MAX_ATTEMPTS = 4
 DEFAULT_SEND_TEXT_RETRY_DELAY_SEC = 0.5
 DEFAULT_SEND_TEXT_RETRY_BACKOFF = 2.0
 DEFAULT_SEND_TEXT_RETRY_JITTER_SEC = 0.2
+DEFAULT_RATE_GLOBAL_PER_SEC = 30.0
+DEFAULT_RATE_CHAT_PER_SEC = 1.0
+DEFAULT_RATE_GROUP_PER_MIN = 20.0
+DEFAULT_RATE_LIMIT_MAX_WAIT_SEC = 60.0
+RATE_LIMITED_METHOD_PREFIXES = ("send", "edit", "copyMessage", "forwardMessage", "deleteMessage")
+# Matched by the "send" prefix but not a message: typing indicators must not eat a chat's send budget.
+UNPACED_METHODS = frozenset({"sendChatAction"})
 REDACTED_VALUE = "***REDACTED***"
 SECURE_FILE_MODE = 0o600
 SECURE_DIR_MODE = 0o700
@@ -61,6 +83,59 @@ TELEGRAM_API_FALLBACK_IPS = [
     "149.154.167.198",
 ]
 DOH_TIMEOUT_SEC = 5.0
+DEFAULT_NETWORK_DIAG_TTL_SEC = 30.0
+HOST_CACHE_FILENAME = ".telegram_api_hosts.json"
+HOST_CACHE_VERSION = 1
+DEFAULT_HOST_CACHE_TTL_SEC = 6 * 3600.0
+HOST_LATENCY_EWMA_ALPHA = 0.3
+HOST_UNKNOWN_LATENCY_MS = 5000.0
+HOST_FAILURE_PENALTY_MS = 10000.0
+MESSAGE_STORE_BACKEND_JSON = "json"
+MESSAGE_STORE_BACKEND_SQLITE = "sqlite"
+MESSAGE_STORE_BACKEND_SHARDED = "sharded"
+DEFAULT_MESSAGE_STORE_BACKEND = MESSAGE_STORE_BACKEND_JSON
+SQLITE_STORE_SUFFIXES = (".sqlite3", ".sqlite", ".db")
+SQLITE_BUSY_TIMEOUT_SEC = 10.0
+SQLITE_MAX_VARIABLES = 500
+SHARD_DIR_SUFFIX = ".shards"
+SHARD_OFFSET_NAME = "offset.json"
+SHARD_PENDING_VERSION_NAME = "pending_version.json"
+_SHARD_NAME_RE = re.compile(r"^chat_(-?\d+|none)\.json$")
+DEFAULT_RECEIVER_POLL_TIMEOUT_SEC = 30
+MAX_RECEIVER_POLL_TIMEOUT_SEC = 50
+RECEIVER_ERROR_BACKOFF_MIN_SEC = 1.0
+RECEIVER_ERROR_BACKOFF_MAX_SEC = 30.0
+OUTBOX_STATUS_PENDING = "pending"
+OUTBOX_STATUS_SENDING = "sending"
+OUTBOX_STATUS_SENT = "sent"
+OUTBOX_STATUS_FAILED = "failed"
+DEFAULT_OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_REPLY_ATTEMPTS_FACTOR = 4
+DEFAULT_OUTBOX_RETRY_DELAY_SEC = 1.0
+DEFAULT_OUTBOX_RETRY_BACKOFF = 2.0
+OUTBOX_RETRY_MAX_DELAY_SEC = 300.0
+DEFAULT_OUTBOX_CONCURRENCY = 4
+DEFAULT_OUTBOX_IDLE_WAIT_SEC = 30.0
+DEFAULT_OUTBOX_RETENTION_SEC = 3 * 86400
+DEFAULT_HTTP_POOL_SIZE = 16
+DEFAULT_HTTP_MAX_RETRIES = 2
+DEFAULT_HTTP_IDLE_TIMEOUT_SEC = 90.0
+HTTP_POOL_REAP_INTERVAL_SEC = 30.0
+DEFAULT_DOWNLOAD_CONCURRENCY = 4
+MAX_DOWNLOAD_CONCURRENCY = 16
+DEFAULT_DOWNLOAD_TIMEOUT_SEC = 120.0
+DEFAULT_UPLOAD_CONCURRENCY = 3
+MAX_UPLOAD_CONCURRENCY = 8
+MEDIA_GROUP_MAX_ITEMS = 10
+PHOTO_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_UPLOAD_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+DOWNLOAD_STATUS_PENDING = "pending"
+ATTACHMENT_CACHE_DIRNAME = ".file_cache"
+ATTACHMENT_CACHE_INDEX_NAME = "index.json"
+DEFAULT_ATTACHMENT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+MESSAGE_STORE_ORDER_KEY = "ordered_by"
+MESSAGE_STORE_PENDING_VERSION_KEY = "pending_version"
+MESSAGE_STORE_ORDER = "ts_epoch"
 
 _SENSITIVE_KEY_RE = re.compile(
     r"(?i)(token|password|passwd|pwd|secret|api[_-]?key|access[_-]?key|private[_-]?key)"
@@ -77,9 +152,33 @@ _OPENAI_KEY_RE = re.compile(r"\bsk-[A-Za-z0-9]{20,}\b")
 _GITHUB_TOKEN_RE = re.compile(r"\bgh[pousr]_[A-Za-z0-9]{36,}\b")
 _AWS_ACCESS_KEY_RE = re.compile(r"\bAKIA[0-9A-Z]{16}\b")
 _SLACK_TOKEN_RE = re.compile(r"\bxox[baprs]-[A-Za-z0-9-]{10,}\b")
+_SECRET_TOKEN_RE = re.compile(
+    "|".join(
+        f"(?:{pattern.pattern})"
+        for pattern in (_TELEGRAM_BOT_TOKEN_RE, _OPENAI_KEY_RE, _GITHUB_TOKEN_RE, _AWS_ACCESS_KEY_RE, _SLACK_TOKEN_RE)
+    )
+)
+
+_HTML_TOKEN_RE = re.compile(r"<[^<>]*>|&(?:#\d+|#x[0-9A-Fa-f]+|[A-Za-z]+);")
+_HTML_TAG_NAME_RE = re.compile(r"<(/?)([A-Za-z][\w-]*)")
+
+_HOST_CACHES: dict[str, "_TelegramHostCache"] = {}
+_HOST_FAILOVER: dict[str, str] = {}
+_HOST_REPROBES: dict[str, threading.Thread] = {}
+_HOST_LOCK = threading.Lock()
+
+_NETWORK_DIAG: dict[str, Any] = {"id": None, "collected_at": 0.0, "snapshot": None, "thread": None, "seq": 0}
+_NETWORK_DIAG_LOCK = threading.Lock()
+
+_LOG_WRITER: "_BufferedLogWriter | None" = None
+_LOG_WRITER_LOCK = threading.Lock()
 
 _HTTP_SESSION: requests.Session | None = None
+_HTTP_POOL: "_HttpPoolManager | None" = None
+_HTTP_POOL_LOCK = threading.Lock()
 _RECENT_SEND_KEYS: dict[str, float] = {}
+_SEND_SCHEDULERS: dict[str, "_SendScheduler"] = {}
+_SEND_SCHEDULERS_LOCK = threading.Lock()
 
 
 def _resolve_via_doh_google(domain: str) -> str | None:
@@ -134,44 +233,202 @@ def _test_telegram_host(host: str, token: str, timeout_sec: float) -> bool:
     return False
 
 
-def _update_env_file(work_dir: Path, key: str, value: str) -> bool:
-    """Update or add a key-value pair in .env file."""
-    env_path = work_dir / ".env"
-    lines: list[str] = []
-
-    if env_path.exists():
-        try:
-            lines = env_path.read_text(encoding="utf-8").splitlines()
-        except Exception:
-            return False
-
-    key_pattern = re.compile(f"^{re.escape(key)}\\s*=")
-    updated = False
-    new_lines = []
+class _TelegramHostCache:
+    """
+    On-disk health record of candidate API hosts.
 
-    for line in lines:
-        if key_pattern.match(line):
-            new_lines.append(f"{key}={value}")
-            updated = True
-        else:
-            new_lines.append(line)
+    Each host keeps an EWMA probe latency and a consecutive-failure count; the
+    best host is the one with the lowest `latency + failures * penalty` score.
+    Several bots may share one cache file: `save()` merges with the file under
+    its lock, keeping the newest observation of each host, so no writer drops
+    another's probe results.
+    """
 
-    if not updated:
-        new_lines.append(f"{key}={value}")
+    def __init__(self, path: Path, ttl_sec: float) -> None:
+        self.path = path
+        self.ttl_sec = max(1.0, float(ttl_sec))
+        self._lock = threading.Lock()
+        self.hosts: dict[str, dict[str, Any]] = {}
+        self.probed_at = 0.0
+        self._load()
 
-    try:
-        temp_path = env_path.with_suffix(".env.tmp")
-        temp_path.write_text("\n".join(new_lines) + "\n", encoding="utf-8")
-        temp_path.replace(env_path)
-        _ensure_private_file(env_path)
-        return True
-    except Exception:
+    def _read(self) -> tuple[dict[str, dict[str, Any]], float] | None:
         try:
-            if temp_path.exists():
-                temp_path.unlink()
-        except Exception:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("version") != HOST_CACHE_VERSION:
+            return None
+        hosts = data.get("hosts")
+        if not isinstance(hosts, dict):
+            hosts = {}
+        entries = {str(host): dict(entry) for host, entry in hosts.items() if isinstance(entry, dict)}
+        return entries, float(data.get("probed_at") or 0.0)
+
+    def _load(self) -> None:
+        stored = self._read()
+        if stored is not None:
+            self.hosts, self.probed_at = stored
+
+    def save(self) -> None:
+        try:
+            with _message_store_lock(self.path):
+                stored = self._read()
+                with self._lock:
+                    if stored is not None:
+                        hosts, probed_at = stored
+                        for host, entry in hosts.items():
+                            mine = self.hosts.get(host)
+                            if mine is None or _host_entry_seen_at(entry) > _host_entry_seen_at(mine):
+                                self.hosts[host] = entry
+                        self.probed_at = max(self.probed_at, probed_at)
+                    data = {"version": HOST_CACHE_VERSION, "probed_at": self.probed_at, "hosts": dict(self.hosts)}
+                _write_private_json(self.path, data)
+        except OSError:
             pass
-        return False
+
+    def record(self, host: str, latency_ms: float | None, source: str | None = None) -> None:
+        """Record one probe or request outcome; `latency_ms=None` means failure."""
+        now = time.time()
+        with self._lock:
+            entry = self.hosts.setdefault(host, {"latency_ms": None, "failures": 0})
+            if source:
+                entry["source"] = source
+            if latency_ms is None:
+                entry["failures"] = int(entry.get("failures") or 0) + 1
+                entry["last_fail"] = now
+                return
+            previous = entry.get("latency_ms")
+            entry["latency_ms"] = round(
+                float(latency_ms)
+                if previous is None
+                else previous + HOST_LATENCY_EWMA_ALPHA * (float(latency_ms) - previous),
+                1,
+            )
+            entry["failures"] = 0
+            entry["last_ok"] = now
+
+    def score(self, host: str) -> float:
+        with self._lock:
+            entry = self.hosts.get(host) or {}
+            latency = entry.get("latency_ms")
+            failures = int(entry.get("failures") or 0)
+        base = HOST_UNKNOWN_LATENCY_MS if latency is None else float(latency)
+        return base + failures * HOST_FAILURE_PENALTY_MS
+
+    def healthy(self) -> list[str]:
+        """Hosts whose last probe or request succeeded, best first."""
+        with self._lock:
+            hosts = [
+                host
+                for host, entry in self.hosts.items()
+                if entry.get("latency_ms") is not None and not int(entry.get("failures") or 0)
+            ]
+        return sorted(hosts, key=self.score)
+
+    def is_healthy(self, host: str) -> bool:
+        with self._lock:
+            entry = self.hosts.get(host) or {}
+            return entry.get("latency_ms") is not None and not int(entry.get("failures") or 0)
+
+    def best(self) -> str | None:
+        healthy = self.healthy()
+        return healthy[0] if healthy else None
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.probed_at < self.ttl_sec
+
+
+def _host_entry_seen_at(entry: dict[str, Any]) -> float:
+    """When a host was last probed or used, whatever the outcome."""
+    return max(float(entry.get("last_ok") or 0.0), float(entry.get("last_fail") or 0.0))
+
+
+def _host_cache_path(work_dir: Path) -> Path:
+    raw = (os.getenv("TELEGRAM_HOST_CACHE_FILE", "") or "").strip()
+    return Path(raw).expanduser().resolve() if raw else work_dir / HOST_CACHE_FILENAME
+
+
+def _host_cache(path: Path) -> _TelegramHostCache:
+    key = str(path)
+    with _HOST_LOCK:
+        cache = _HOST_CACHES.get(key)
+        if cache is None:
+            ttl_sec = _env_positive_float("TELEGRAM_HOST_CACHE_TTL_SEC", DEFAULT_HOST_CACHE_TTL_SEC)
+            cache = _TelegramHostCache(path, ttl_sec)
+            _HOST_CACHES[key] = cache
+        return cache
+
+
+def _probe_host_latency_ms(host: str, token: str, timeout_sec: float) -> float | None:
+    started = time.monotonic()
+    if not _test_telegram_host(host, token, timeout_sec):
+        return None
+    return (time.monotonic() - started) * 1000.0
+
+
+def _host_candidates(cache: _TelegramHostCache) -> list[tuple[str, str]]:
+    candidates: list[tuple[str, str]] = [(TELEGRAM_API_DOMAIN, "default_domain")]
+    for source, resolver in (("google_doh", _resolve_via_doh_google), ("cloudflare_doh", _resolve_via_doh_cloudflare)):
+        doh_ip = resolver(TELEGRAM_API_DOMAIN)
+        if doh_ip:
+            candidates.append((doh_ip, source))
+    candidates.extend((ip, "fallback_ip") for ip in TELEGRAM_API_FALLBACK_IPS)
+    with cache._lock:
+        known = [(host, str(entry.get("source") or "cache")) for host, entry in cache.hosts.items()]
+    seen: set[str] = set()
+    unique: list[tuple[str, str]] = []
+    for host, source in candidates + known:
+        if host not in seen:
+            seen.add(host)
+            unique.append((host, source))
+    return unique
+
+
+def _reprobe_telegram_hosts(cache: _TelegramHostCache, token: str, timeout_sec: float) -> None:
+    """Probe every candidate in parallel and persist the scores."""
+    candidates = _host_candidates(cache)
+    with ThreadPoolExecutor(max_workers=max(1, len(candidates)), thread_name_prefix="telegram-host-probe") as pool:
+        futures = {
+            host: (source, pool.submit(_probe_host_latency_ms, host, token, timeout_sec))
+            for host, source in candidates
+        }
+        for host, (source, future) in futures.items():
+            cache.record(host, future.result(), source=source)
+    cache.probed_at = time.time()
+    cache.save()
+    _refresh_host_failover(cache)
+
+
+def _refresh_host_failover(cache: _TelegramHostCache) -> None:
+    """Drop failovers whose origin is healthy again; move ones pointing at a now-failing host."""
+    with _HOST_LOCK:
+        for origin, target in list(_HOST_FAILOVER.items()):
+            if cache.is_healthy(origin):
+                del _HOST_FAILOVER[origin]
+            elif not cache.is_healthy(target):
+                best = cache.best()
+                if best and best != origin:
+                    _HOST_FAILOVER[origin] = best
+                else:
+                    del _HOST_FAILOVER[origin]
+
+
+def _start_host_reprobe(cache: _TelegramHostCache, token: str, timeout_sec: float) -> bool:
+    key = str(cache.path)
+    with _HOST_LOCK:
+        running = _HOST_REPROBES.get(key)
+        if running is not None and running.is_alive():
+            return False
+        thread = threading.Thread(
+            target=_reprobe_telegram_hosts,
+            args=(cache, token, timeout_sec),
+            name="telegram-host-reprobe",
+            daemon=True,
+        )
+        _HOST_REPROBES[key] = thread
+    thread.start()
+    return True
 
 
 def _determine_telegram_api_host(
@@ -184,13 +441,13 @@ def _determine_telegram_api_host(
     Determine the best Telegram API host to use.
 
     Strategy:
-    1. Check TELEGRAM_API_HOST env var
-    2. Try default domain (api.telegram.org)
-    3. Try Google DoH
-    4. Try Cloudflare DoH
-    5. Try fallback IPs
-
-    If DoH succeeds, save to .env for future use.
+    1. TELEGRAM_API_HOST env var pins the host (no cache, no failover)
+    2. Use the best healthy host from the on-disk host cache immediately;
+       re-probe all candidates in the background once the cache is older
+       than TELEGRAM_HOST_CACHE_TTL_SEC
+    3. Cold cache: try the default domain, Google DoH, Cloudflare DoH and the
+       fallback IPs in order, record the results, and fill in the remaining
+       scores in the background
     """
     def log(event: str, details: dict[str, Any]) -> None:
         if log_callback:
@@ -201,37 +458,106 @@ def _determine_telegram_api_host(
         log("telegram_host_decision", {"source": "env_var", "host": env_host})
         return env_host
 
-    if _test_telegram_host(TELEGRAM_API_DOMAIN, token, timeout_sec):
-        log("telegram_host_decision", {"source": "default_domain", "host": TELEGRAM_API_DOMAIN})
+    cache = _host_cache(_host_cache_path(work_dir))
+    cached_host = cache.best()
+    if cached_host:
+        fresh = cache.is_fresh()
+        if not fresh:
+            _start_host_reprobe(cache, token, timeout_sec)
+        log("telegram_host_decision", {"source": "host_cache", "host": cached_host, "fresh": fresh})
+        return cached_host
+
+    def try_host(host: str | None, source: str) -> bool:
+        if not host:
+            return False
+        latency_ms = _probe_host_latency_ms(host, token, timeout_sec)
+        cache.record(host, latency_ms, source=source)
+        if latency_ms is None:
+            return False
+        log("telegram_host_decision", {"source": source, "host": host})
+        return True
+
+    chosen: str | None = None
+    if try_host(TELEGRAM_API_DOMAIN, "default_domain"):
+        chosen = TELEGRAM_API_DOMAIN
+    else:
+        log("telegram_host_decision", {"event": "default_domain_failed", "trying": "doh"})
+        for source, resolver in (("google_doh", _resolve_via_doh_google), ("cloudflare_doh", _resolve_via_doh_cloudflare)):
+            doh_ip = resolver(TELEGRAM_API_DOMAIN)
+            if try_host(doh_ip, source):
+                chosen = doh_ip
+                break
+    if chosen is None:
+        log("telegram_host_decision", {"event": "doh_failed", "trying": "fallback_ips"})
+        chosen = next((ip for ip in TELEGRAM_API_FALLBACK_IPS if try_host(ip, "fallback_ip")), None)
+
+    cache.save()
+    # Score the candidates that were not tried so the next start and any failover can use them.
+    _start_host_reprobe(cache, token, timeout_sec)
+    if chosen is None:
+        log("telegram_host_decision", {"source": "final_fallback", "host": TELEGRAM_API_DOMAIN})
         return TELEGRAM_API_DOMAIN
+    return chosen
 
-    log("telegram_host_decision", {"event": "default_domain_failed", "trying": "doh"})
 
-    doh_ip = _resolve_via_doh_google(TELEGRAM_API_DOMAIN)
-    if doh_ip and _test_telegram_host(doh_ip, token, timeout_sec):
-        log("telegram_host_decision", {"source": "google_doh", "host": doh_ip})
-        if _update_env_file(work_dir, "TELEGRAM_API_HOST", doh_ip):
-            log("telegram_host_decision", {"event": "env_updated", "key": "TELEGRAM_API_HOST", "value": doh_ip})
-        return doh_ip
+def _active_api_host(runtime: dict[str, Any]) -> str:
+    """The host requests for this runtime currently go to (its failover target, if any)."""
+    host = str(runtime.get("api_host") or "")
+    if not host:
+        return ""
+    with _HOST_LOCK:
+        return _HOST_FAILOVER.get(host) or host
 
-    doh_ip = _resolve_via_doh_cloudflare(TELEGRAM_API_DOMAIN)
-    if doh_ip and _test_telegram_host(doh_ip, token, timeout_sec):
-        log("telegram_host_decision", {"source": "cloudflare_doh", "host": doh_ip})
-        if _update_env_file(work_dir, "TELEGRAM_API_HOST", doh_ip):
-            log("telegram_host_decision", {"event": "env_updated", "key": "TELEGRAM_API_HOST", "value": doh_ip})
-        return doh_ip
 
-    log("telegram_host_decision", {"event": "doh_failed", "trying": "fallback_ips"})
+def _effective_base(runtime: dict[str, Any], key: str, active_host: str | None = None) -> str:
+    """`runtime[key]` with the API host swapped for its current failover target."""
+    base = str(runtime[key])
+    host = str(runtime.get("api_host") or "")
+    if not host:
+        return base
+    target = _active_api_host(runtime) if active_host is None else active_host
+    if not target or target == host:
+        return base
+    return base.replace(f"://{host}/", f"://{target}/", 1)
 
-    for fallback_ip in TELEGRAM_API_FALLBACK_IPS:
-        if _test_telegram_host(fallback_ip, token, timeout_sec):
-            log("telegram_host_decision", {"source": "fallback_ip", "host": fallback_ip})
-            if _update_env_file(work_dir, "TELEGRAM_API_HOST", fallback_ip):
-                log("telegram_host_decision", {"event": "env_updated", "key": "TELEGRAM_API_HOST", "value": fallback_ip})
-            return fallback_ip
 
-    log("telegram_host_decision", {"source": "final_fallback", "host": TELEGRAM_API_DOMAIN})
-    return TELEGRAM_API_DOMAIN
+def _telegram_host_failover(runtime: dict[str, Any], failed_host: str) -> str | None:
+    """
+    Mark `failed_host` (the host the failing request used) as failing and
+    switch to the best healthy candidate.
+
+    The switch is process-wide (keyed by the host the runtime was built with),
+    so runtime copies held by worker threads follow it too. It is a
+    compare-and-swap: when a concurrent request already moved away from
+    `failed_host`, its choice is kept instead of penalising that host as well.
+    Only hosts with a successful probe and no failures since are targets.
+    Returns the host to retry on, or None when the host is pinned or nothing
+    healthy is left.
+    """
+    origin = str(runtime.get("api_host") or "")
+    cache_file = str(runtime.get("api_host_cache_file") or "")
+    if not origin or not cache_file or runtime.get("api_host_pinned") or not failed_host:
+        return None
+    cache = _host_cache(Path(cache_file))
+    cache.record(failed_host, None)
+    candidates = [host for host in cache.healthy() if host != failed_host]
+    with _HOST_LOCK:
+        current = _HOST_FAILOVER.get(origin, origin)
+        if current != failed_host:
+            target: str | None = current
+        elif candidates:
+            target = candidates[0]
+            if target == origin:
+                _HOST_FAILOVER.pop(origin, None)
+            else:
+                _HOST_FAILOVER[origin] = target
+        else:
+            target = None
+    cache.save()
+    token = str(runtime.get("telegram_bot_token") or "")
+    if token:
+        _start_host_reprobe(cache, token, min(float(runtime.get("api_timeout_sec", 10.0)), 10.0))
+    return target
 
 
 def build_runtime_vars(ai_vars: dict[str, Any]) -> dict[str, Any]:
@@ -251,6 +577,19 @@ def build_runtime_vars(ai_vars: dict[str, Any]) -> dict[str, Any]:
     polling_timeout_sec = int(ai_vars.get("polling_timeout_sec", 5))
     message_retention_days = max(1, int(ai_vars.get("message_retention_days", MESSAGE_RETENTION_DAYS)))
     max_file_bytes = max(1, int(ai_vars.get("max_telegram_file_bytes", MAX_TELEGRAM_FILE_BYTES)))
+    download_concurrency = max(
+        1,
+        min(MAX_DOWNLOAD_CONCURRENCY, int(ai_vars.get("download_concurrency", DEFAULT_DOWNLOAD_CONCURRENCY))),
+    )
+    download_timeout_sec = max(1.0, float(ai_vars.get("download_timeout_sec", DEFAULT_DOWNLOAD_TIMEOUT_SEC)))
+    upload_concurrency = max(
+        1,
+        min(MAX_UPLOAD_CONCURRENCY, int(ai_vars.get("upload_concurrency", DEFAULT_UPLOAD_CONCURRENCY))),
+    )
+    attachment_cache_dir = Path(ai_vars.get("attachment_cache_dir") or (tasks_dir / ATTACHMENT_CACHE_DIRNAME)).resolve()
+    attachment_cache_max_bytes = max(
+        0, int(ai_vars.get("attachment_cache_max_bytes", DEFAULT_ATTACHMENT_CACHE_MAX_BYTES))
+    )
 
     logs_dir.mkdir(parents=True, exist_ok=True)
     _ensure_private_dir(logs_dir)
@@ -266,6 +605,7 @@ def build_runtime_vars(ai_vars: dict[str, Any]) -> dict[str, Any]:
         timeout_sec=min(api_timeout_sec, 10.0),
         log_callback=log_host_decision,
     )
+    api_host_pinned = bool(os.getenv("TELEGRAM_API_HOST", "").strip())
 
     for log_entry in host_decision_log:
         _write_log_direct(
@@ -287,7 +627,14 @@ def build_runtime_vars(ai_vars: dict[str, Any]) -> dict[str, Any]:
         "polling_timeout_sec": polling_timeout_sec,
         "message_retention_days": message_retention_days,
         "max_telegram_file_bytes": max_file_bytes,
+        "download_concurrency": download_concurrency,
+        "download_timeout_sec": download_timeout_sec,
+        "upload_concurrency": upload_concurrency,
+        "attachment_cache_dir": str(attachment_cache_dir),
+        "attachment_cache_max_bytes": attachment_cache_max_bytes,
         "api_host": api_host,
+        "api_host_pinned": api_host_pinned,
+        "api_host_cache_file": str(_host_cache_path(work_dir)),
         "api_base": f"https://{api_host}/bot{token}",
         "file_base": f"https://{api_host}/file/bot{token}",
     }
@@ -300,6 +647,27 @@ def _message_store_key(msg: dict[str, Any]) -> str:
     return f"{msg_type}:{chat_id}:{message_id}"
 
 
+def _filter_pending_messages(messages: list[dict[str, Any]], include_bot: bool) -> list[dict[str, Any]]:
+    out = []
+    for msg in messages:
+        if not isinstance(msg, dict):
+            continue
+        if msg.get("processed", False):
+            continue
+        if not include_bot and msg.get("type", "user") != "user":
+            continue
+        out.append(msg)
+    return out
+
+
+def _normalize_roles(roles: Any) -> set[str] | None:
+    if roles is None:
+        return None
+    if isinstance(roles, str):
+        roles = [roles]
+    return {str(role).strip().lower() for role in roles if str(role).strip()}
+
+
 def _load_message_store_unlocked(path: Path) -> dict[str, Any]:
     if not path.exists():
         return {"messages": [], "last_update_id": 0}
@@ -309,11 +677,45 @@ def _load_message_store_unlocked(path: Path) -> dict[str, Any]:
         return {"messages": [], "last_update_id": 0}
 
 
+def _redact_store_record(msg: dict[str, Any]) -> dict[str, Any]:
+    """Redact one store record once; records already marked `redacted` are returned as-is."""
+    if msg.get("redacted") is True:
+        return msg
+    record = _redact_sensitive_payload(msg)
+    record["redacted"] = True
+    return record
+
+
+def _merge_attachment_update(record: dict[str, Any], source: dict[str, Any]) -> dict[str, Any]:
+    """Copy resolved `files` / `download_pending` from `source` onto a stored record."""
+    updated = {key: value for key, value in record.items() if key != "redacted"}
+    updated["files"] = [dict(item) for item in source.get("files") or [] if isinstance(item, dict)]
+    if source.get("download_pending"):
+        updated["download_pending"] = True
+    else:
+        updated.pop("download_pending", None)
+    return _redact_store_record(updated)
+
+
 def _save_message_store_unlocked(path: Path, data: dict[str, Any]) -> None:
+    # Records are redacted when they enter the store; only unmarked (legacy or
+    # externally written) records pay for the walk here. `data` is updated in
+    # place so callers keep working on the on-disk form.
+    sanitized: dict[str, Any] = {}
+    for key, value in data.items():
+        if key == "messages" and isinstance(value, list):
+            value = [_redact_store_record(msg) if isinstance(msg, dict) else msg for msg in value]
+            data[key] = value
+            sanitized[key] = value
+        else:
+            sanitized[key] = _redact_sensitive_payload(value, parent_key=str(key))
+    _write_private_json(path, sanitized)
+
+
+def _write_private_json(path: Path, data: Any) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     _ensure_private_dir(path.parent)
-    sanitized = _redact_sensitive_payload(data)
-    payload = json.dumps(sanitized, ensure_ascii=False, indent=2)
+    payload = json.dumps(data, ensure_ascii=False, indent=2)
     tmp = path.with_name(f".{path.name}.tmp.{os.getpid()}.{time.time_ns()}")
     try:
         tmp.write_text(payload, encoding="utf-8")
@@ -374,88 +776,1089 @@ def _message_store_lock(path: Path):
             pass
 
 
-def load_message_store(store_path: str) -> dict[str, Any]:
-    """Load message store from disk."""
-    return _load_message_store_unlocked(Path(store_path))
+class _JsonMessageStore:
+    """
+    Single-file JSON store. Every write rewrites the whole file under flock.
+
+    Unprocessed records are mirrored into a small `<store>.pending.json` sidecar
+    with a version counter, so pending reads never parse the full history. The
+    sidecar remembers the store file signature it was built from and is rebuilt
+    whenever the store was changed behind its back. The counter is also kept in
+    the store itself, so a deleted or corrupt sidecar never resets it.
+    `on_pending_change()` runs whenever the counter moves.
+    """
 
+    backend = MESSAGE_STORE_BACKEND_JSON
 
-def save_message_store(store_path: str, data: dict[str, Any]) -> None:
-    """Save message store to disk."""
-    p = Path(store_path)
-    with _message_store_lock(p):
-        _save_message_store_unlocked(p, data)
+    def __init__(self, path: Path, on_pending_change: Any = None) -> None:
+        self.path = path
+        self.pending_index_path = path.with_name(f"{path.name}.pending.json")
+        self.on_pending_change = on_pending_change
 
+    def _store_signature(self) -> list[int] | None:
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return [int(st.st_mtime_ns), int(st.st_size)]
 
-def append_messages_to_store(
-    store_path: str,
-    new_messages: list[dict[str, Any]],
-    new_last_update_id: int | None,
-) -> dict[str, Any]:
-    """Append new messages and update last_update_id."""
-    p = Path(store_path)
-    with _message_store_lock(p):
-        data = _load_message_store_unlocked(p)
-        data.setdefault("messages", [])
-        data.setdefault("last_update_id", 0)
-        changed = False
+    def _read_pending_index(self) -> dict[str, Any] | None:
+        try:
+            index = json.loads(self.pending_index_path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        return index if isinstance(index, dict) else None
+
+    def _build_pending_index(self, data: dict[str, Any], bump: bool, previous: dict[str, Any]) -> dict[str, Any]:
+        """Build the sidecar for `data` and stamp its version into `data`; it only ever moves forward."""
+        pending = _filter_pending_messages(data.get("messages", []), include_bot=True)
+        keys = sorted(_message_store_key(msg) for msg in pending)
+        version = max(
+            int(data.get(MESSAGE_STORE_PENDING_VERSION_KEY, 0) or 0),
+            int(previous.get("version", 0) or 0),
+        )
+        if bump or previous.get("keys") != keys:
+            version += 1
+        data[MESSAGE_STORE_PENDING_VERSION_KEY] = version
+        chat_ids = sorted({msg.get("chat_id") for msg in pending if isinstance(msg.get("chat_id"), int)})
+        return {
+            "version": version,
+            "store_signature": None,
+            "keys": keys,
+            "chat_ids": chat_ids,
+            "oldest_epoch": _oldest_message_epoch(data),
+            "messages": pending,
+        }
 
-        if new_messages:
+    def _write_pending_index_unlocked(self, data: dict[str, Any], bump: bool = False) -> dict[str, Any]:
+        stored_version = data.get(MESSAGE_STORE_PENDING_VERSION_KEY)
+        previous = self._read_pending_index() or {}
+        index = self._build_pending_index(data, bump, previous)
+        if index["version"] != stored_version and self.path.exists():
+            # Persist a moved counter, or losing the sidecar again would hand out this version twice.
+            _save_message_store_unlocked(self.path, data)
+        index["store_signature"] = self._store_signature()
+        _save_message_store_unlocked(self.pending_index_path, index)
+        self._notify_pending_change(previous, index)
+        return index
+
+    def _save_unlocked(self, data: dict[str, Any], bump_pending: bool = False) -> None:
+        previous = self._read_pending_index() or {}
+        index = self._build_pending_index(data, bump_pending, previous)
+        _save_message_store_unlocked(self.path, data)
+        index["store_signature"] = self._store_signature()
+        _save_message_store_unlocked(self.pending_index_path, index)
+        self._notify_pending_change(previous, index)
+
+    def _notify_pending_change(self, previous: dict[str, Any], index: dict[str, Any]) -> None:
+        if self.on_pending_change is not None and index["version"] != previous.get("version"):
+            self.on_pending_change()
+
+    def _pending_index(self) -> dict[str, Any]:
+        index = self._read_pending_index()
+        if index is not None and index.get("store_signature") == self._store_signature():
+            return index
+        with _message_store_lock(self.path):
+            index = self._read_pending_index()
+            if index is not None and index.get("store_signature") == self._store_signature():
+                return index
+            return self._write_pending_index_unlocked(_load_message_store_unlocked(self.path))
+
+    def load(self) -> dict[str, Any]:
+        return _load_message_store_unlocked(self.path)
+
+    def save(self, data: dict[str, Any]) -> None:
+        with _message_store_lock(self.path):
+            data.pop(MESSAGE_STORE_ORDER_KEY, None)
+            _ensure_messages_ordered(data)
+            self._save_unlocked(data)
+            # A wholesale rewrite: the next read rebuilds the per-chat index.
+            _drop_chat_index(self.path)
+
+    def last_update_id(self) -> int:
+        with _message_store_lock(self.path):
+            current = _load_message_store_unlocked(self.path)
+        return int(current.get("last_update_id", 0))
+
+    def append(
+        self,
+        new_messages: list[dict[str, Any]],
+        new_last_update_id: int | None,
+        retention_days: int | None = None,
+    ) -> dict[str, Any]:
+        with _message_store_lock(self.path):
+            before = self._store_signature()
+            data = _load_message_store_unlocked(self.path)
+            data.setdefault("messages", [])
+            data.setdefault("last_update_id", 0)
+            changed = _ensure_messages_ordered(data)
             existing_keys = {_message_store_key(msg) for msg in data.get("messages", [])}
-            to_append: list[dict[str, Any]] = []
-            for msg in new_messages:
+            appended: list[dict[str, Any]] = []
+            inserted: list[dict[str, Any]] = []
+            for msg in new_messages or []:
                 dedupe_key = _message_store_key(msg)
                 if dedupe_key in existing_keys:
                     continue
                 existing_keys.add(dedupe_key)
-                to_append.append(msg)
-            if to_append:
-                data["messages"].extend(to_append)
+                record = _redact_store_record(msg)
+                _insert_message_ordered(data["messages"], record)
+                inserted.append(record)
+                appended.append(msg)
+
+            changed = changed or bool(appended)
+            if new_last_update_id is not None and new_last_update_id > int(data["last_update_id"]):
+                data["last_update_id"] = int(new_last_update_id)
                 changed = True
 
-        if new_last_update_id is not None and new_last_update_id > int(data["last_update_id"]):
-            data["last_update_id"] = int(new_last_update_id)
-            changed = True
+            removed = 0
+            pruned: list[dict[str, Any]] = []
+            if retention_days is not None:
+                removed = _prune_message_store_data(data, retention_days=retention_days, removed_out=pruned)
+                if removed > 0:
+                    changed = True
+
+            if changed:
+                self._save_unlocked(data)
+                self._sync_chat_index(before, removed=pruned, inserted=inserted)
+            return {
+                "appended": appended,
+                "removed": removed,
+                "remaining": len(data.get("messages", [])),
+                "last_update_id": int(data.get("last_update_id", 0)),
+            }
 
-        if changed:
-            _save_message_store_unlocked(p, data)
-        return data
+    def pending(self, include_bot: bool = False) -> list[dict[str, Any]]:
+        return _filter_pending_messages(self._pending_index().get("messages", []), include_bot)
+
+    def pending_version(self) -> int:
+        return int(self._pending_index().get("version", 0) or 0)
+
+    def _chat_index(self) -> dict[int, tuple[list[int], list[dict[str, Any]]]]:
+        """
+        Per-chat `(epochs, records)` lists sorted by time.
+
+        Built by parsing the store once; the writes of this process then patch
+        it in place of a rebuild (see `_sync_chat_index`). Only a write from
+        elsewhere, detected by the file signature, forces a new parse.
+        """
+        signature = self._store_signature()
+        key = str(self.path)
+        with _CHAT_INDEX_LOCK:
+            cached = _CHAT_INDEX_CACHE.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        buckets: dict[int, list[tuple[int, int, dict[str, Any]]]] = {}
+        for seq, msg in enumerate(self.load().get("messages", [])):
+            chat_id = _record_chat_id(msg)
+            if chat_id is None:
+                continue
+            buckets.setdefault(chat_id, []).append((_message_epoch(msg), seq, msg))
+        index: dict[int, tuple[list[int], list[dict[str, Any]]]] = {}
+        for chat_id, rows in buckets.items():
+            rows.sort(key=lambda row: (row[0], row[1]))
+            index[chat_id] = ([row[0] for row in rows], [row[2] for row in rows])
+        with _CHAT_INDEX_LOCK:
+            _CHAT_INDEX_CACHE[key] = (signature, index)
+        return index
+
+    def _sync_chat_index(
+        self,
+        before: list[int] | None,
+        *,
+        inserted: list[dict[str, Any]] | None = None,
+        updated: list[dict[str, Any]] | None = None,
+        removed: list[dict[str, Any]] | None = None,
+    ) -> None:
+        """
+        Apply one write to the cached per-chat index (call under the store lock,
+        after saving). `before` is the store signature the write started from;
+        if the cache was not built from it, the cache is dropped instead.
+        Touched chats get new lists and records are copied in, so readers
+        holding the previous index never see it change.
+        """
+        key = str(self.path)
+        with _CHAT_INDEX_LOCK:
+            cached = _CHAT_INDEX_CACHE.get(key)
+            if cached is None:
+                return
+            index = None
+            if cached[0] == before:
+                index = _patch_chat_index(cached[1], inserted or [], updated or [], removed or [])
+            if index is None:
+                _CHAT_INDEX_CACHE.pop(key, None)
+                return
+            _CHAT_INDEX_CACHE[key] = (self._store_signature(), index)
+
+    def messages_for_chat(
+        self,
+        chat_id: int,
+        since: int | None = None,
+        until: int | None = None,
+        limit: int | None = None,
+        roles: set[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        entry = self._chat_index().get(int(chat_id))
+        if entry is None:
+            return []
+        keys, rows = entry
+        # Records without a timestamp carry ts_epoch 0 and only match open-ended ranges.
+        lo = bisect_left(keys, max(1, since)) if since is not None else 0
+        hi = bisect_right(keys, until) if until is not None else len(keys)
+        out: list[dict[str, Any]] = []
+        for pos in range(hi - 1, lo - 1, -1):
+            msg = rows[pos]
+            if roles is not None and str(msg.get("type") or "user").lower() not in roles:
+                continue
+            # Index records are shared with every reader; hand out private copies.
+            out.append(copy.deepcopy(msg))
+            if limit is not None and len(out) >= limit:
+                break
+        return out
 
+    def mark_processed(self, targets: set[int], chat_id: int | None = None) -> int:
+        with _message_store_lock(self.path):
+            before = self._store_signature()
+            data = _load_message_store_unlocked(self.path)
+            updated: list[dict[str, Any]] = []
+            for msg in data.get("messages", []):
+                mid = msg.get("message_id")
+                if chat_id is not None and _record_chat_id(msg) != int(chat_id):
+                    continue
+                if isinstance(mid, int) and mid in targets and not msg.get("processed", False):
+                    msg["processed"] = True
+                    updated.append(msg)
+            if updated:
+                self._save_unlocked(data)
+                self._sync_chat_index(before, updated=updated)
+            return len(updated)
+
+    def update_attachments(self, messages: list[dict[str, Any]]) -> int:
+        updates = {_message_store_key(msg): msg for msg in messages if msg.get("type", "user") != "bot"}
+        if not updates:
+            return 0
+        with _message_store_lock(self.path):
+            before = self._store_signature()
+            data = _load_message_store_unlocked(self.path)
+            records = data.get("messages", [])
+            updated: list[dict[str, Any]] = []
+            for idx, record in enumerate(records):
+                if not isinstance(record, dict) or record.get("type", "user") == "bot":
+                    continue
+                source = updates.get(_message_store_key(record))
+                if source is None:
+                    continue
+                records[idx] = _merge_attachment_update(record, source)
+                updated.append(records[idx])
+            if updated:
+                self._save_unlocked(data, bump_pending=True)
+                self._sync_chat_index(before, updated=updated)
+            return len(updated)
+
+    def prune(self, retention_days: int) -> dict[str, Any]:
+        cutoff_epoch = int(time.time()) - max(1, retention_days) * 86400
+        oldest = self._pending_index().get("oldest_epoch")
+        if isinstance(oldest, int) and (oldest <= 0 or oldest >= cutoff_epoch):
+            # Nothing has crossed the cutoff yet; skip loading the store.
+            return {"removed": 0, "remaining": None}
+        with _message_store_lock(self.path):
+            before = self._store_signature()
+            data = _load_message_store_unlocked(self.path)
+            reordered = _ensure_messages_ordered(data)
+            pruned: list[dict[str, Any]] = []
+            removed = _prune_message_store_data(data, retention_days=retention_days, removed_out=pruned)
+            if removed or reordered:
+                self._save_unlocked(data)
+                self._sync_chat_index(before, removed=pruned)
+            return {"removed": removed, "remaining": len(data.get("messages", []))}
+
+    def add_bot_response(self, entry: dict[str, Any]) -> None:
+        with _message_store_lock(self.path):
+            before = self._store_signature()
+            data = _load_message_store_unlocked(self.path)
+            data.setdefault("messages", [])
+            _ensure_messages_ordered(data)
+            record = _redact_store_record(entry)
+            _insert_message_ordered(data["messages"], record)
+            self._save_unlocked(data)
+            self._sync_chat_index(before, inserted=[record])
+
+
+_CHAT_INDEX_CACHE: dict[str, tuple[list[int] | None, dict[int, tuple[list[int], list[dict[str, Any]]]]]] = {}
+_CHAT_INDEX_LOCK = threading.Lock()
+
+
+def _drop_chat_index(path: Path) -> None:
+    with _CHAT_INDEX_LOCK:
+        _CHAT_INDEX_CACHE.pop(str(path), None)
+
+
+def _record_chat_id(msg: Any) -> int | None:
+    if not isinstance(msg, dict):
+        return None
+    try:
+        return int(msg.get("chat_id"))
+    except (TypeError, ValueError):
+        return None
 
-def get_pending_messages(store_path: str, include_bot: bool = False) -> list[dict[str, Any]]:
-    """Return unprocessed messages from store."""
-    data = load_message_store(store_path)
-    messages = data.get("messages", [])
-    out = []
-    for msg in messages:
-        if msg.get("processed", False):
+
+def _patch_chat_index(
+    index: dict[int, tuple[list[int], list[dict[str, Any]]]],
+    inserted: list[dict[str, Any]],
+    updated: list[dict[str, Any]],
+    removed: list[dict[str, Any]],
+) -> dict[int, tuple[list[int], list[dict[str, Any]]]] | None:
+    """Copy-on-write patch of a per-chat index; None when a record to change is missing."""
+    patched = dict(index)
+    copied: set[int] = set()
+
+    def bucket(chat_id: int) -> tuple[list[int], list[dict[str, Any]]]:
+        if chat_id not in copied:
+            keys, rows = patched.get(chat_id, ([], []))
+            patched[chat_id] = (list(keys), list(rows))
+            copied.add(chat_id)
+        return patched[chat_id]
+
+    def position(keys: list[int], rows: list[dict[str, Any]], msg: dict[str, Any]) -> int | None:
+        epoch = _message_epoch(msg)
+        store_key = _message_store_key(msg)
+        for pos in range(bisect_left(keys, epoch), bisect_right(keys, epoch)):
+            if _message_store_key(rows[pos]) == store_key:
+                return pos
+        return None
+
+    for msg in removed:
+        chat_id = _record_chat_id(msg)
+        if chat_id is None:
             continue
-        if not include_bot and msg.get("type", "user") != "user":
+        keys, rows = bucket(chat_id)
+        pos = position(keys, rows, msg)
+        if pos is None:
+            return None
+        del keys[pos], rows[pos]
+    for msg in updated:
+        chat_id = _record_chat_id(msg)
+        if chat_id is None:
             continue
-        out.append(msg)
-    return out
+        keys, rows = bucket(chat_id)
+        pos = position(keys, rows, msg)
+        if pos is None:
+            return None
+        rows[pos] = copy.deepcopy(msg)
+    for msg in inserted:
+        chat_id = _record_chat_id(msg)
+        if chat_id is None:
+            continue
+        keys, rows = bucket(chat_id)
+        epoch = _message_epoch(msg)
+        # Same slot _insert_message_ordered picks in the store: after records of equal time.
+        pos = bisect_right(keys, epoch)
+        keys.insert(pos, epoch)
+        rows.insert(pos, copy.deepcopy(msg))
+    for chat_id in copied:
+        if not patched[chat_id][0]:
+            del patched[chat_id]
+    return patched
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    store_key TEXT NOT NULL,
+    message_id,
+    chat_id INTEGER,
+    type TEXT NOT NULL DEFAULT 'user',
+    timestamp TEXT NOT NULL DEFAULT '',
+    ts_epoch INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_store_key ON messages(store_key) WHERE type != 'bot';
+CREATE INDEX IF NOT EXISTS idx_messages_processed ON messages(processed);
+CREATE INDEX IF NOT EXISTS idx_messages_pending ON messages(chat_id, message_id) WHERE processed = 0;
+CREATE INDEX IF NOT EXISTS idx_messages_epoch ON messages(ts_epoch);
+"""
 
+_SQLITE_LOCAL = threading.local()
 
-def mark_messages_processed(store_path: str, message_ids: list[int] | int) -> int:
-    """Mark one or many message ids as processed. Returns count of updated rows."""
-    if isinstance(message_ids, int):
-        targets = {int(message_ids)}
+
+def _sqlite_connection(path: Path, legacy_json_path: Path | None = None) -> sqlite3.Connection:
+    """Return a per-thread cached connection, creating schema on first use."""
+    cache: dict[str, sqlite3.Connection] | None = getattr(_SQLITE_LOCAL, "connections", None)
+    if cache is None:
+        cache = {}
+        _SQLITE_LOCAL.connections = cache
+    key = str(path)
+    conn = cache.get(key)
+    if conn is not None:
+        return conn
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _ensure_private_dir(path.parent)
+    conn = sqlite3.connect(str(path), timeout=SQLITE_BUSY_TIMEOUT_SEC, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SQLITE_SCHEMA)
+    _sqlite_migrate_schema(conn)
+    _ensure_private_file(path)
+    if legacy_json_path is not None:
+        _sqlite_import_legacy_json(conn, legacy_json_path)
+    cache[key] = conn
+    return conn
+
+
+def _sqlite_migrate_schema(conn: sqlite3.Connection) -> None:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)").fetchall()}
+    if "ts_epoch" not in columns:
+        # Stores created before ts_epoch: backfill from the local-time text column once.
+        conn.execute("ALTER TABLE messages ADD COLUMN ts_epoch INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            "UPDATE messages SET ts_epoch = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) "
+            "WHERE timestamp != ''"
+        )
+    conn.execute("DROP INDEX IF EXISTS idx_messages_chat_ts")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_epoch ON messages(chat_id, ts_epoch)")
+
+
+@contextmanager
+def _sqlite_transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _sqlite_meta_get(conn: sqlite3.Connection, key: str, default: Any = None) -> Any:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return default
+    return row[0]
+
+
+def _sqlite_meta_set(conn: sqlite3.Connection, key: str, value: Any) -> None:
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+def _sqlite_raise_last_update_id(conn: sqlite3.Connection, new_last_update_id: int | None) -> int:
+    current = int(_sqlite_meta_get(conn, "last_update_id", 0) or 0)
+    if new_last_update_id is not None and int(new_last_update_id) > current:
+        current = int(new_last_update_id)
+        _sqlite_meta_set(conn, "last_update_id", current)
+    return current
+
+
+def _sqlite_bump_pending_version(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('pending_version', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = COALESCE(value, 0) + 1"
+    )
+
+
+def _sqlite_insert_message(conn: sqlite3.Connection, msg: dict[str, Any]) -> bool:
+    record = _redact_store_record(msg)
+    _message_epoch(record)
+    message_id = record.get("message_id")
+    if not isinstance(message_id, (int, str)):
+        message_id = None if message_id is None else str(message_id)
+    try:
+        chat_id: int | None = int(record.get("chat_id"))
+    except (TypeError, ValueError):
+        chat_id = None
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO messages "
+        "(store_key, message_id, chat_id, type, timestamp, ts_epoch, processed, payload) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            _message_store_key(record),
+            message_id,
+            chat_id,
+            str(record.get("type") or "user"),
+            str(record.get("timestamp") or ""),
+            _message_epoch(record),
+            1 if record.get("processed", False) else 0,
+            json.dumps(record, ensure_ascii=False),
+        ),
+    )
+    return cur.rowcount > 0
+
+
+def _sqlite_prune(conn: sqlite3.Connection, retention_days: int) -> int:
+    cutoff_epoch = int(time.time()) - max(1, retention_days) * 86400
+    cur = conn.execute("DELETE FROM messages WHERE ts_epoch > 0 AND ts_epoch < ?", (cutoff_epoch,))
+    return max(0, cur.rowcount)
+
+
+def _sqlite_row_to_message(payload: str, processed: int) -> dict[str, Any]:
+    try:
+        msg = json.loads(payload)
+    except Exception:
+        msg = {}
+    if not isinstance(msg, dict):
+        msg = {}
+    msg["processed"] = bool(processed)
+    return msg
+
+
+def _sqlite_import_legacy_json(conn: sqlite3.Connection, json_path: Path) -> int:
+    """Import an existing JSON store once. Later opens are no-ops."""
+    if _sqlite_meta_get(conn, "legacy_json_imported") is not None:
+        return 0
+    if json_path.exists():
+        with _message_store_lock(json_path):
+            legacy = _load_message_store_unlocked(json_path)
     else:
-        targets = {int(mid) for mid in message_ids}
+        legacy = {"messages": [], "last_update_id": 0}
+    messages = legacy.get("messages", []) if isinstance(legacy, dict) else []
+    imported = 0
+    with _sqlite_transaction(conn):
+        if _sqlite_meta_get(conn, "legacy_json_imported") is not None:
+            return 0
+        for msg in messages if isinstance(messages, list) else []:
+            if isinstance(msg, dict) and _sqlite_insert_message(conn, msg):
+                imported += 1
+        try:
+            legacy_last_update_id = int(legacy.get("last_update_id", 0) or 0)
+        except (TypeError, ValueError, AttributeError):
+            legacy_last_update_id = 0
+        _sqlite_raise_last_update_id(conn, legacy_last_update_id)
+        _sqlite_meta_set(conn, "legacy_json_imported", str(json_path))
+        if imported:
+            _sqlite_bump_pending_version(conn)
+    return imported
 
-    p = Path(store_path)
-    with _message_store_lock(p):
-        data = _load_message_store_unlocked(p)
-        messages = data.get("messages", [])
+
+class _SqliteMessageStore:
+    """Embedded SQLite (WAL) store with row-level inserts and updates.
+
+    Filter columns are indexed; the full record is kept as JSON in `payload`
+    so readers get the same dicts as from the JSON store.
+    """
+
+    backend = MESSAGE_STORE_BACKEND_SQLITE
+
+    def __init__(self, path: Path, legacy_json_path: Path | None = None) -> None:
+        self.path = path
+        self.legacy_json_path = legacy_json_path
+
+    def _conn(self) -> sqlite3.Connection:
+        return _sqlite_connection(self.path, legacy_json_path=self.legacy_json_path)
+
+    def load(self) -> dict[str, Any]:
+        conn = self._conn()
+        rows = conn.execute("SELECT payload, processed FROM messages ORDER BY id").fetchall()
+        return {
+            "messages": [_sqlite_row_to_message(payload, processed) for payload, processed in rows],
+            "last_update_id": int(_sqlite_meta_get(conn, "last_update_id", 0) or 0),
+        }
+
+    def save(self, data: dict[str, Any]) -> None:
+        conn = self._conn()
+        messages = data.get("messages", []) if isinstance(data, dict) else []
+        with _sqlite_transaction(conn):
+            conn.execute("DELETE FROM messages")
+            for msg in messages if isinstance(messages, list) else []:
+                if isinstance(msg, dict):
+                    _sqlite_insert_message(conn, msg)
+            _sqlite_meta_set(conn, "last_update_id", int(data.get("last_update_id", 0) or 0))
+            _sqlite_bump_pending_version(conn)
+
+    def last_update_id(self) -> int:
+        return int(_sqlite_meta_get(self._conn(), "last_update_id", 0) or 0)
+
+    def append(
+        self,
+        new_messages: list[dict[str, Any]],
+        new_last_update_id: int | None,
+        retention_days: int | None = None,
+    ) -> dict[str, Any]:
+        conn = self._conn()
+        appended: list[dict[str, Any]] = []
+        removed = 0
+        with _sqlite_transaction(conn):
+            for msg in new_messages or []:
+                if _sqlite_insert_message(conn, msg):
+                    appended.append(msg)
+            last_update_id = _sqlite_raise_last_update_id(conn, new_last_update_id)
+            if retention_days is not None:
+                removed = _sqlite_prune(conn, retention_days)
+            if removed > 0 or any(not msg.get("processed", False) for msg in appended):
+                _sqlite_bump_pending_version(conn)
+        remaining = 0
+        if removed > 0:
+            remaining = int(conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0])
+        return {
+            "appended": appended,
+            "removed": removed,
+            "remaining": remaining,
+            "last_update_id": last_update_id,
+        }
+
+    def prune(self, retention_days: int) -> dict[str, Any]:
+        conn = self._conn()
+        cutoff_epoch = int(time.time()) - max(1, retention_days) * 86400
+        oldest = conn.execute("SELECT MIN(ts_epoch) FROM messages WHERE ts_epoch > 0").fetchone()[0]
+        if oldest is None or int(oldest) >= cutoff_epoch:
+            return {"removed": 0, "remaining": None}
+        with _sqlite_transaction(conn):
+            removed = _sqlite_prune(conn, retention_days)
+            if removed > 0:
+                _sqlite_bump_pending_version(conn)
+        remaining = int(conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0])
+        return {"removed": removed, "remaining": remaining}
+
+    def pending(self, include_bot: bool = False) -> list[dict[str, Any]]:
+        query = "SELECT payload, processed FROM messages WHERE processed = 0"
+        if not include_bot:
+            query += " AND type = 'user'"
+        rows = self._conn().execute(query + " ORDER BY id").fetchall()
+        return [_sqlite_row_to_message(payload, processed) for payload, processed in rows]
+
+    def mark_processed(self, targets: set[int], chat_id: int | None = None) -> int:
+        ordered = sorted(targets)
+        if not ordered:
+            return 0
+        conn = self._conn()
         changed = 0
-        for msg in messages:
-            mid = msg.get("message_id")
-            if isinstance(mid, int) and mid in targets and not msg.get("processed", False):
-                msg["processed"] = True
+        chat_filter = "" if chat_id is None else " AND chat_id = ?"
+        chat_args = [] if chat_id is None else [int(chat_id)]
+        with _sqlite_transaction(conn):
+            for start in range(0, len(ordered), SQLITE_MAX_VARIABLES - 1):
+                chunk = ordered[start : start + SQLITE_MAX_VARIABLES - 1]
+                placeholders = ", ".join("?" for _ in chunk)
+                cur = conn.execute(
+                    "UPDATE messages SET processed = 1 WHERE processed = 0 "
+                    f"AND message_id IN ({placeholders}){chat_filter}",
+                    [*chunk, *chat_args],
+                )
+                changed += max(0, cur.rowcount)
+            if changed:
+                _sqlite_bump_pending_version(conn)
+        return changed
+
+    def pending_version(self) -> int:
+        return int(_sqlite_meta_get(self._conn(), "pending_version", 0) or 0)
+
+    def messages_for_chat(
+        self,
+        chat_id: int,
+        since: int | None = None,
+        until: int | None = None,
+        limit: int | None = None,
+        roles: set[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        clauses = ["chat_id = ?"]
+        params: list[Any] = [int(chat_id)]
+        if since is not None:
+            clauses.append("ts_epoch >= ?")
+            params.append(max(1, since))
+        if until is not None:
+            clauses.append("ts_epoch <= ?")
+            params.append(until)
+        if roles is not None:
+            if not roles:
+                return []
+            clauses.append(f"type IN ({', '.join('?' for _ in roles)})")
+            params.extend(sorted(roles))
+        query = f"SELECT payload, processed FROM messages WHERE {' AND '.join(clauses)} ORDER BY ts_epoch DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        rows = self._conn().execute(query, params).fetchall()
+        return [_sqlite_row_to_message(payload, processed) for payload, processed in rows]
+
+    def update_attachments(self, messages: list[dict[str, Any]]) -> int:
+        conn = self._conn()
+        changed = 0
+        with _sqlite_transaction(conn):
+            for msg in messages:
+                if msg.get("type", "user") == "bot":
+                    continue
+                row = conn.execute(
+                    "SELECT id, payload, processed FROM messages WHERE store_key = ? AND type != 'bot'",
+                    (_message_store_key(msg),),
+                ).fetchone()
+                if row is None:
+                    continue
+                record = _merge_attachment_update(_sqlite_row_to_message(row[1], row[2]), msg)
+                conn.execute(
+                    "UPDATE messages SET payload = ? WHERE id = ?",
+                    (json.dumps(record, ensure_ascii=False), row[0]),
+                )
                 changed += 1
-        if changed:
-            _save_message_store_unlocked(p, data)
+            if changed:
+                _sqlite_bump_pending_version(conn)
+        return changed
+
+    def add_bot_response(self, entry: dict[str, Any]) -> None:
+        conn = self._conn()
+        with _sqlite_transaction(conn):
+            if _sqlite_insert_message(conn, entry) and not entry.get("processed", False):
+                _sqlite_bump_pending_version(conn)
+
+
+def _shard_chat_key(msg: dict[str, Any]) -> int | None:
+    try:
+        return int(msg.get("chat_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+class _ShardedMessageStore:
+    """
+    One JSON store per chat under `<store>.shards/`, plus `offset.json` for
+    `last_update_id` and `pending_version.json` for the store-wide pending
+    version.
+
+    Each shard has its own lock and pending sidecar, so a write for one chat
+    neither blocks nor rewrites any other chat. Calls without a chat scope
+    (`pending`, unscoped `mark_processed`, ...) fan out across shards. Every
+    shard write that moves its pending set bumps the one shared counter, so
+    the version never goes back when a shard is deleted or reset. An
+    existing single-file store is split into shards once on first open.
+    """
+
+    backend = MESSAGE_STORE_BACKEND_SHARDED
+
+    def __init__(self, path: Path, auto_migrate: bool = True) -> None:
+        self.path = path
+        self.shard_dir = path.with_name(f"{path.stem}{SHARD_DIR_SUFFIX}")
+        self.offset_path = self.shard_dir / SHARD_OFFSET_NAME
+        self.pending_version_path = self.shard_dir / SHARD_PENDING_VERSION_NAME
+        if auto_migrate and not self.offset_path.exists() and path.is_file():
+            with _message_store_lock(self.offset_path):
+                self._import_unlocked(apply=True, force=False)
+
+    def _import_unlocked(self, apply: bool, force: bool) -> dict[str, Any]:
+        summary: dict[str, Any] = {
+            "source": str(self.path),
+            "shard_dir": str(self.shard_dir),
+            "applied": False,
+            "already_migrated": self.offset_path.exists(),
+        }
+        if summary["already_migrated"] and not force:
+            return summary
+        with _message_store_lock(self.path):
+            data = _load_message_store_unlocked(self.path)
+        groups = self._group(data.get("messages", []))
+        last_update_id = int(data.get("last_update_id", 0) or 0)
+        if apply:
+            for chat_id, messages in groups.items():
+                shard_data = {"messages": list(messages), "last_update_id": 0}
+                _ensure_messages_ordered(shard_data)
+                self._shard(chat_id).save(shard_data)
+            _write_private_json(self.offset_path, {"last_update_id": last_update_id})
+            summary["applied"] = True
+        summary.update(
+            {
+                "last_update_id": last_update_id,
+                "messages": sum(len(messages) for messages in groups.values()),
+                "chats": {
+                    ("none" if chat_id is None else str(chat_id)): len(messages)
+                    for chat_id, messages in groups.items()
+                },
+            }
+        )
+        return summary
+
+    def _shard(self, chat_id: int | None) -> _JsonMessageStore:
+        name = "none" if chat_id is None else str(int(chat_id))
+        return _JsonMessageStore(self.shard_dir / f"chat_{name}.json", on_pending_change=self._bump_pending_version)
+
+    @staticmethod
+    def _shard_chat_id(shard: _JsonMessageStore) -> int | None:
+        return _shard_chat_key({"chat_id": shard.path.stem[len("chat_"):]})
+
+    def _shards(self) -> list[_JsonMessageStore]:
+        if not self.shard_dir.is_dir():
+            return []
+        return [
+            _JsonMessageStore(path, on_pending_change=self._bump_pending_version)
+            for path in sorted(self.shard_dir.iterdir())
+            if _SHARD_NAME_RE.match(path.name)
+        ]
+
+    def _stored_pending_version_unlocked(self) -> int | None:
+        try:
+            value = json.loads(self.pending_version_path.read_text(encoding="utf-8")).get("version")
+        except Exception:
+            return None
+        return int(value) if isinstance(value, int) and not isinstance(value, bool) else None
+
+    def _seed_pending_version_unlocked(self) -> int:
+        # Counter missing: continue from the sum of shard versions (the value
+        # stores reported before the counter existed) so readers never see it drop.
+        version = sum(
+            int((shard._read_pending_index() or {}).get("version", 0) or 0) for shard in self._shards()
+        )
+        _write_private_json(self.pending_version_path, {"version": version})
+        return version
+
+    def _bump_pending_version(self) -> None:
+        with _message_store_lock(self.pending_version_path):
+            version = self._stored_pending_version_unlocked()
+            if version is None:
+                version = self._seed_pending_version_unlocked()
+            _write_private_json(self.pending_version_path, {"version": version + 1})
+
+    def _group(self, messages: list[dict[str, Any]]) -> dict[int | None, list[dict[str, Any]]]:
+        groups: dict[int | None, list[dict[str, Any]]] = {}
+        for msg in messages or []:
+            if isinstance(msg, dict):
+                groups.setdefault(_shard_chat_key(msg), []).append(msg)
+        return groups
+
+    def _raise_offset(self, new_last_update_id: int | None) -> int:
+        with _message_store_lock(self.offset_path):
+            offset = _load_message_store_unlocked(self.offset_path)
+            current = int(offset.get("last_update_id", 0) or 0)
+            if new_last_update_id is not None and int(new_last_update_id) > current:
+                current = int(new_last_update_id)
+                _write_private_json(self.offset_path, {"last_update_id": current})
+            elif not self.offset_path.exists():
+                _write_private_json(self.offset_path, {"last_update_id": current})
+            return current
+
+    def load(self) -> dict[str, Any]:
+        messages: list[dict[str, Any]] = []
+        for shard in self._shards():
+            messages.extend(shard.load().get("messages", []))
+        messages.sort(key=_store_order_key)
+        return {"messages": messages, "last_update_id": self.last_update_id()}
+
+    def save(self, data: dict[str, Any]) -> None:
+        groups = self._group(data.get("messages", []))
+        for shard in self._shards():
+            groups.setdefault(self._shard_chat_id(shard), [])
+        for chat_id, messages in groups.items():
+            self._shard(chat_id).save({"messages": messages, "last_update_id": 0})
+        with _message_store_lock(self.offset_path):
+            _write_private_json(self.offset_path, {"last_update_id": int(data.get("last_update_id", 0) or 0)})
+
+    def last_update_id(self) -> int:
+        with _message_store_lock(self.offset_path):
+            offset = _load_message_store_unlocked(self.offset_path)
+        return int(offset.get("last_update_id", 0) or 0)
+
+    def append(
+        self,
+        new_messages: list[dict[str, Any]],
+        new_last_update_id: int | None,
+        retention_days: int | None = None,
+    ) -> dict[str, Any]:
+        appended: list[dict[str, Any]] = []
+        for chat_id, messages in self._group(new_messages).items():
+            appended.extend(self._shard(chat_id).append(messages, None)["appended"])
+        # Messages are durable before the offset moves past them.
+        last_update_id = self._raise_offset(new_last_update_id)
+        removed = 0
+        remaining = 0
+        if retention_days is not None:
+            pruned = self.prune(retention_days)
+            removed = int(pruned["removed"])
+            remaining = int(pruned["remaining"] or 0)
+        return {
+            "appended": appended,
+            "removed": removed,
+            "remaining": remaining,
+            "last_update_id": last_update_id,
+        }
+
+    def pending(self, include_bot: bool = False) -> list[dict[str, Any]]:
+        out: list[dict[str, Any]] = []
+        for shard in self._shards():
+            out.extend(shard.pending(include_bot=include_bot))
+        out.sort(key=_store_order_key)
+        return out
+
+    def pending_version(self) -> int:
+        version = self._stored_pending_version_unlocked()
+        if version is not None:
+            return version
+        with _message_store_lock(self.pending_version_path):
+            version = self._stored_pending_version_unlocked()
+            return version if version is not None else self._seed_pending_version_unlocked()
+
+    def messages_for_chat(
+        self,
+        chat_id: int,
+        since: int | None = None,
+        until: int | None = None,
+        limit: int | None = None,
+        roles: set[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        shard = self._shard(int(chat_id))
+        if not shard.path.exists():
+            return []
+        return shard.messages_for_chat(chat_id, since=since, until=until, limit=limit, roles=roles)
+
+    def mark_processed(self, targets: set[int], chat_id: int | None = None) -> int:
+        if chat_id is not None:
+            shard = self._shard(int(chat_id))
+            return shard.mark_processed(targets, chat_id=chat_id) if shard.path.exists() else 0
+        changed = 0
+        for shard in self._shards():
+            # Only lock shards whose pending set actually holds a target.
+            if any(msg.get("message_id") in targets for msg in shard.pending(include_bot=True)):
+                changed += shard.mark_processed(targets)
         return changed
 
+    def update_attachments(self, messages: list[dict[str, Any]]) -> int:
+        return sum(
+            self._shard(chat_id).update_attachments(group) for chat_id, group in self._group(messages).items()
+        )
+
+    def prune(self, retention_days: int) -> dict[str, Any]:
+        removed = 0
+        remaining: int | None = None
+        for shard in self._shards():
+            result = shard.prune(retention_days)
+            removed += int(result["removed"])
+            if result["remaining"] is not None:
+                remaining = (remaining or 0) + int(result["remaining"])
+        return {"removed": removed, "remaining": remaining}
+
+    def add_bot_response(self, entry: dict[str, Any]) -> None:
+        self._shard(_shard_chat_key(entry)).add_bot_response(entry)
+
+
+def _message_store_backend_name(path: Path) -> str:
+    if path.suffix.lower() in SQLITE_STORE_SUFFIXES:
+        return MESSAGE_STORE_BACKEND_SQLITE
+    raw = (os.getenv("TELEGRAM_MESSAGE_STORE_BACKEND", "") or "").strip().lower()
+    if raw in (MESSAGE_STORE_BACKEND_JSON, MESSAGE_STORE_BACKEND_SQLITE, MESSAGE_STORE_BACKEND_SHARDED):
+        return raw
+    return DEFAULT_MESSAGE_STORE_BACKEND
+
+
+def open_message_store(store_path: str) -> _JsonMessageStore | _SqliteMessageStore | _ShardedMessageStore:
+    """
+    Return the store backend for `store_path`.
+
+    `.sqlite3`/`.sqlite`/`.db` paths always use SQLite. Other paths follow
+    TELEGRAM_MESSAGE_STORE_BACKEND (json by default). With `sqlite`, the
+    database lives next to the JSON file (`.sqlite3` suffix) and the JSON
+    history is imported once on first open. With `sharded`, per-chat JSON
+    shards live in `<store>.shards/` and the JSON file is split on first open.
+    """
+    p = Path(store_path)
+    backend = _message_store_backend_name(p)
+    if backend == MESSAGE_STORE_BACKEND_SHARDED:
+        return _ShardedMessageStore(p)
+    if backend != MESSAGE_STORE_BACKEND_SQLITE:
+        return _JsonMessageStore(p)
+    if p.suffix.lower() in SQLITE_STORE_SUFFIXES:
+        return _SqliteMessageStore(p)
+    return _SqliteMessageStore(p.with_suffix(".sqlite3"), legacy_json_path=p)
+
+
+def migrate_message_store_to_shards(json_path: str, apply: bool = True, force: bool = False) -> dict[str, Any]:
+    """
+    Split a single-file JSON store into per-chat shards in `<store>.shards/`.
+
+    The source file is left in place. A store that was already split is skipped
+    unless `force` is set (which overwrites the shards with the source). With
+    `apply=False` nothing is written. Returns per-chat record counts.
+    """
+    store = _ShardedMessageStore(Path(json_path), auto_migrate=False)
+    if not apply:
+        return store._import_unlocked(apply=False, force=force)
+    with _message_store_lock(store.offset_path):
+        return store._import_unlocked(apply=True, force=force)
+
+
+def import_json_message_store(json_path: str, sqlite_path: str) -> int:
+    """One-shot import of a JSON message store into a SQLite store. Returns imported rows."""
+    conn = _sqlite_connection(Path(sqlite_path))
+    return _sqlite_import_legacy_json(conn, Path(json_path))
+
+
+def load_message_store(store_path: str) -> dict[str, Any]:
+    """Load message store from disk."""
+    return open_message_store(store_path).load()
+
+
+def save_message_store(store_path: str, data: dict[str, Any]) -> None:
+    """Save message store to disk."""
+    open_message_store(store_path).save(data)
+
+
+def append_messages_to_store(
+    store_path: str,
+    new_messages: list[dict[str, Any]],
+    new_last_update_id: int | None,
+) -> dict[str, Any]:
+    """
+    Append new messages and update last_update_id.
+
+    Returns only the newly appended messages plus the resulting last_update_id,
+    so the call never has to materialize the whole history.
+    """
+    result = open_message_store(store_path).append(new_messages, new_last_update_id)
+    return {"messages": result["appended"], "last_update_id": result["last_update_id"]}
+
+
+def get_pending_messages(store_path: str, include_bot: bool = False) -> list[dict[str, Any]]:
+    """Return unprocessed messages from store."""
+    return open_message_store(store_path).pending(include_bot=include_bot)
+
+
+def pending_version(store_path: str) -> int:
+    """
+    Return the pending-set version of the store.
+
+    The counter changes whenever unprocessed messages are added or marked
+    processed, so callers can skip `get_pending_messages` while it is unchanged.
+    """
+    return open_message_store(store_path).pending_version()
+
+
+def messages_for_chat(
+    store_path: str,
+    chat_id: int,
+    since: Any = None,
+    until: Any = None,
+    limit: int | None = None,
+    roles: Any = None,
+) -> list[dict[str, Any]]:
+    """
+    Return messages of one chat within [since, until], newest first.
+
+    `since`/`until` accept datetime, epoch seconds or store timestamp strings.
+    `roles` limits message types (e.g. `("user",)`); `limit` caps the result.
+    Messages without a parsable timestamp are only returned when `since` is unset.
+    """
+    if limit is not None and int(limit) <= 0:
+        return []
+    return open_message_store(store_path).messages_for_chat(
+        int(chat_id),
+        since=None if since is None else _timestamp_epoch(since),
+        until=None if until is None else _timestamp_epoch(until),
+        limit=None if limit is None else int(limit),
+        roles=_normalize_roles(roles),
+    )
+
+
+def mark_messages_processed(store_path: str, message_ids: list[int] | int, chat_id: int | None = None) -> int:
+    """
+    Mark one or many message ids as processed. Returns count of updated rows.
+
+    With `chat_id`, only that chat's messages are touched (and the sharded
+    backend opens just that chat's shard).
+    """
+    if isinstance(message_ids, int):
+        targets = {int(message_ids)}
+    else:
+        targets = {int(mid) for mid in message_ids}
+    return open_message_store(store_path).mark_processed(targets, chat_id=chat_id)
+
 
 def save_bot_response(
     store_path: str,
@@ -470,22 +1873,19 @@ def save_bot_response(
     else:
         reply_ids = [int(mid) for mid in reply_to_message_ids]
 
-    p = Path(store_path)
-    with _message_store_lock(p):
-        data = _load_message_store_unlocked(p)
-        data.setdefault("messages", [])
-        entry = {
-            "message_id": f"bot_{reply_ids[0]}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            "type": "bot",
-            "chat_id": int(chat_id),
-            "text": text or "",
-            "files": files or [],
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "reply_to": reply_ids,
-            "processed": True,
-        }
-        data["messages"].append(entry)
-        _save_message_store_unlocked(p, data)
+    now = datetime.now()
+    entry = {
+        "message_id": f"bot_{reply_ids[0]}_{now.strftime('%Y%m%d%H%M%S')}",
+        "type": "bot",
+        "chat_id": int(chat_id),
+        "text": text or "",
+        "files": files or [],
+        "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "ts_epoch": int(now.timestamp()),
+        "reply_to": reply_ids,
+        "processed": True,
+    }
+    open_message_store(store_path).add_bot_response(entry)
 
 
 def poll_store_and_get_pending(
@@ -499,66 +1899,586 @@ def poll_store_and_get_pending(
     - pending_messages
     - last_update_id
     """
-    p = Path(store_path)
-    with _message_store_lock(p):
-        current = _load_message_store_unlocked(p)
-        last_update_id = int(current.get("last_update_id", 0))
+    store = open_message_store(store_path)
+    last_update_id = store.last_update_id()
 
     new_messages, new_last_update_id = receive_once(runtime, last_update_id=last_update_id)
 
-    removed_count = 0
-    appended_messages: list[dict[str, Any]] = []
-    with _message_store_lock(p):
-        updated = _load_message_store_unlocked(p)
-        updated.setdefault("messages", [])
-        updated.setdefault("last_update_id", 0)
-        existing_keys = {_message_store_key(msg) for msg in updated.get("messages", [])}
-
-        for msg in new_messages:
-            dedupe_key = _message_store_key(msg)
-            if dedupe_key in existing_keys:
-                continue
-            existing_keys.add(dedupe_key)
-            updated["messages"].append(msg)
-            appended_messages.append(msg)
-
-        changed = bool(appended_messages)
-        if new_last_update_id is not None and new_last_update_id > int(updated["last_update_id"]):
-            updated["last_update_id"] = int(new_last_update_id)
-            changed = True
-
-        removed_count = _prune_message_store_data(
-            updated,
-            retention_days=int(runtime.get("message_retention_days", MESSAGE_RETENTION_DAYS)),
-        )
-        if removed_count > 0:
-            changed = True
+    # Retention pruning is not done here; see prune_message_store().
+    result = store.append(new_messages, new_last_update_id)
+    pending = store.pending(include_bot=include_bot)
+    resolve_pending_downloads(runtime, result["appended"] + pending, store_path=store_path)
+    return result["appended"], pending, int(result["last_update_id"])
 
-        if changed:
-            _save_message_store_unlocked(p, updated)
 
-        pending = []
-        for msg in updated.get("messages", []):
-            if msg.get("processed", False):
-                continue
-            if not include_bot and msg.get("type", "user") != "user":
-                continue
-            pending.append(msg)
-        last_seen_update = int(updated.get("last_update_id", new_last_update_id))
+def prune_message_store(
+    store_path: str,
+    retention_days: int | None = None,
+    runtime: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """
+    Drop records older than the retention window (maintenance tick, not the poll path).
 
-    if removed_count > 0:
+    Records are kept in `ts_epoch` order, so the check is a lookup of the oldest
+    record and pruning is a bisect plus a slice (JSON) or an indexed range delete
+    (SQLite). Returns `{"removed", "remaining"}`; `remaining` is None when the
+    store was left untouched.
+    """
+    if retention_days is None:
+        retention_days = int((runtime or {}).get("message_retention_days", MESSAGE_RETENTION_DAYS))
+    store = open_message_store(store_path)
+    result = store.prune(retention_days)
+    if result["removed"] > 0 and runtime is not None:
         _write_log(
             runtime,
             direction="system",
             event="message_store_pruned",
             details={
                 "store_path": str(store_path),
-                "retention_days": int(runtime.get("message_retention_days", MESSAGE_RETENTION_DAYS)),
-                "removed_count": removed_count,
-                "remaining_count": len(updated.get("messages", [])),
+                "backend": store.backend,
+                "retention_days": retention_days,
+                "removed_count": result["removed"],
+                "remaining_count": result["remaining"],
             },
         )
-    return appended_messages, pending, last_seen_update
+    return result
+
+
+class TelegramUpdateReceiver:
+    """
+    Background long-poll receiver.
+
+    Runs `getUpdates` with a long timeout on its own thread, persists every
+    batch (and `last_update_id`) to the message store before acknowledging it
+    with the next offset, and publishes newly appended messages to an in-memory
+    queue. Messages with attachments are published once their downloads are
+    resolved, without holding up the next poll. `wait()` lets the owner block
+    until new messages arrive instead of sleeping a fixed poll interval;
+    owners with their own wait primitive pass `on_messages`, which is called
+    (from the receiver thread) whenever new messages are published.
+    """
+
+    def __init__(
+        self,
+        runtime: dict[str, Any],
+        store_path: str,
+        poll_timeout_sec: int = DEFAULT_RECEIVER_POLL_TIMEOUT_SEC,
+        on_messages: Any = None,
+    ) -> None:
+        timeout = max(1, min(MAX_RECEIVER_POLL_TIMEOUT_SEC, int(poll_timeout_sec)))
+        self.runtime = dict(runtime)
+        self.runtime["polling_timeout_sec"] = timeout
+        # The HTTP timeout must outlast the long poll itself.
+        self.runtime["api_timeout_sec"] = max(float(runtime.get("api_timeout_sec", 20.0)), float(timeout + 10))
+        self.store_path = str(store_path)
+        self.poll_timeout_sec = timeout
+        self.last_error: str = ""
+        self.on_messages = on_messages
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telegram-receiver", daemon=True)
+        self._thread.start()
+        _write_log(
+            self.runtime,
+            direction="system",
+            event="receiver_started",
+            details={"store_path": self.store_path, "poll_timeout_sec": self.poll_timeout_sec},
+        )
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            # An in-flight getUpdates can only be abandoned, not cancelled.
+            thread.join(timeout=self.poll_timeout_sec + 1.0 if timeout is None else timeout)
+        self._thread = None
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to `timeout` seconds for new messages. Returns True when woken."""
+        woken = self._wake.wait(max(0.0, float(timeout)))
+        self._wake.clear()
+        return woken
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def drain(self) -> list[dict[str, Any]]:
+        """Return (and remove) messages appended since the last drain."""
+        out: list[dict[str, Any]] = []
+        while True:
+            try:
+                out.append(self._queue.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _publish(self, messages: list[dict[str, Any]]) -> None:
+        for msg in messages:
+            self._queue.put(msg)
+        if messages:
+            self._wake.set()
+            if callable(self.on_messages):
+                try:
+                    self.on_messages()
+                except Exception as exc:
+                    _write_log(
+                        self.runtime,
+                        direction="system",
+                        event="receiver_error",
+                        details={"error": f"{type(exc).__name__}: {exc}", "stage": "on_messages"},
+                    )
+
+    def _publish_after_downloads(self, messages: list[dict[str, Any]]) -> None:
+        try:
+            resolve_pending_downloads(self.runtime, messages, store_path=self.store_path)
+        except Exception as exc:
+            _write_log(
+                self.runtime,
+                direction="system",
+                event="receiver_error",
+                details={"error": f"{type(exc).__name__}: {exc}", "stage": "downloads"},
+            )
+        self._publish(messages)
+
+    def _resolve_leftover_downloads(self) -> None:
+        """Finish downloads a previous receiver persisted but never resolved."""
+        try:
+            leftover = [
+                msg
+                for msg in get_pending_messages(self.store_path, include_bot=False)
+                if msg.get("download_pending")
+            ]
+        except Exception:
+            leftover = []
+        if leftover:
+            threading.Thread(
+                target=self._publish_after_downloads,
+                args=(leftover,),
+                name="telegram-receiver-downloads",
+                daemon=True,
+            ).start()
+
+    def _run(self) -> None:
+        store = open_message_store(self.store_path)
+        self._resolve_leftover_downloads()
+        backoff_sec = RECEIVER_ERROR_BACKOFF_MIN_SEC
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                last_update_id = store.last_update_id()
+                new_messages, new_last_update_id = receive_once(self.runtime, last_update_id=last_update_id)
+                if new_messages or new_last_update_id > last_update_id:
+                    result = store.append(new_messages, new_last_update_id)
+                    if any(msg.get("download_pending") for msg in result["appended"]):
+                        # Keep polling other chats while attachments download.
+                        threading.Thread(
+                            target=self._publish_after_downloads,
+                            args=(result["appended"],),
+                            name="telegram-receiver-downloads",
+                            daemon=True,
+                        ).start()
+                    else:
+                        self._publish(result["appended"])
+                    self.last_error = ""
+                    backoff_sec = RECEIVER_ERROR_BACKOFF_MIN_SEC
+                    continue
+                if time.monotonic() - started >= 1.0:
+                    # Long poll ran to its timeout without updates.
+                    self.last_error = ""
+                    backoff_sec = RECEIVER_ERROR_BACKOFF_MIN_SEC
+                    continue
+                # receive_once returned immediately with nothing: the request failed.
+                last_error = self.runtime.get("_telegram_last_error")
+                self.last_error = str(last_error or "getUpdates failed")
+            except Exception as exc:
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                _write_log(
+                    self.runtime,
+                    direction="system",
+                    event="receiver_error",
+                    details={"error": self.last_error},
+                )
+            self._stop.wait(backoff_sec)
+            backoff_sec = min(RECEIVER_ERROR_BACKOFF_MAX_SEC, backoff_sec * 2.0)
+
+
+_OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idem_key TEXT UNIQUE,
+    chat_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT NOT NULL DEFAULT '',
+    coalesce_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_open ON outbox(status, chat_id, id);
+"""
+
+
+def _outbox_connection(path: Path) -> sqlite3.Connection:
+    """Per-thread cached outbox connection (shares the message-store connection cache)."""
+    cache: dict[str, sqlite3.Connection] | None = getattr(_SQLITE_LOCAL, "connections", None)
+    if cache is None:
+        cache = {}
+        _SQLITE_LOCAL.connections = cache
+    key = str(path)
+    conn = cache.get(key)
+    if conn is not None:
+        return conn
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _ensure_private_dir(path.parent)
+    conn = sqlite3.connect(str(path), timeout=SQLITE_BUSY_TIMEOUT_SEC, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_OUTBOX_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)").fetchall()}
+    if "coalesce_key" not in columns:
+        conn.execute("ALTER TABLE outbox ADD COLUMN coalesce_key TEXT")
+    _ensure_private_file(path)
+    cache[key] = conn
+    return conn
+
+
+def outbox_idempotency_key(kind: str, chat_id: int, *parts: Any) -> str:
+    """Stable key for an outgoing message so re-enqueueing the same reply is a no-op."""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return f"{kind}:{int(chat_id)}:{digest}"
+
+
+class TelegramOutbox:
+    """
+    Durable outgoing-message queue (SQLite/WAL).
+
+    Callers enqueue and return immediately; a TelegramOutboxWorker delivers.
+    Only the oldest open entry of each chat is ever claimed, so a chat's
+    messages go out in order even while an earlier one is backing off.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def _conn(self) -> sqlite3.Connection:
+        return _outbox_connection(self.path)
+
+    def enqueue(
+        self,
+        chat_id: int,
+        payload: dict[str, Any],
+        idem_key: str | None = None,
+        coalesce_key: str | None = None,
+    ) -> int:
+        """
+        Queue a message and return its id.
+
+        An existing entry with the same `idem_key` is reused. With `coalesce_key`,
+        a still-pending entry of this chat with the same key gets the new payload
+        instead of a second entry being queued (latest-wins updates).
+        """
+        conn = self._conn()
+        now = time.time()
+        encoded = json.dumps(payload, ensure_ascii=False)
+        with _sqlite_transaction(conn):
+            if idem_key:
+                row = conn.execute("SELECT id FROM outbox WHERE idem_key = ?", (idem_key,)).fetchone()
+                if row is not None:
+                    return int(row[0])
+            if coalesce_key:
+                row = conn.execute(
+                    "SELECT id FROM outbox WHERE chat_id = ? AND coalesce_key = ? AND status = ? ORDER BY id DESC LIMIT 1",
+                    (int(chat_id), coalesce_key, OUTBOX_STATUS_PENDING),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE outbox SET payload = ?, updated_at = ? WHERE id = ?",
+                        (encoded, now, int(row[0])),
+                    )
+                    return int(row[0])
+            cur = conn.execute(
+                "INSERT INTO outbox (idem_key, coalesce_key, chat_id, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (idem_key or None, coalesce_key or None, int(chat_id), encoded, OUTBOX_STATUS_PENDING, now, now),
+            )
+            return int(cur.lastrowid)
+
+    def claim(self, limit: int = 1, now: float | None = None) -> list[dict[str, Any]]:
+        """Mark up to `limit` due chat-head entries as sending and return them."""
+        conn = self._conn()
+        now = time.time() if now is None else float(now)
+        with _sqlite_transaction(conn):
+            rows = conn.execute(
+                "SELECT o.id, o.idem_key, o.chat_id, o.payload, o.attempts FROM outbox o "
+                "JOIN (SELECT MIN(id) AS head FROM outbox WHERE status IN (?, ?) GROUP BY chat_id) h "
+                "ON o.id = h.head "
+                "WHERE o.status = ? AND o.next_attempt_at <= ? "
+                "ORDER BY o.next_attempt_at, o.id LIMIT ?",
+                (OUTBOX_STATUS_PENDING, OUTBOX_STATUS_SENDING, OUTBOX_STATUS_PENDING, now, max(1, int(limit))),
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE outbox SET status = ?, updated_at = ? WHERE id = ?",
+                    (OUTBOX_STATUS_SENDING, now, int(row[0])),
+                )
+        return [
+            {
+                "id": int(item_id),
+                "idem_key": idem_key or "",
+                "chat_id": int(chat_id),
+                "payload": json.loads(payload),
+                "attempts": int(attempts),
+            }
+            for item_id, idem_key, chat_id, payload, attempts in rows
+        ]
+
+    def complete(self, item_id: int) -> None:
+        self._finish(item_id, OUTBOX_STATUS_SENT, "")
+
+    def fail(self, item_id: int, error: str) -> None:
+        """Give up on an entry; later entries of the same chat proceed."""
+        self._finish(item_id, OUTBOX_STATUS_FAILED, error)
+
+    def _finish(self, item_id: int, status: str, error: str) -> None:
+        conn = self._conn()
+        with _sqlite_transaction(conn):
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, str(error or "")[:2000], time.time(), int(item_id)),
+            )
+
+    def retry(self, item_id: int, delay_sec: float, error: str) -> None:
+        conn = self._conn()
+        now = time.time()
+        with _sqlite_transaction(conn):
+            conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (OUTBOX_STATUS_PENDING, now + max(0.0, float(delay_sec)), str(error or "")[:2000], now, int(item_id)),
+            )
+
+    def recover(self) -> int:
+        """Return entries left `sending` by a crashed worker to the queue (at-least-once delivery)."""
+        conn = self._conn()
+        with _sqlite_transaction(conn):
+            cur = conn.execute(
+                "UPDATE outbox SET status = ?, updated_at = ? WHERE status = ?",
+                (OUTBOX_STATUS_PENDING, time.time(), OUTBOX_STATUS_SENDING),
+            )
+            return int(cur.rowcount or 0)
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        out = {status: 0 for status in (OUTBOX_STATUS_PENDING, OUTBOX_STATUS_SENDING, OUTBOX_STATUS_SENT, OUTBOX_STATUS_FAILED)}
+        out.update({str(status): int(count) for status, count in rows})
+        return out
+
+    def backlog(self) -> int:
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)",
+            (OUTBOX_STATUS_PENDING, OUTBOX_STATUS_SENDING),
+        ).fetchone()
+        return int(row[0])
+
+    def next_due_in(self, now: float | None = None) -> float | None:
+        """Seconds until the earliest pending entry is due (0 if overdue), or None when idle."""
+        row = self._conn().execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?",
+            (OUTBOX_STATUS_PENDING,),
+        ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        now = time.time() if now is None else float(now)
+        return max(0.0, float(row[0]) - now)
+
+    def prune(self, older_than_sec: float = DEFAULT_OUTBOX_RETENTION_SEC) -> int:
+        """Delete sent/failed entries last touched more than `older_than_sec` ago."""
+        conn = self._conn()
+        with _sqlite_transaction(conn):
+            cur = conn.execute(
+                "DELETE FROM outbox WHERE status IN (?, ?) AND updated_at < ?",
+                (OUTBOX_STATUS_SENT, OUTBOX_STATUS_FAILED, time.time() - max(0.0, float(older_than_sec))),
+            )
+            return int(cur.rowcount or 0)
+
+
+def _outbox_item_is_reply(item: dict[str, Any]) -> bool:
+    payload = item.get("payload")
+    return isinstance(payload, dict) and bool(payload.get("reply_to_message_ids"))
+
+
+class OutboxDeliveryRejected(Exception):
+    """Raised by an outbox `deliver` callback when Telegram refused the message for good."""
+
+
+def is_permanent_send_error(error: Any) -> bool:
+    """
+    True for a `_telegram_last_error` that resending cannot fix: any 4xx
+    except 429 (bot blocked, chat not found, bad request).
+    """
+    if not isinstance(error, dict) or error.get("kind") != "http":
+        return False
+    try:
+        status_code = int(error.get("status_code") or 0)
+    except (TypeError, ValueError):
+        return False
+    return 400 <= status_code < 500 and status_code != 429
+
+
+class TelegramOutboxWorker:
+    """
+    Background delivery for a TelegramOutbox.
+
+    `deliver(item)` performs the actual send and returns True on success
+    (exceptions count as failures). Failed entries are retried with
+    exponential backoff until `max_attempts`, then marked failed; replies to
+    user messages (`reply_to_message_ids` in the payload) get
+    OUTBOX_REPLY_ATTEMPTS_FACTOR times as many attempts, since their source
+    messages are already marked processed. `deliver` raises
+    OutboxDeliveryRejected to fail an entry at once, so an undeliverable
+    message never holds its chat's queue. `on_failed(item, error)` is told
+    about every entry given up on. Different chats are delivered in parallel
+    up to `concurrency`; a chat never has more than one entry in flight.
+    """
+
+    def __init__(
+        self,
+        outbox: TelegramOutbox,
+        deliver: Any,
+        runtime: dict[str, Any],
+        max_attempts: int = DEFAULT_OUTBOX_MAX_ATTEMPTS,
+        retry_delay_sec: float = DEFAULT_OUTBOX_RETRY_DELAY_SEC,
+        retry_backoff: float = DEFAULT_OUTBOX_RETRY_BACKOFF,
+        concurrency: int = DEFAULT_OUTBOX_CONCURRENCY,
+        on_failed: Any = None,
+    ) -> None:
+        self.outbox = outbox
+        self.deliver = deliver
+        self.on_failed = on_failed
+        self.runtime = dict(runtime)
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay_sec = max(0.05, float(retry_delay_sec))
+        self.retry_backoff = max(1.0, float(retry_backoff))
+        self.concurrency = max(1, int(concurrency))
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._recovered = False
+        self._run_lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telegram-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        self._thread = None
+        executor = self._executor
+        self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self) -> None:
+        """Wake the worker after an enqueue."""
+        self._wake.set()
+
+    def run_once(self) -> int:
+        """Deliver every entry that is due now; returns how many were attempted."""
+        with self._run_lock:
+            if not self._recovered:
+                recovered = self.outbox.recover()
+                self._recovered = True
+                if recovered:
+                    _write_log(self.runtime, direction="system", event="outbox_recovered", details={"count": recovered})
+            attempted = 0
+            while not self._stop.is_set():
+                items = self.outbox.claim(limit=self.concurrency)
+                if not items:
+                    break
+                attempted += len(items)
+                if len(items) == 1:
+                    self._deliver_one(items[0])
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency, thread_name_prefix="telegram-outbox-send"
+                    )
+                wait_futures([self._executor.submit(self._deliver_one, item) for item in items])
+            return attempted
+
+    def _deliver_one(self, item: dict[str, Any]) -> None:
+        error = "delivery failed"
+        rejected = False
+        try:
+            ok = bool(self.deliver(item))
+        except OutboxDeliveryRejected as exc:
+            ok = False
+            rejected = True
+            error = f"rejected: {exc}"
+        except Exception as exc:
+            ok = False
+            error = f"{type(exc).__name__}: {exc}"
+        if ok:
+            self.outbox.complete(item["id"])
+            return
+        attempts = int(item.get("attempts", 0)) + 1
+        details = {"id": item["id"], "chat_id": item["chat_id"], "attempts": attempts, "error": error}
+        max_attempts = self.max_attempts
+        if _outbox_item_is_reply(item):
+            max_attempts *= OUTBOX_REPLY_ATTEMPTS_FACTOR
+        if rejected or attempts >= max_attempts:
+            self.outbox.fail(item["id"], error)
+            _write_log(self.runtime, direction="system", event="outbox_failed", details=details)
+            if self.on_failed is not None:
+                try:
+                    self.on_failed(item, error)
+                except Exception:
+                    pass
+            return
+        delay_sec = min(OUTBOX_RETRY_MAX_DELAY_SEC, self.retry_delay_sec * (self.retry_backoff ** (attempts - 1)))
+        self.outbox.retry(item["id"], delay_sec, error)
+        details["retry_in_sec"] = round(delay_sec, 3)
+        _write_log(self.runtime, direction="system", event="outbox_retry", details=details)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                due_in = self.outbox.next_due_in()
+            except Exception as exc:
+                _write_log(
+                    self.runtime,
+                    direction="system",
+                    event="outbox_error",
+                    details={"error": f"{type(exc).__name__}: {exc}"},
+                )
+                due_in = RECEIVER_ERROR_BACKOFF_MIN_SEC
+            wait_sec = DEFAULT_OUTBOX_IDLE_WAIT_SEC if due_in is None else min(DEFAULT_OUTBOX_IDLE_WAIT_SEC, due_in)
+            self._wake.wait(max(0.05, wait_sec))
+            self._wake.clear()
 
 
 def receive_once(runtime: dict[str, Any], last_update_id: int = 0) -> tuple[list[dict[str, Any]], int]:
@@ -573,6 +2493,9 @@ def receive_once(runtime: dict[str, Any], last_update_id: int = 0) -> tuple[list
     - audio
     - voice
     - location
+
+    Attachment entries come back as `status: "pending"` placeholders on
+    messages flagged `download_pending`; resolve_pending_downloads() fetches them.
     """
     payload = {
         "offset": int(last_update_id) + 1,
@@ -637,6 +2560,7 @@ def receive_once(runtime: dict[str, Any], last_update_id: int = 0) -> tuple[list
                 "files": [],
                 "location": None,
                 "timestamp": callback_timestamp,
+                "ts_epoch": _timestamp_epoch(callback_timestamp),
                 "processed": False,
                 "callback_message_id": int(callback_message.get("message_id", 0) or 0),
             }
@@ -683,80 +2607,9 @@ def receive_once(runtime: dict[str, Any], last_update_id: int = 0) -> tuple[list
         chat_id = chat.get("id")
         text = (msg.get("caption") or msg.get("text") or "")
 
-        files: list[dict[str, Any]] = []
-
-        photos = msg.get("photo") or []
-        if photos:
-            largest = photos[-1]
-            file_id = largest.get("file_id")
-            if file_id:
-                downloaded = _download_file(
-                    runtime=runtime,
-                    file_id=file_id,
-                    message_id=message_id,
-                    file_type="photo",
-                    preferred_name=None,
-                )
-                if downloaded:
-                    downloaded["size"] = largest.get("file_size", downloaded.get("size", 0))
-                    files.append(downloaded)
-
-        document = msg.get("document")
-        if isinstance(document, dict) and document.get("file_id"):
-            downloaded = _download_file(
-                runtime=runtime,
-                file_id=document["file_id"],
-                message_id=message_id,
-                file_type="document",
-                preferred_name=document.get("file_name"),
-            )
-            if downloaded:
-                downloaded["name"] = document.get("file_name")
-                downloaded["mime_type"] = document.get("mime_type")
-                downloaded["size"] = document.get("file_size", downloaded.get("size", 0))
-                files.append(downloaded)
-
-        video = msg.get("video")
-        if isinstance(video, dict) and video.get("file_id"):
-            downloaded = _download_file(
-                runtime=runtime,
-                file_id=video["file_id"],
-                message_id=message_id,
-                file_type="video",
-                preferred_name=None,
-            )
-            if downloaded:
-                downloaded["duration"] = video.get("duration")
-                downloaded["size"] = video.get("file_size", downloaded.get("size", 0))
-                files.append(downloaded)
-
-        audio = msg.get("audio")
-        if isinstance(audio, dict) and audio.get("file_id"):
-            downloaded = _download_file(
-                runtime=runtime,
-                file_id=audio["file_id"],
-                message_id=message_id,
-                file_type="audio",
-                preferred_name=audio.get("file_name"),
-            )
-            if downloaded:
-                downloaded["duration"] = audio.get("duration")
-                downloaded["size"] = audio.get("file_size", downloaded.get("size", 0))
-                files.append(downloaded)
-
-        voice = msg.get("voice")
-        if isinstance(voice, dict) and voice.get("file_id"):
-            downloaded = _download_file(
-                runtime=runtime,
-                file_id=voice["file_id"],
-                message_id=message_id,
-                file_type="voice",
-                preferred_name=None,
-            )
-            if downloaded:
-                downloaded["duration"] = voice.get("duration")
-                downloaded["size"] = voice.get("file_size", downloaded.get("size", 0))
-                files.append(downloaded)
+        # Attachments are recorded as pending placeholders; the bytes are fetched by
+        # resolve_pending_downloads() after the batch has been stored and acknowledged.
+        files = _attachment_placeholders(msg)
 
         location_info = None
         location = msg.get("location")
@@ -786,24 +2639,421 @@ def receive_once(runtime: dict[str, Any], last_update_id: int = 0) -> tuple[list
             "files": files,
             "location": location_info,
             "timestamp": timestamp,
+            "ts_epoch": _timestamp_epoch(msg.get("date") or timestamp),
             "processed": False,
         }
+        if files:
+            message_data["download_pending"] = True
         accepted_messages.append(message_data)
 
-        _write_log(
-            runtime,
-            direction="receive",
-            event="accepted_message",
-            details={
-                "message_id": message_id,
-                "chat_id": chat_id,
-                "has_text": bool(text),
-                "file_count": len(files),
-                "has_location": bool(location_info),
-            },
+        _write_log(
+            runtime,
+            direction="receive",
+            event="accepted_message",
+            details={
+                "message_id": message_id,
+                "chat_id": chat_id,
+                "has_text": bool(text),
+                "file_count": len(files),
+                "has_location": bool(location_info),
+            },
+        )
+
+    return accepted_messages, new_last_update_id
+
+
+def _attachment_placeholders(msg: dict[str, Any]) -> list[dict[str, Any]]:
+    files: list[dict[str, Any]] = []
+
+    photos = msg.get("photo") or []
+    if photos and isinstance(photos[-1], dict) and photos[-1].get("file_id"):
+        largest = photos[-1]
+        entry = {"type": "photo", "file_id": largest["file_id"], "file_unique_id": largest.get("file_unique_id")}
+        if "file_size" in largest:
+            entry["size"] = largest.get("file_size")
+        files.append(entry)
+
+    document = msg.get("document")
+    if isinstance(document, dict) and document.get("file_id"):
+        entry = {
+            "type": "document",
+            "file_id": document["file_id"],
+            "file_unique_id": document.get("file_unique_id"),
+            "preferred_name": document.get("file_name"),
+            "name": document.get("file_name"),
+            "mime_type": document.get("mime_type"),
+        }
+        if "file_size" in document:
+            entry["size"] = document.get("file_size")
+        files.append(entry)
+
+    for file_type in ("video", "audio", "voice"):
+        media = msg.get(file_type)
+        if not isinstance(media, dict) or not media.get("file_id"):
+            continue
+        entry = {
+            "type": file_type,
+            "file_id": media["file_id"],
+            "file_unique_id": media.get("file_unique_id"),
+            "duration": media.get("duration"),
+        }
+        if file_type == "audio":
+            entry["preferred_name"] = media.get("file_name")
+        if "file_size" in media:
+            entry["size"] = media.get("file_size")
+        files.append(entry)
+
+    for entry in files:
+        entry["status"] = DOWNLOAD_STATUS_PENDING
+    return files
+
+
+_DOWNLOAD_LOCK = threading.RLock()
+_DOWNLOAD_EXECUTOR: ThreadPoolExecutor | None = None
+_DOWNLOAD_EXECUTOR_WORKERS = 0
+_DOWNLOAD_INFLIGHT: dict[tuple[str, int, str], Future] = {}
+
+
+def _download_executor(concurrency: int) -> ThreadPoolExecutor:
+    global _DOWNLOAD_EXECUTOR, _DOWNLOAD_EXECUTOR_WORKERS
+    with _DOWNLOAD_LOCK:
+        if _DOWNLOAD_EXECUTOR is None or _DOWNLOAD_EXECUTOR_WORKERS != concurrency:
+            if _DOWNLOAD_EXECUTOR is not None:
+                _DOWNLOAD_EXECUTOR.shutdown(wait=False)
+            _DOWNLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="telegram-download")
+            _DOWNLOAD_EXECUTOR_WORKERS = concurrency
+        return _DOWNLOAD_EXECUTOR
+
+
+def _attachment_cache_dir(runtime: dict[str, Any]) -> Path | None:
+    if int(runtime.get("attachment_cache_max_bytes", DEFAULT_ATTACHMENT_CACHE_MAX_BYTES)) <= 0:
+        return None
+    configured = runtime.get("attachment_cache_dir")
+    if configured:
+        return Path(configured)
+    return Path(runtime["tasks_dir"]) / ATTACHMENT_CACHE_DIRNAME
+
+
+def _load_attachment_cache_index(index_path: Path) -> dict[str, Any]:
+    try:
+        raw = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raw = None
+    index = raw if isinstance(raw, dict) else {}
+    if not isinstance(index.get("entries"), dict):
+        index["entries"] = {}
+    index["hits"] = int(index.get("hits", 0) or 0)
+    index["misses"] = int(index.get("misses", 0) or 0)
+    return index
+
+
+def _copy_file_with_digest(src: Path, dst: Path) -> str:
+    """
+    Copy `src` to `dst` (replacing it atomically) and return the SHA-256 of the
+    copied bytes. Always a real copy: the agent may edit task files in place,
+    which must never reach the cached blob.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.tmp.{os.getpid()}.{time.time_ns()}")
+    digest = hashlib.sha256()
+    try:
+        with src.open("rb") as reader, tmp.open("wb") as writer:
+            for chunk in iter(lambda: reader.read(64 * 1024), b""):
+                digest.update(chunk)
+                writer.write(chunk)
+        os.replace(tmp, dst)
+        _ensure_private_file(dst)
+    finally:
+        if tmp.exists():
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+    return digest.hexdigest()
+
+
+def _evict_attachment_cache(cache_dir: Path, index: dict[str, Any], max_bytes: int) -> int:
+    entries: dict[str, dict[str, Any]] = index["entries"]
+    total = sum(int(meta.get("size", 0) or 0) for meta in entries.values())
+    evicted = 0
+    for unique_id, meta in sorted(entries.items(), key=lambda item: float(item[1].get("last_used", 0) or 0)):
+        if total <= max_bytes:
+            break
+        try:
+            (cache_dir / str(meta.get("blob", ""))).unlink()
+        except OSError:
+            pass
+        total -= int(meta.get("size", 0) or 0)
+        del entries[unique_id]
+        evicted += 1
+    return evicted
+
+
+def _attachment_cache_fetch(
+    runtime: dict[str, Any],
+    message_id: int,
+    entry: dict[str, Any],
+) -> dict[str, Any] | None:
+    """Copy a cached blob into `msg_<id>/` when Telegram reports a known `file_unique_id`."""
+    cache_dir = _attachment_cache_dir(runtime)
+    unique_id = str(entry.get("file_unique_id") or "")
+    if cache_dir is None or not unique_id:
+        return None
+    index_path = cache_dir / ATTACHMENT_CACHE_INDEX_NAME
+    with _message_store_lock(index_path):
+        index = _load_attachment_cache_index(index_path)
+        meta = index["entries"].get(unique_id)
+        blob = cache_dir / str(meta.get("blob", "")) if isinstance(meta, dict) else None
+        try:
+            valid = (
+                blob is not None
+                and bool(meta.get("sha256"))
+                and blob.stat().st_size == int(meta.get("size", -1))
+            )
+        except OSError:
+            valid = False
+        if not valid:
+            index["entries"].pop(unique_id, None)
+            index["misses"] += 1
+            _write_private_json(index_path, index)
+            return None
+        meta = dict(meta)
+
+    file_type = str(entry.get("type") or "file")
+    preferred_name = entry.get("preferred_name")
+    if preferred_name:
+        filename = _safe_filename(preferred_name)
+    else:
+        filename = _make_default_filename(file_type, message_id, str(meta.get("name") or ""))
+    task_dir = Path(runtime["tasks_dir"]) / f"msg_{message_id}"
+    task_dir.mkdir(parents=True, exist_ok=True)
+    _ensure_private_dir(task_dir)
+    local_path = task_dir / filename
+    try:
+        digest = _copy_file_with_digest(blob, local_path)
+    except OSError as exc:
+        _write_log(
+            runtime,
+            direction="receive",
+            event="file_cache_copy_failed",
+            details={"file_unique_id": unique_id, "message_id": message_id, "error": str(exc)},
+        )
+        return None
+    verified = digest == meta.get("sha256")
+    if not verified:
+        try:
+            local_path.unlink()
+        except OSError:
+            pass
+    with _message_store_lock(index_path):
+        index = _load_attachment_cache_index(index_path)
+        current = index["entries"].get(unique_id)
+        if verified:
+            if isinstance(current, dict):
+                current["last_used"] = time.time()
+            index["hits"] += 1
+        else:
+            index["entries"].pop(unique_id, None)
+            index["misses"] += 1
+        _write_private_json(index_path, index)
+    if not verified:
+        _write_log(
+            runtime,
+            direction="receive",
+            event="file_cache_corrupt",
+            details={"file_unique_id": unique_id, "message_id": message_id},
+        )
+        return None
+    _write_log(
+        runtime,
+        direction="receive",
+        event="file_cache_hit",
+        details={"message_id": message_id, "file_type": file_type, "file_path": str(local_path)},
+    )
+    return {"type": file_type, "path": str(local_path), "size": int(meta.get("size", 0) or 0)}
+
+
+def _attachment_cache_store(runtime: dict[str, Any], entry: dict[str, Any], local_path: Path) -> None:
+    cache_dir = _attachment_cache_dir(runtime)
+    unique_id = _safe_filename(str(entry.get("file_unique_id") or ""))
+    if cache_dir is None or not unique_id:
+        return
+    max_bytes = int(runtime.get("attachment_cache_max_bytes", DEFAULT_ATTACHMENT_CACHE_MAX_BYTES))
+    blob_rel = f"{unique_id[:2]}/{unique_id}"
+    try:
+        size = int(local_path.stat().st_size)
+        if size > max_bytes:
+            return
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _ensure_private_dir(cache_dir)
+        digest = _copy_file_with_digest(local_path, cache_dir / blob_rel)
+        index_path = cache_dir / ATTACHMENT_CACHE_INDEX_NAME
+        with _message_store_lock(index_path):
+            index = _load_attachment_cache_index(index_path)
+            index["entries"][str(entry.get("file_unique_id"))] = {
+                "blob": blob_rel,
+                "name": local_path.name,
+                "size": size,
+                "sha256": digest,
+                "last_used": time.time(),
+            }
+            evicted = _evict_attachment_cache(cache_dir, index, max_bytes)
+            _write_private_json(index_path, index)
+    except OSError as exc:
+        _write_log(
+            runtime,
+            direction="receive",
+            event="file_cache_store_failed",
+            details={"file_unique_id": unique_id, "error": str(exc)},
+        )
+        return
+    if evicted:
+        _write_log(
+            runtime,
+            direction="system",
+            event="file_cache_evicted",
+            details={"evicted_count": evicted, "max_bytes": max_bytes},
+        )
+
+
+def attachment_cache_stats(cache_dir: str, max_bytes: int | None = None) -> dict[str, Any]:
+    """Summarize the attachment blob cache (entry count, bytes, hit/miss counters)."""
+    root = Path(cache_dir)
+    index_path = root / ATTACHMENT_CACHE_INDEX_NAME
+    with _message_store_lock(index_path):
+        index = _load_attachment_cache_index(index_path)
+    entries: dict[str, dict[str, Any]] = index["entries"]
+    lookups = index["hits"] + index["misses"]
+    return {
+        "cache_dir": str(root),
+        "entries": len(entries),
+        "bytes": sum(int(meta.get("size", 0) or 0) for meta in entries.values()),
+        "max_bytes": max_bytes,
+        "hits": index["hits"],
+        "misses": index["misses"],
+        "hit_rate": round(index["hits"] / lookups, 4) if lookups else 0.0,
+    }
+
+
+def _download_attachment(runtime: dict[str, Any], message_id: int, entry: dict[str, Any]) -> dict[str, Any] | None:
+    downloaded = _attachment_cache_fetch(runtime, message_id, entry)
+    if downloaded is None:
+        downloaded = _download_file(
+            runtime=runtime,
+            file_id=str(entry["file_id"]),
+            message_id=message_id,
+            file_type=str(entry.get("type") or "file"),
+            preferred_name=entry.get("preferred_name"),
+            timeout_sec=float(runtime.get("download_timeout_sec", DEFAULT_DOWNLOAD_TIMEOUT_SEC)),
+        )
+        if not downloaded:
+            return None
+        _attachment_cache_store(runtime, entry, Path(downloaded["path"]))
+    resolved = dict(downloaded)
+    for key, value in entry.items():
+        if key not in {"file_id", "file_unique_id", "preferred_name", "status", "type", "path"}:
+            resolved[key] = value
+    if resolved.get("size") is None:
+        resolved["size"] = downloaded.get("size", 0)
+    return resolved
+
+
+def _submit_attachment_download(runtime: dict[str, Any], message_id: int, entry: dict[str, Any]) -> Future:
+    """Queue one attachment fetch; concurrent resolvers of the same file share one future."""
+    key = (str(runtime.get("tasks_dir") or ""), int(message_id), str(entry.get("file_id")))
+    concurrency = max(
+        1,
+        min(MAX_DOWNLOAD_CONCURRENCY, int(runtime.get("download_concurrency", DEFAULT_DOWNLOAD_CONCURRENCY))),
+    )
+    with _DOWNLOAD_LOCK:
+        future = _DOWNLOAD_INFLIGHT.get(key)
+        if future is None:
+            future = _download_executor(concurrency).submit(_download_attachment, runtime, message_id, dict(entry))
+            _DOWNLOAD_INFLIGHT[key] = future
+            future.add_done_callback(lambda done, key=key: _forget_attachment_download(key, done))
+        return future
+
+
+def _forget_attachment_download(key: tuple[str, int, str], future: Future) -> None:
+    with _DOWNLOAD_LOCK:
+        if _DOWNLOAD_INFLIGHT.get(key) is future:
+            del _DOWNLOAD_INFLIGHT[key]
+
+
+def resolve_pending_downloads(
+    runtime: dict[str, Any],
+    messages: list[dict[str, Any]],
+    store_path: str | None = None,
+) -> int:
+    """
+    Fetch attachments of messages still marked `download_pending`.
+
+    Files are downloaded on a shared pool bounded by `download_concurrency`,
+    each under its own `download_timeout_sec` deadline. Entries are replaced in
+    place by `{type, path, size, ...}`; failed or timed-out files are dropped.
+    When `store_path` is given the resolved records are written back.
+    Returns the number of messages resolved.
+    """
+    targets = [msg for msg in messages if isinstance(msg, dict) and msg.get("download_pending")]
+    if not targets:
+        return 0
+
+    jobs: list[tuple[dict[str, Any], Future]] = []
+    for msg in targets:
+        try:
+            message_id = int(msg.get("message_id"))
+        except (TypeError, ValueError):
+            continue
+        for entry in msg.get("files") or []:
+            if (
+                isinstance(entry, dict)
+                and entry.get("status") == DOWNLOAD_STATUS_PENDING
+                and entry.get("file_id")
+            ):
+                jobs.append((entry, _submit_attachment_download(runtime, message_id, entry)))
+
+    if jobs:
+        concurrency = max(1, int(runtime.get("download_concurrency", DEFAULT_DOWNLOAD_CONCURRENCY)))
+        per_file_sec = float(runtime.get("download_timeout_sec", DEFAULT_DOWNLOAD_TIMEOUT_SEC)) + float(
+            runtime.get("api_timeout_sec", 20.0)
         )
+        rounds = (len(jobs) + concurrency - 1) // concurrency
+        wait_futures([future for _, future in jobs], timeout=per_file_sec * rounds)
 
-    return accepted_messages, new_last_update_id
+    results: dict[int, dict[str, Any] | None] = {}
+    for entry, future in jobs:
+        if not future.done():
+            future.cancel()
+            _write_log(
+                runtime,
+                direction="receive",
+                event="file_download_timeout",
+                details={"file_id": entry.get("file_id"), "file_type": entry.get("type")},
+            )
+            results[id(entry)] = None
+            continue
+        try:
+            results[id(entry)] = future.result()
+        except Exception:
+            results[id(entry)] = None
+
+    for msg in targets:
+        resolved_files: list[dict[str, Any]] = []
+        for entry in msg.get("files") or []:
+            if not isinstance(entry, dict):
+                continue
+            if entry.get("status") != DOWNLOAD_STATUS_PENDING:
+                resolved_files.append(entry)
+                continue
+            resolved = results.get(id(entry))
+            if resolved:
+                resolved_files.append(resolved)
+        msg["files"] = resolved_files
+        msg.pop("download_pending", None)
+
+    if store_path:
+        open_message_store(store_path).update_attachments(targets)
+    return len(targets)
 
 
 def get_me(
@@ -891,6 +3141,103 @@ def set_my_name(
     return ok
 
 
+def telegram_text_length(text: str) -> int:
+    """Length as Telegram counts it: UTF-16 code units."""
+    return len((text or "").encode("utf-16-le")) // 2
+
+
+def _text_atoms(text: str, html: bool) -> list[tuple[str, str | None, bool]]:
+    """Split text into unsplittable atoms: single characters, and for HTML whole tags/entities.
+
+    Each atom is ``(token, tag_name, is_closing)``; ``tag_name`` is None for non-tags.
+    """
+    atoms: list[tuple[str, str | None, bool]] = []
+    pos = 0
+    if html:
+        for match in _HTML_TOKEN_RE.finditer(text):
+            atoms.extend((ch, None, False) for ch in text[pos : match.start()])
+            token = match.group(0)
+            name_match = _HTML_TAG_NAME_RE.match(token)
+            if name_match and not token.endswith("/>"):
+                atoms.append((token, name_match.group(2).lower(), bool(name_match.group(1))))
+            else:
+                atoms.append((token, None, False))
+            pos = match.end()
+    atoms.extend((ch, None, False) for ch in text[pos:])
+    return atoms
+
+
+def split_telegram_text(
+    text: str,
+    max_units: int = MAX_TELEGRAM_TEXT_LEN,
+    parse_mode: str | None = None,
+) -> list[str]:
+    """
+    Split text into chunks of at most `max_units` UTF-16 code units.
+
+    Breaks prefer paragraph, then line, then word boundaries in the second half
+    of a chunk and fall back to a hard cut. With parse_mode=HTML, tags and
+    entities are never cut, and tags open at a boundary are closed at the end
+    of the chunk and reopened at the start of the next one.
+    """
+    text = text or ""
+    if telegram_text_length(text) <= max_units:
+        return [text]
+    html = str(parse_mode or "").strip().lower() == "html"
+    atoms = _text_atoms(text, html)
+    chunks: list[str] = []
+    stack: list[tuple[str, str]] = []
+    start = 0
+    while start < len(atoms):
+        pieces = [token for _, token in stack]
+        units = telegram_text_length("".join(pieces))
+        cur_stack = list(stack)
+        # priority -> (atom index, piece count, units, tag stack) just after the break point
+        breaks: dict[int, tuple[int, int, int, list[tuple[str, str]]]] = {}
+        idx = start
+        overflow = False
+        while idx < len(atoms):
+            token, name, closing = atoms[idx]
+            next_stack = cur_stack
+            if name and closing:
+                for pos in range(len(cur_stack) - 1, -1, -1):
+                    if cur_stack[pos][0] == name:
+                        next_stack = cur_stack[:pos]
+                        break
+            elif name:
+                next_stack = cur_stack + [(name, token)]
+            cost = 2 if len(token) == 1 and ord(token) > 0xFFFF else telegram_text_length(token)
+            closing_cost = sum(len(tag) + 3 for tag, _ in next_stack)
+            if units + cost + closing_cost > max_units and idx > start:
+                overflow = True
+                break
+            pieces.append(token)
+            units += cost
+            cur_stack = next_stack
+            idx += 1
+            if token == "\n":
+                priority = 3 if idx - 2 >= start and atoms[idx - 2][0] == "\n" else 2
+            elif token.isspace():
+                priority = 1
+            else:
+                continue
+            breaks[priority] = (idx, len(pieces), units, list(cur_stack))
+        if not overflow:
+            chunks.append("".join(pieces))
+            break
+        cut = (idx, len(pieces), units, list(cur_stack))
+        for priority in (3, 2, 1):
+            candidate = breaks.get(priority)
+            if candidate and candidate[2] >= max_units // 2:
+                cut = candidate
+                break
+        cut_idx, cut_pieces, _, cut_stack = cut
+        chunks.append("".join(pieces[:cut_pieces]) + "".join(f"</{tag}>" for tag, _ in reversed(cut_stack)))
+        stack = cut_stack
+        start = cut_idx
+    return chunks or [""]
+
+
 def send_text_raw(
     runtime: dict[str, Any],
     chat_id: int,
@@ -902,15 +3249,15 @@ def send_text_raw(
     """
     Send text without rewriting or additional formatting.
 
-    If the text exceeds Telegram limits, it is split into contiguous chunks while
-    preserving exact content order.
+    If the text exceeds Telegram limits, it is split by `split_telegram_text` into
+    contiguous chunks while preserving exact content order. The id of the last sent message is left in
+    `runtime["_telegram_last_sent_message_id"]`.
     """
     if text is None:
         text = ""
+    runtime["_telegram_last_sent_message_id"] = None
 
-    chunks = [text[i : i + MAX_TELEGRAM_TEXT_LEN] for i in range(0, len(text), MAX_TELEGRAM_TEXT_LEN)]
-    if not chunks:
-        chunks = [""]
+    chunks = split_telegram_text(text, MAX_TELEGRAM_TEXT_LEN, parse_mode=parse_mode)
 
     for idx, chunk in enumerate(chunks, start=1):
         payload = {"chat_id": int(chat_id), "text": chunk}
@@ -934,6 +3281,10 @@ def send_text_raw(
             )
             return False
 
+        try:
+            runtime["_telegram_last_sent_message_id"] = int((resp.get("result") or {}).get("message_id"))
+        except (TypeError, ValueError):
+            runtime["_telegram_last_sent_message_id"] = None
         _write_log(
             runtime,
             direction="send",
@@ -1094,6 +3445,28 @@ def edit_message_text(
     return True
 
 
+def delete_message(
+    runtime: dict[str, Any],
+    chat_id: int,
+    message_id: int,
+    request_max_attempts: int | None = None,
+) -> bool:
+    """Delete a message the bot sent."""
+    resp = _telegram_request(
+        runtime,
+        "deleteMessage",
+        payload={"chat_id": int(chat_id), "message_id": int(message_id)},
+        max_attempts_override=request_max_attempts,
+    )
+    _write_log(
+        runtime,
+        direction="send",
+        event="delete_message_ok" if resp else "delete_message_failed",
+        details={"chat_id": int(chat_id), "message_id": int(message_id)},
+    )
+    return bool(resp)
+
+
 def send_file_raw(runtime: dict[str, Any], chat_id: int, file_path: str) -> bool:
     """Send one file via sendDocument."""
     p = Path(file_path)
@@ -1145,17 +3518,184 @@ def send_file_raw(runtime: dict[str, Any], chat_id: int, file_path: str) -> bool
     return True
 
 
-def send_files_raw(runtime: dict[str, Any], chat_id: int, text: str, file_paths: list[str]) -> bool:
-    """Send raw text first, then send files one by one."""
+def _upload_result(path: Path, ok: bool, method: str | None, error: Any = None) -> dict[str, Any]:
+    result: dict[str, Any] = {"path": str(path), "ok": bool(ok), "method": method}
+    if not ok:
+        result["error"] = error
+    return result
+
+
+def _upload_error(runtime: dict[str, Any]) -> Any:
+    error = runtime.get("_telegram_last_error")
+    if isinstance(error, dict):
+        return {k: v for k, v in error.items() if k in ("kind", "method", "status_code", "error", "retry_after")}
+    return error
+
+
+def _upload_rejected(runtime: dict[str, Any]) -> bool:
+    """True when the last request got a 400: Telegram refused the upload, so nothing was delivered."""
+    error = runtime.get("_telegram_last_error")
+    return isinstance(error, dict) and error.get("kind") == "http" and error.get("status_code") == 400
+
+
+def _upload_single(runtime: dict[str, Any], chat_id: int, path: Path, as_photo: bool) -> dict[str, Any]:
+    method, field = ("sendPhoto", "photo") if as_photo else ("sendDocument", "document")
+    with path.open("rb") as fp:
+        resp = _telegram_request(runtime, method, payload={"chat_id": int(chat_id)}, files={field: (path.name, fp)})
+    if resp:
+        return _upload_result(path, True, method)
+    if as_photo and _upload_rejected(runtime):
+        # Telegram rejects some valid images as photos (dimensions, ratio); a document always fits.
+        # Timeouts and 5xx are not retried here: the photo may already have been delivered.
+        return _upload_single(runtime, chat_id, path, as_photo=False)
+    return _upload_result(path, False, method, _upload_error(runtime))
+
+
+def _upload_batch(runtime: dict[str, Any], chat_id: int, paths: list[Path], as_photo: bool) -> list[dict[str, Any]]:
+    """Upload one homogeneous batch; sendMediaGroup for 2+ files, per-file fallback on a 400."""
+    # Work on a shallow copy so concurrent batches do not race on the last-error side channel.
+    runtime = dict(runtime)
+    if len(paths) == 1:
+        return [_upload_single(runtime, chat_id, paths[0], as_photo)]
+
+    media_type = "photo" if as_photo else "document"
+    media = [{"type": media_type, "media": f"attach://file{idx}"} for idx in range(len(paths))]
+    with ExitStack() as stack:
+        files = {
+            f"file{idx}": (path.name, stack.enter_context(path.open("rb")))
+            for idx, path in enumerate(paths)
+        }
+        payload = {"chat_id": int(chat_id), "media": json.dumps(media)}
+        resp = _telegram_request(runtime, "sendMediaGroup", payload=payload, files=files)
+    if resp:
+        return [_upload_result(path, True, "sendMediaGroup") for path in paths]
+    if not _upload_rejected(runtime):
+        # The group may have gone through before the error; resending would duplicate it.
+        error = _upload_error(runtime)
+        return [_upload_result(path, False, "sendMediaGroup", error) for path in paths]
+
+    _write_log(
+        runtime,
+        direction="send",
+        event="send_media_group_fallback",
+        details={"chat_id": chat_id, "count": len(paths), "error": _upload_error(runtime)},
+    )
+    return [_upload_single(runtime, chat_id, path, as_photo=False) for path in paths]
+
+
+def send_files(
+    runtime: dict[str, Any],
+    chat_id: int,
+    text: str,
+    file_paths: list[str],
+    compress_photos: bool = False,
+) -> dict[str, Any]:
+    """Send text, then upload files as media groups of up to 10 with concurrent batches.
+
+    Returns ``{"ok", "text_sent", "results"}`` where ``results`` holds one
+    ``{"path", "ok", "method", "error"}`` entry per input file, in input order.
+    Every file is sent as a document by default, keeping the original bytes;
+    ``compress_photos=True`` sends images as (recompressed) photos instead.
+    Photos and documents are never mixed in one group (Telegram rejects that).
+    Delivery order across batches is not guaranteed.
+    """
     if not send_text_raw(runtime, chat_id=chat_id, text=text):
-        return False
+        return {"ok": False, "text_sent": False, "results": []}
+
+    max_file_bytes = int(runtime.get("max_telegram_file_bytes", MAX_TELEGRAM_FILE_BYTES))
+    results: list[dict[str, Any] | None] = []
+    photos: list[tuple[int, Path]] = []
+    documents: list[tuple[int, Path]] = []
+    for idx, file_path in enumerate(file_paths or []):
+        p = Path(file_path)
+        if not p.is_file():
+            _write_log(
+                runtime,
+                direction="send",
+                event="send_file_missing",
+                details={"chat_id": chat_id, "file_path": str(p)},
+            )
+            results.append(_upload_result(p, False, None, {"kind": "missing"}))
+            continue
+        file_size = p.stat().st_size
+        if file_size > max_file_bytes:
+            _write_log(
+                runtime,
+                direction="send",
+                event="send_file_too_large",
+                details={
+                    "chat_id": chat_id,
+                    "file_path": str(p),
+                    "size_bytes": file_size,
+                    "max_size_bytes": max_file_bytes,
+                },
+            )
+            results.append(_upload_result(p, False, None, {"kind": "too_large", "size_bytes": file_size}))
+            continue
+        results.append(None)
+        is_photo = (
+            compress_photos and p.suffix.lower() in PHOTO_UPLOAD_SUFFIXES and file_size <= PHOTO_UPLOAD_MAX_BYTES
+        )
+        (photos if is_photo else documents).append((idx, p))
+
+    batches: list[tuple[list[tuple[int, Path]], bool]] = []
+    for group, as_photo in ((photos, True), (documents, False)):
+        for start in range(0, len(group), MEDIA_GROUP_MAX_ITEMS):
+            batches.append((group[start : start + MEDIA_GROUP_MAX_ITEMS], as_photo))
+
+    def run_batch(batch: list[tuple[int, Path]], as_photo: bool) -> None:
+        batch_results = _upload_batch(runtime, chat_id, [p for _, p in batch], as_photo)
+        for (idx, _), result in zip(batch, batch_results):
+            results[idx] = result
+
+    concurrency = max(
+        1,
+        min(MAX_UPLOAD_CONCURRENCY, int(runtime.get("upload_concurrency", DEFAULT_UPLOAD_CONCURRENCY))),
+    )
+    if len(batches) <= 1 or concurrency <= 1:
+        for batch, as_photo in batches:
+            run_batch(batch, as_photo)
+    else:
+        # Every request still passes through the shared send scheduler, so global and per-chat pacing hold.
+        with ThreadPoolExecutor(
+            max_workers=min(concurrency, len(batches)), thread_name_prefix="telegram-upload"
+        ) as pool:
+            for future in [pool.submit(run_batch, batch, as_photo) for batch, as_photo in batches]:
+                future.result()
+
+    final = [r for r in results if r is not None]
+    ok_count = sum(1 for r in final if r["ok"])
+    _write_log(
+        runtime,
+        direction="send",
+        event="send_files_done",
+        details={
+            "chat_id": chat_id,
+            "count": len(final),
+            "ok_count": ok_count,
+            "batches": len(batches),
+            "failed": [r["path"] for r in final if not r["ok"]],
+        },
+    )
+    return {"ok": ok_count == len(final), "text_sent": True, "results": final}
 
-    all_ok = True
-    for file_path in file_paths or []:
-        ok = send_file_raw(runtime, chat_id=chat_id, file_path=file_path)
-        if not ok:
-            all_ok = False
-    return all_ok
+
+def send_files_raw(
+    runtime: dict[str, Any],
+    chat_id: int,
+    text: str,
+    file_paths: list[str],
+    compress_photos: bool = False,
+) -> bool:
+    """Send raw text first, then the files via ``send_files``.
+
+    Per-file outcomes are left in ``runtime["_telegram_last_file_results"]``.
+    """
+    outcome = send_files(
+        runtime, chat_id=chat_id, text=text, file_paths=file_paths, compress_photos=compress_photos
+    )
+    runtime["_telegram_last_file_results"] = outcome["results"]
+    return bool(outcome["ok"])
 
 
 def compose_ack_and_progress_message(
@@ -1368,25 +3908,34 @@ def send_final_answer(
     )
 
 
-def build_24h_context(messages: list[dict[str, Any]], current_message_id: int | None = None) -> str:
+def build_24h_context(
+    messages: list[dict[str, Any]] | None,
+    current_message_id: int | None = None,
+    *,
+    store_path: str | None = None,
+    chat_id: int | None = None,
+) -> str:
     """
     Build 24-hour conversation context.
 
     This function is intentionally separate from receive logic.
+    With `store_path` and `chat_id`, only that chat's last 24h is read from the
+    store via `messages_for_chat` and `messages` may be None.
     """
-    now = datetime.now()
-    cutoff = now - timedelta(hours=24)
+    cutoff_epoch = int(time.time()) - 24 * 3600
+    if store_path is not None and chat_id is not None:
+        messages = list(reversed(messages_for_chat(store_path, chat_id, since=cutoff_epoch)))
 
     lines: list[str] = ["=== Last 24h Conversation Context ===", ""]
     appended = 0
 
-    for msg in messages:
+    for msg in messages or []:
         msg_type = msg.get("type", "user")
         if current_message_id is not None and msg_type == "user" and msg.get("message_id") == current_message_id:
             break
 
-        ts = _parse_timestamp(msg.get("timestamp"))
-        if ts is None or ts < cutoff:
+        ts_epoch = _message_epoch(msg)
+        if ts_epoch <= 0 or ts_epoch < cutoff_epoch:
             continue
 
         if msg_type == "bot":
@@ -1434,6 +3983,7 @@ def _download_file(
     message_id: int,
     file_type: str,
     preferred_name: str | None,
+    timeout_sec: float | None = None,
 ) -> dict[str, Any] | None:
     file_meta_resp = _telegram_request(runtime, "getFile", payload={"file_id": file_id})
     if not file_meta_resp:
@@ -1468,15 +4018,23 @@ def _download_file(
     else:
         filename = _make_default_filename(file_type, message_id, remote_file_path)
     local_path = task_dir / filename
-
-    download_url = f"{runtime['file_base']}/{remote_file_path}"
+    partial_path = local_path.with_name(f"{local_path.name}.part")
+
+    download_url = f"{_effective_base(runtime, 'file_base')}/{remote_file_path}"
+    request_timeout = float(runtime["api_timeout_sec"])
+    deadline = None
+    if timeout_sec is not None:
+        deadline = time.monotonic() + float(timeout_sec)
+        request_timeout = min(request_timeout, float(timeout_sec))
     written_bytes = 0
     try:
-        session = _get_http_session()
-        with session.get(download_url, timeout=float(runtime["api_timeout_sec"]), stream=True) as response:
+        session = _get_http_session(download_url)
+        with session.get(download_url, timeout=request_timeout, stream=True) as response:
             response.raise_for_status()
-            with local_path.open("wb") as f:
+            with partial_path.open("wb") as f:
                 for chunk in response.iter_content(chunk_size=64 * 1024):
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise TimeoutError(f"download exceeded {float(timeout_sec):.0f}s")
                     if not chunk:
                         continue
                     written_bytes += len(chunk)
@@ -1485,18 +4043,25 @@ def _download_file(
                             f"downloaded file exceeds size limit ({written_bytes}>{max_file_bytes})"
                         )
                     f.write(chunk)
-        _ensure_private_file(local_path)
+        _ensure_private_file(partial_path)
+        os.replace(partial_path, local_path)
     except Exception as exc:
         try:
-            if local_path.exists():
-                local_path.unlink()
+            if partial_path.exists():
+                partial_path.unlink()
         except OSError:
             pass
         is_size_limit = isinstance(exc, ValueError) and "exceeds size limit" in str(exc)
+        if is_size_limit:
+            event = "file_download_too_large"
+        elif isinstance(exc, TimeoutError):
+            event = "file_download_timeout"
+        else:
+            event = "file_download_failed"
         _write_log(
             runtime,
             direction="receive",
-            event="file_download_too_large" if is_size_limit else "file_download_failed",
+            event=event,
             details={
                 "file_id": file_id,
                 "message_id": message_id,
@@ -1522,6 +4087,90 @@ def _download_file(
     return {"type": file_type, "path": str(local_path), "size": file_size}
 
 
+class _SendScheduler:
+    """
+    Outbound pacing for one bot token.
+
+    Each outgoing call reserves a slot in the global bucket and in its chat's
+    bucket (GCRA: a theoretical arrival time per key), so bursts are spread out
+    instead of tripping flood control. A 429 `retry_after` blocks only the
+    chat it was reported for; other chats keep sending.
+    """
+
+    _PRUNE_THRESHOLD = 1024
+
+    def __init__(self, global_per_sec: float, chat_per_sec: float, group_per_min: float) -> None:
+        self._lock = threading.Lock()
+        self._global_interval = 1.0 / global_per_sec
+        # Allow up to one second worth of global burst.
+        self._global_tolerance = max(0.0, (global_per_sec - 1.0) * self._global_interval)
+        self._chat_interval = 1.0 / chat_per_sec
+        self._group_interval = 60.0 / group_per_min
+        self._tat: dict[Any, float] = {}
+        self._blocked_until: dict[Any, float] = {}
+
+    def reserve(self, chat_id: int | None, pace: bool = True) -> float:
+        """Claim the next send slot and return how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._blocked_until.get(chat_id, 0.0), self._blocked_until.get(None, 0.0))
+            if not pace:
+                return start - now
+            global_tat = self._tat.get("global", now)
+            start = max(start, global_tat - self._global_tolerance)
+            # The global slot is charged from now, not from a chat's blocked start,
+            # so one throttled chat never pushes back every other chat.
+            self._tat["global"] = max(global_tat, now) + self._global_interval
+            if chat_id is not None:
+                interval = self._group_interval if chat_id < 0 else self._chat_interval
+                start = max(start, self._tat.get(chat_id, now))
+                self._tat[chat_id] = start + interval
+            if len(self._tat) > self._PRUNE_THRESHOLD:
+                self._tat = {key: tat for key, tat in self._tat.items() if tat > now}
+                self._blocked_until = {key: until for key, until in self._blocked_until.items() if until > now}
+            return start - now
+
+    def block(self, chat_id: int | None, retry_after_sec: float) -> None:
+        with self._lock:
+            until = time.monotonic() + max(0.0, float(retry_after_sec))
+            self._blocked_until[chat_id] = max(self._blocked_until.get(chat_id, 0.0), until)
+
+
+def _send_scheduler(runtime: dict[str, Any]) -> _SendScheduler:
+    key = str(runtime.get("api_base") or "")
+    with _SEND_SCHEDULERS_LOCK:
+        scheduler = _SEND_SCHEDULERS.get(key)
+        if scheduler is None:
+            scheduler = _SendScheduler(
+                global_per_sec=_env_positive_float("TELEGRAM_RATE_GLOBAL_PER_SEC", DEFAULT_RATE_GLOBAL_PER_SEC),
+                chat_per_sec=_env_positive_float("TELEGRAM_RATE_CHAT_PER_SEC", DEFAULT_RATE_CHAT_PER_SEC),
+                group_per_min=_env_positive_float("TELEGRAM_RATE_GROUP_PER_MIN", DEFAULT_RATE_GROUP_PER_MIN),
+            )
+            _SEND_SCHEDULERS[key] = scheduler
+        return scheduler
+
+
+def _rate_limit_chat_id(payload: dict[str, Any] | None) -> int | None:
+    try:
+        return int((payload or {}).get("chat_id"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _response_retry_after(resp: requests.Response) -> float:
+    try:
+        data = resp.json()
+        retry_after = (data.get("parameters") or {}).get("retry_after")
+        if retry_after is not None:
+            return max(0.0, float(retry_after))
+    except Exception:
+        pass
+    try:
+        return max(0.0, float(resp.headers.get("Retry-After", "")))
+    except (TypeError, ValueError):
+        return 1.0
+
+
 def _telegram_request(
     runtime: dict[str, Any],
     method: str,
@@ -1529,21 +4178,47 @@ def _telegram_request(
     files: dict[str, Any] | None = None,
     max_attempts_override: int | None = None,
 ) -> dict[str, Any] | None:
-    url = f"{runtime['api_base']}/{method}"
     timeout = float(runtime["api_timeout_sec"])
     max_attempts = _request_max_attempts(max_attempts_override)
     retry_delay_sec = _request_retry_delay_sec()
     retry_backoff = _request_retry_backoff()
     retry_jitter_sec = _request_retry_jitter_sec()
-    session = _get_http_session()
-
-    for attempt in range(1, max_attempts + 1):
+    failed_over = False
+    scheduler = _send_scheduler(runtime)
+    paced = method.startswith(RATE_LIMITED_METHOD_PREFIXES) and method not in UNPACED_METHODS
+    chat_id = _rate_limit_chat_id(payload)
+    rate_limit_max_wait_sec = _env_positive_float("TELEGRAM_RATE_LIMIT_MAX_WAIT_SEC", DEFAULT_RATE_LIMIT_MAX_WAIT_SEC)
+    rate_limit_waited_sec = 0.0
+
+    attempt = 0
+    while attempt < max_attempts:
+        attempt += 1
+        wait_sec = scheduler.reserve(chat_id, pace=paced)
+        if wait_sec > 0:
+            time.sleep(wait_sec)
+        request_host = _active_api_host(runtime)
+        url = f"{_effective_base(runtime, 'api_base', request_host)}/{method}"
+        session = _get_http_session(url)
         try:
             if files:
+                _rewind_upload_files(files)
                 resp = session.post(url, data=payload or {}, files=files, timeout=timeout)
             else:
                 resp = session.post(url, json=payload or {}, timeout=timeout)
         except Exception as exc:
+            if not failed_over and isinstance(exc, requests.exceptions.ConnectionError):
+                new_host = _telegram_host_failover(runtime, request_host)
+                if new_host:
+                    # One immediate retry on the next-best host, on top of the normal attempts.
+                    failed_over = True
+                    attempt -= 1
+                    _write_log(
+                        runtime,
+                        direction="system",
+                        event="api_host_failover",
+                        details={"method": method, "host": new_host, "error_type": type(exc).__name__},
+                    )
+                    continue
             if attempt < max_attempts:
                 base_sleep_sec = retry_delay_sec * (retry_backoff ** (attempt - 1))
                 jitter_sec = random.uniform(0.0, retry_jitter_sec) if retry_jitter_sec > 0 else 0.0
@@ -1566,7 +4241,7 @@ def _telegram_request(
                 time.sleep(max(0.05, sleep_sec))
                 continue
 
-            network_diag = _collect_network_diagnostics()
+            network_diag = _network_diagnostics_ref(runtime)
             runtime["_telegram_last_error"] = {
                 "kind": "network",
                 "method": method,
@@ -1590,6 +4265,40 @@ def _telegram_request(
             )
             return None
 
+        if resp.status_code == 429:
+            retry_after = _response_retry_after(resp)
+            scheduler.block(chat_id, retry_after)
+            if rate_limit_waited_sec + retry_after <= rate_limit_max_wait_sec:
+                # Flood control is not a failed attempt: wait out this chat's queue and resend.
+                rate_limit_waited_sec += retry_after
+                attempt -= 1
+                _write_log(
+                    runtime,
+                    direction="system",
+                    event="rate_limited_retry",
+                    details={"method": method, "chat_id": chat_id, "retry_after": retry_after},
+                )
+                continue
+            runtime["_telegram_last_error"] = {
+                "kind": "rate_limited",
+                "method": method,
+                "status_code": 429,
+                "retry_after": retry_after,
+                "body": str(resp.text or "")[:2000],
+            }
+            _write_log(
+                runtime,
+                direction="system",
+                event="rate_limited",
+                details={
+                    "method": method,
+                    "chat_id": chat_id,
+                    "retry_after": retry_after,
+                    "waited_sec": round(rate_limit_waited_sec, 3),
+                },
+            )
+            return None
+
         if resp.status_code != 200:
             runtime["_telegram_last_error"] = {
                 "kind": "http",
@@ -1642,6 +4351,40 @@ def _telegram_request(
     return None
 
 
+def _rewind_upload_files(files: dict[str, Any]) -> None:
+    # A retried multipart upload must resend the file from its first byte.
+    for value in files.values():
+        fp = value[1] if isinstance(value, tuple) and len(value) > 1 else value
+        seek = getattr(fp, "seek", None)
+        if callable(seek):
+            try:
+                seek(0)
+            except (OSError, ValueError):
+                pass
+
+
+def _env_positive_float(name: str, default: float) -> float:
+    raw = (os.getenv(name, "") or "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    raw = (os.getenv(name, "") or "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return default
+    return value if value >= minimum else default
+
+
 def _request_max_attempts(override: int | None) -> int:
     if isinstance(override, int):
         return max(1, override)
@@ -1752,14 +4495,155 @@ def _safe_dedupe_fragment(value: str) -> str:
     return normalized[:80]
 
 
-def _get_http_session() -> requests.Session:
-    global _HTTP_SESSION
-    if _HTTP_SESSION is None:
-        _HTTP_SESSION = requests.Session()
-        _HTTP_SESSION.headers.update({"Connection": "keep-alive"})
+class _HttpPoolManager:
+    """
+    One keep-alive `requests.Session` with a dedicated connection pool per host
+    and endpoint kind (Bot API vs. file downloads).
+
+    Adapters retry only connection setup at the transport layer (a POST that
+    reached Telegram is never resent here), and pools idle for longer than
+    `idle_timeout_sec` are closed lazily on the next lookup.
+    """
+
+    def __init__(self, pool_size: int, max_retries: int, idle_timeout_sec: float) -> None:
+        self.pool_size = max(1, int(pool_size))
+        self.max_retries = max(0, int(max_retries))
+        self.idle_timeout_sec = max(1.0, float(idle_timeout_sec))
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        self.session.mount("https://", self._new_adapter())
+        self.session.mount("http://", self._new_adapter())
+        self._adapters: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._last_reap = time.monotonic()
+        self._reaped = 0
+
+    def _new_adapter(self) -> HTTPAdapter:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            redirect=0,
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        return HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+
+    @staticmethod
+    def _prefix(url: str) -> tuple[str, str]:
+        parts = urlsplit(url)
+        base = f"{parts.scheme}://{parts.netloc}/"
+        if parts.path.startswith("/file/"):
+            return f"{base}file/", "file"
+        return base, "api"
+
+    def session_for(self, url: str) -> requests.Session:
+        prefix, kind = self._prefix(url)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._adapters.get(prefix)
+            if entry is None:
+                entry = {"adapter": self._new_adapter(), "kind": kind}
+                self.session.mount(prefix, entry["adapter"])
+                self._adapters[prefix] = entry
+            entry["last_used"] = now
+            if now - self._last_reap >= min(HTTP_POOL_REAP_INTERVAL_SEC, self.idle_timeout_sec):
+                self._reap_idle_locked(now)
+        return self.session
+
+    def _reap_idle_locked(self, now: float) -> None:
+        self._last_reap = now
+        for entry in self._adapters.values():
+            adapter = entry["adapter"]
+            if now - entry["last_used"] < self.idle_timeout_sec or not len(adapter.poolmanager.pools):
+                continue
+            # Clearing the pool manager closes idle sockets; connections in use are closed on release.
+            adapter.close()
+            self._reaped += 1
+
+    @staticmethod
+    def _adapter_stats(adapter: HTTPAdapter) -> dict[str, int]:
+        stats = {"requests": 0, "new_connections": 0, "open_connections": 0, "idle_connections": 0}
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += int(getattr(pool, "num_requests", 0))
+            stats["new_connections"] += int(getattr(pool, "num_connections", 0))
+            queue_ = getattr(pool, "pool", None)
+            if queue_ is None:
+                continue
+            idle = sum(1 for conn in list(queue_.queue) if conn is not None)
+            in_use = max(0, int(queue_.maxsize) - queue_.qsize())
+            stats["idle_connections"] += idle
+            stats["open_connections"] += idle + in_use
+        return stats
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            entries = [(prefix, dict(entry)) for prefix, entry in self._adapters.items()]
+            reaped = self._reaped
+        pools: list[dict[str, Any]] = []
+        totals = {"requests": 0, "new_connections": 0, "open_connections": 0, "idle_connections": 0}
+        for prefix, entry in entries:
+            adapter_stats = self._adapter_stats(entry["adapter"])
+            for key in totals:
+                totals[key] += adapter_stats[key]
+            pools.append(
+                {
+                    # `kind` already tells the api and file pools of one host apart.
+                    "host": urlsplit(prefix).netloc,
+                    "kind": entry["kind"],
+                    "idle_sec": round(now - entry["last_used"], 3),
+                    **adapter_stats,
+                    "reuse_rate": _reuse_rate(adapter_stats),
+                }
+            )
+        return {
+            "pool_size": self.pool_size,
+            "max_retries": self.max_retries,
+            "idle_timeout_sec": self.idle_timeout_sec,
+            "reaped": reaped,
+            "pools": pools,
+            **totals,
+            "reuse_rate": _reuse_rate(totals),
+        }
+
+
+def _reuse_rate(stats: dict[str, int]) -> float:
+    requests_total = int(stats.get("requests") or 0)
+    if requests_total <= 0:
+        return 0.0
+    return round(max(0.0, 1.0 - int(stats.get("new_connections") or 0) / requests_total), 4)
+
+
+def _get_http_session(url: str | None = None) -> requests.Session:
+    """Return the shared session, mounting a per-host pool for `url` when given."""
+    global _HTTP_SESSION, _HTTP_POOL
+    with _HTTP_POOL_LOCK:
+        if _HTTP_SESSION is None:
+            _HTTP_POOL = _HttpPoolManager(
+                pool_size=_env_int("TELEGRAM_HTTP_POOL_SIZE", DEFAULT_HTTP_POOL_SIZE, minimum=1),
+                max_retries=_env_int("TELEGRAM_HTTP_MAX_RETRIES", DEFAULT_HTTP_MAX_RETRIES, minimum=0),
+                idle_timeout_sec=_env_positive_float("TELEGRAM_HTTP_IDLE_TIMEOUT_SEC", DEFAULT_HTTP_IDLE_TIMEOUT_SEC),
+            )
+            _HTTP_SESSION = _HTTP_POOL.session
+        pool = _HTTP_POOL if _HTTP_POOL is not None and _HTTP_POOL.session is _HTTP_SESSION else None
+    if url and pool is not None:
+        return pool.session_for(url)
     return _HTTP_SESSION
 
 
+def http_pool_stats() -> dict[str, Any]:
+    """Connection pool metrics: requests, new connections, reuse rate, open/idle sockets."""
+    with _HTTP_POOL_LOCK:
+        pool = _HTTP_POOL if _HTTP_POOL is not None and _HTTP_POOL.session is _HTTP_SESSION else None
+    return pool.stats() if pool is not None else {}
+
+
 def _parse_allowed_users(value: Any) -> list[int]:
     if value is None:
         return []
@@ -1792,6 +4676,32 @@ def _format_message_timestamp(raw_date: Any) -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+def _timestamp_epoch(value: Any) -> int:
+    """Parse a timestamp once into integer epoch seconds (0 when unparsable)."""
+    parsed = _parse_timestamp(value)
+    if parsed is None:
+        return 0
+    try:
+        return int(parsed.timestamp())
+    except (OverflowError, OSError, ValueError):
+        return 0
+
+
+def _message_epoch(msg: dict[str, Any]) -> int:
+    """
+    Return the canonical `ts_epoch` of a stored record.
+
+    Records written before the field existed are backfilled in place, so the
+    next save persists the value and the string is never parsed again.
+    """
+    value = msg.get("ts_epoch")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    epoch = _timestamp_epoch(msg.get("timestamp"))
+    msg["ts_epoch"] = epoch
+    return epoch
+
+
 def _parse_timestamp(value: Any) -> datetime | None:
     if isinstance(value, datetime):
         return value
@@ -1824,44 +4734,126 @@ def _make_default_filename(file_type: str, message_id: int, remote_path: str) ->
     return f"{prefix}_{message_id}{ext}"
 
 
+class _BufferedLogWriter:
+    """
+    Process-wide JSONL log buffer shared by every runtime.
+
+    Records are redacted and serialized on the caller's thread, then appended
+    to the day file (`<logs_dir>/YYYY-MM-DD.log`) by a background thread every
+    `flush_interval_sec`, or sooner once `max_buffer_bytes` are pending. The
+    directory setup and retention cleanup run once per logs dir and day.
+    A non-positive interval writes through on the caller's thread.
+    """
+
+    def __init__(self, flush_interval_sec: float, max_buffer_bytes: int) -> None:
+        self.flush_interval_sec = float(flush_interval_sec)
+        self.max_buffer_bytes = max(1, int(max_buffer_bytes))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending: dict[Path, list[tuple[str, str]]] = {}
+        self._pending_bytes = 0
+        self._prepared_day: dict[Path, str] = {}
+        self._thread: threading.Thread | None = None
+
+    def append(self, logs_dir: Path, day: str, line: str) -> None:
+        with self._lock:
+            self._pending.setdefault(logs_dir, []).append((day, line))
+            self._pending_bytes += len(line)
+            pending_bytes = self._pending_bytes
+            if self.flush_interval_sec > 0 and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name="telegram-log-writer", daemon=True)
+                self._thread.start()
+        if self.flush_interval_sec <= 0 or pending_bytes >= self.max_buffer_bytes * LOG_BUFFER_HARD_LIMIT_FACTOR:
+            # Write-through mode, or the flusher is falling behind: keep memory bounded.
+            self.flush()
+        elif pending_bytes >= self.max_buffer_bytes:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval_sec)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._pending_bytes = self._pending, {}, 0
+            for logs_dir, entries in pending.items():
+                by_day: dict[str, list[str]] = {}
+                for day, line in entries:
+                    by_day.setdefault(day, []).append(line)
+                for day, lines in by_day.items():
+                    try:
+                        self._append_lines(logs_dir, day, lines)
+                    except OSError:
+                        # The directory may have been removed underneath us; rebuild it once.
+                        self._prepared_day.pop(logs_dir, None)
+                        try:
+                            self._append_lines(logs_dir, day, lines)
+                        except OSError:
+                            pass
+
+    def _append_lines(self, logs_dir: Path, day: str, lines: list[str]) -> None:
+        if self._prepared_day.get(logs_dir) != day:
+            logs_dir.mkdir(parents=True, exist_ok=True)
+            _ensure_private_dir(logs_dir)
+            _cleanup_old_logs(logs_dir)
+            self._prepared_day[logs_dir] = day
+        log_path = logs_dir / f"{day}.log"
+        created = not log_path.exists()
+        with log_path.open("a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        if created:
+            _ensure_private_file(log_path)
+
+
+def _log_writer() -> _BufferedLogWriter:
+    global _LOG_WRITER
+    with _LOG_WRITER_LOCK:
+        if _LOG_WRITER is None:
+            raw_interval = (os.getenv("TELEGRAM_LOG_FLUSH_INTERVAL_SEC", "") or "").strip()
+            try:
+                flush_interval_sec = float(raw_interval) if raw_interval else DEFAULT_LOG_FLUSH_INTERVAL_SEC
+            except ValueError:
+                flush_interval_sec = DEFAULT_LOG_FLUSH_INTERVAL_SEC
+            _LOG_WRITER = _BufferedLogWriter(
+                flush_interval_sec=flush_interval_sec,
+                max_buffer_bytes=_env_int("TELEGRAM_LOG_BUFFER_BYTES", DEFAULT_LOG_BUFFER_BYTES, minimum=1),
+            )
+        return _LOG_WRITER
+
+
+def flush_logs() -> None:
+    """Write out all buffered log records now (also runs at interpreter exit)."""
+    writer = _LOG_WRITER
+    if writer is not None:
+        writer.flush()
+
+
+atexit.register(flush_logs)
+
+
 def _write_log_direct(logs_dir: Path, direction: str, event: str, details: dict[str, Any]) -> None:
     """Write log without runtime dict (used during initialization)."""
     try:
-        logs_dir.mkdir(parents=True, exist_ok=True)
-        _ensure_private_dir(logs_dir)
-
-        log_path = logs_dir / f"{datetime.now().strftime('%Y-%m-%d')}.log"
+        now = datetime.now()
         record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
             "direction": direction,
             "event": event,
             "details": details,
         }
         record = _redact_sensitive_payload(record)
-        with log_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
-        _ensure_private_file(log_path)
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        _log_writer().append(Path(logs_dir), now.strftime("%Y-%m-%d"), line)
     except Exception:
         pass
 
 
 def _write_log(runtime: dict[str, Any], direction: str, event: str, details: dict[str, Any]) -> None:
-    logs_dir = Path(runtime["logs_dir"])
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    _ensure_private_dir(logs_dir)
-    _cleanup_old_logs(logs_dir)
-
-    log_path = logs_dir / f"{datetime.now().strftime('%Y-%m-%d')}.log"
-    record = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "direction": direction,
-        "event": event,
-        "details": details,
-    }
-    record = _redact_sensitive_payload(record)
-    with log_path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-    _ensure_private_file(log_path)
+    _write_log_direct(Path(runtime["logs_dir"]), direction, event, details)
 
 
 def _collect_network_diagnostics() -> dict[str, Any]:
@@ -1911,6 +4903,55 @@ def _collect_network_diagnostics() -> dict[str, Any]:
     return diag
 
 
+def _refresh_network_diagnostics(runtime: dict[str, Any]) -> None:
+    try:
+        snapshot = _collect_network_diagnostics()
+    except Exception as exc:
+        snapshot = {"collect_error": f"{type(exc).__name__}: {exc}"}
+    with _NETWORK_DIAG_LOCK:
+        _NETWORK_DIAG["seq"] += 1
+        diag_id = f"netdiag-{int(time.time())}-{_NETWORK_DIAG['seq']}"
+        _NETWORK_DIAG.update(id=diag_id, collected_at=time.monotonic(), snapshot=snapshot)
+    _write_log(runtime, direction="system", event="network_diagnostics", details={"diag_id": diag_id, **snapshot})
+
+
+def _network_diagnostics_ref(runtime: dict[str, Any]) -> dict[str, Any]:
+    """
+    Reference to the latest network diagnostics snapshot, for error logs.
+
+    Never blocks: a snapshot older than TELEGRAM_NETWORK_DIAG_TTL_SEC (or none
+    at all) is refreshed on a background thread, which logs it once as a
+    `network_diagnostics` event under the `diag_id` that later errors point to.
+    """
+    ttl_sec = _env_positive_float("TELEGRAM_NETWORK_DIAG_TTL_SEC", DEFAULT_NETWORK_DIAG_TTL_SEC)
+    now = time.monotonic()
+    with _NETWORK_DIAG_LOCK:
+        diag_id = _NETWORK_DIAG["id"]
+        age_sec = now - float(_NETWORK_DIAG["collected_at"]) if diag_id else None
+        stale = age_sec is None or age_sec > ttl_sec
+        thread = _NETWORK_DIAG["thread"]
+        refreshing = thread is not None and thread.is_alive()
+        if stale and not refreshing:
+            thread = threading.Thread(
+                target=_refresh_network_diagnostics,
+                args=(dict(runtime),),
+                name="telegram-network-diag",
+                daemon=True,
+            )
+            _NETWORK_DIAG["thread"] = thread
+            thread.start()
+            refreshing = True
+        snapshot = _NETWORK_DIAG["snapshot"] or {}
+    ref: dict[str, Any] = {
+        "diag_id": diag_id,
+        "age_sec": round(age_sec, 1) if age_sec is not None else None,
+        "refreshing": refreshing,
+    }
+    if "dns_lookup_ok" in snapshot:
+        ref["dns_lookup_ok"] = snapshot["dns_lookup_ok"]
+    return ref
+
+
 def _cleanup_old_logs(logs_dir: Path) -> None:
     cutoff_date = datetime.now().date() - timedelta(days=LOG_RETENTION_DAYS - 1)
     for log_file in logs_dir.glob("*.log"):
@@ -1925,30 +4966,67 @@ def _cleanup_old_logs(logs_dir: Path) -> None:
                 pass
 
 
-def _prune_message_store_data(data: dict[str, Any], retention_days: int) -> int:
-    """Prune old messages from store while preserving last_update_id."""
-    messages = data.get("messages", [])
-    if not isinstance(messages, list) or not messages:
-        return 0
+def _store_order_key(msg: Any) -> int:
+    return _message_epoch(msg) if isinstance(msg, dict) else 0
 
-    cutoff = datetime.now() - timedelta(days=max(1, retention_days))
-    kept: list[dict[str, Any]] = []
-    removed = 0
 
-    for msg in messages:
-        if not isinstance(msg, dict):
-            kept.append(msg)
-            continue
+def _ensure_messages_ordered(data: dict[str, Any]) -> bool:
+    """
+    Keep `data["messages"]` sorted by `ts_epoch` (stable, undated records first).
 
-        ts = _parse_timestamp(msg.get("timestamp"))
-        if ts is None or ts >= cutoff:
-            kept.append(msg)
-            continue
+    The sort runs once per store; afterwards the `ordered_by` marker lets
+    inserts and pruning rely on the order. Returns True when data changed.
+    """
+    if data.get(MESSAGE_STORE_ORDER_KEY) == MESSAGE_STORE_ORDER:
+        return False
+    messages = data.get("messages")
+    if isinstance(messages, list):
+        messages.sort(key=_store_order_key)
+    data[MESSAGE_STORE_ORDER_KEY] = MESSAGE_STORE_ORDER
+    return True
+
+
+def _insert_message_ordered(messages: list[Any], record: dict[str, Any]) -> None:
+    epoch = _store_order_key(record)
+    if not messages or epoch >= _store_order_key(messages[-1]):
+        messages.append(record)
+        return
+    messages.insert(bisect_right(messages, epoch, key=_store_order_key), record)
+
+
+def _oldest_message_epoch(data: dict[str, Any]) -> int | None:
+    """First dated epoch of an ordered store (0 when none, None when unordered)."""
+    messages = data.get("messages")
+    if not isinstance(messages, list) or data.get(MESSAGE_STORE_ORDER_KEY) != MESSAGE_STORE_ORDER:
+        return None
+    first_dated = bisect_right(messages, 0, key=_store_order_key)
+    return _store_order_key(messages[first_dated]) if first_dated < len(messages) else 0
+
+
+def _prune_message_store_data(
+    data: dict[str, Any],
+    retention_days: int,
+    removed_out: list[dict[str, Any]] | None = None,
+) -> int:
+    """
+    Prune old messages from an ordered store while preserving last_update_id.
 
-        removed += 1
+    The deleted records are appended to `removed_out` when given.
+    """
+    messages = data.get("messages", [])
+    if not isinstance(messages, list) or not messages:
+        return 0
+    _ensure_messages_ordered(data)
 
+    cutoff_epoch = int(time.time()) - max(1, retention_days) * 86400
+    # Undated records (epoch 0) sort first and are always kept.
+    first_dated = bisect_right(messages, 0, key=_store_order_key)
+    first_kept = bisect_left(messages, cutoff_epoch, lo=first_dated, key=_store_order_key)
+    removed = first_kept - first_dated
     if removed:
-        data["messages"] = kept
+        if removed_out is not None:
+            removed_out.extend(messages[first_dated:first_kept])
+        del messages[first_dated:first_kept]
     return removed
 
 
@@ -2015,15 +5093,7 @@ def _redact_sensitive_text(text: str, force: bool = False) -> str:
     )
     redacted = _AUTH_BEARER_RE.sub(lambda m: f"{m.group(1)}{REDACTED_VALUE}", redacted)
 
-    for pattern in (
-        _TELEGRAM_BOT_TOKEN_RE,
-        _OPENAI_KEY_RE,
-        _GITHUB_TOKEN_RE,
-        _AWS_ACCESS_KEY_RE,
-        _SLACK_TOKEN_RE,
-    ):
-        redacted = pattern.sub(REDACTED_VALUE, redacted)
-    return redacted
+    return _SECRET_TOKEN_RE.sub(REDACTED_VALUE, redacted)
 
 
 def _replace_assignment_secret(match: re.Match[str]) -> str:
@@ -70,6 +70,11 @@ def cmd_check() -> None:
     _run_python_module("sonolbot.core.quick_check", check=False)
 
 
+@main.command("cache-stats", help="Show Telegram attachment cache statistics.")
+def cmd_cache_stats() -> None:
+    _run_python_module("sonolbot.core.attachment_cache_stats")
+
+
 @main.command("get-my-id", help="Show Telegram ID of current bot token.")
 def cmd_get_my_id() -> None:
     _run_python_module("sonolbot.core.get_my_id")
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Print Telegram attachment cache statistics as JSON."""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+
+from sonolbot.core.skill_bridge import get_attachment_cache_dir, get_telegram_skill
+
+
+def main() -> int:
+    telegram = get_telegram_skill()
+    raw_max = os.getenv("TELEGRAM_ATTACHMENT_CACHE_MAX_BYTES", "").strip()
+    try:
+        max_bytes = int(raw_max) if raw_max else int(telegram.DEFAULT_ATTACHMENT_CACHE_MAX_BYTES)
+    except ValueError:
+        max_bytes = int(telegram.DEFAULT_ATTACHMENT_CACHE_MAX_BYTES)
+    stats = telegram.attachment_cache_stats(str(get_attachment_cache_dir()), max_bytes=max_bytes)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        raise SystemExit(main())
+    except Exception as exc:
+        print(f"[CACHE_STATS][ERROR] {exc}", file=sys.stderr)
+        raise SystemExit(2)
@@ -39,7 +39,13 @@ DEFAULT_FALLBACK_SEND_RETRY_BACKOFF = 1.8
 DEFAULT_CODEX_TRANSPORT_MODE = "app_server"
 DEFAULT_APP_SERVER_LISTEN = "stdio://"
 DEFAULT_APP_SERVER_PROGRESS_INTERVAL_SEC = 20.0
+DEFAULT_APP_SERVER_PROGRESS_EDIT_IN_PLACE = True
+DEFAULT_APP_SERVER_PROGRESS_FINAL_MODE = "delete"
+APP_SERVER_PROGRESS_FINAL_MODES = ("delete", "edit")
+APP_SERVER_PROGRESS_EDIT_MAX_BACKOFF_STEPS = 3
+APP_SERVER_DELTA_TAIL_CHARS = 1024
 DEFAULT_APP_SERVER_STEER_BATCH_WINDOW_MS = 800
+DEFAULT_APP_SERVER_CHAT_CONCURRENCY = 4
 DEFAULT_APP_SERVER_TURN_TIMEOUT_SEC = 1800
 DEFAULT_APP_SERVER_RESTART_BACKOFF_SEC = 3.0
 DEFAULT_APP_SERVER_REQUEST_TIMEOUT_SEC = 45.0
@@ -50,6 +56,13 @@ DEFAULT_APP_SERVER_FORWARD_AGENT_MESSAGE = True
 DEFAULT_TELEGRAM_FORCE_PARSE_MODE = True
 DEFAULT_TELEGRAM_DEFAULT_PARSE_MODE = "HTML"
 DEFAULT_TELEGRAM_PARSE_FALLBACK_RAW_ON_FAIL = True
+DEFAULT_TELEGRAM_RECEIVER_ENABLED = True
+DEFAULT_TELEGRAM_RECEIVER_POLL_TIMEOUT_SEC = 30
+DEFAULT_STORE_MAINTENANCE_INTERVAL_SEC = 3600
+DEFAULT_MAIN_LOOP_IDLE_TICK_SEC = 30.0
+DEFAULT_TELEGRAM_OUTBOX_ENABLED = True
+DEFAULT_TELEGRAM_OUTBOX_MAX_ATTEMPTS = 8
+DEFAULT_TASK_CARDS_BATCH_ENABLED = True
 
 DEFAULT_AGENT_REWRITER_ENABLED = True
 DEFAULT_AGENT_REWRITER_TIMEOUT_SEC = 40.0
@@ -90,6 +103,7 @@ DEFAULT_NEW_TASK_SUMMARY_MAX_CHARS = 12000
 DEFAULT_RESUME_CHAT_SUMMARY_HOURS = 5
 DEFAULT_RESUME_CHAT_SUMMARY_LINES = 30
 DEFAULT_RESUME_CHAT_SUMMARY_MAX_CHARS = 12000
+DEFAULT_LATEST_USER_HINT_SCAN_LIMIT = 50
 DEFAULT_TASK_GUIDE_TELEGRAM_CHUNK_CHARS = 500
 DEFAULT_TASK_AGENTS_INSTRUCTIONS_MAX_CHARS = 12000
 DEFAULT_TASK_SEARCH_LLM_ENABLED = True
@@ -116,6 +130,10 @@ UI_MODE_AWAITING_BOT_RENAME_ALIAS = "awaiting_bot_rename_alias"
 
 CALLBACK_TASK_SELECT_PREFIX = "__cb__:task_select:"
 INLINE_TASK_SELECT_CALLBACK_PREFIX = "task_select:"
+TASK_CARD_SELECT_BUTTON_LABEL = "{idx}번 선택"
+TASK_CARDS_MESSAGE_MAX_CHARS = 3800
+TASK_CARDS_MAX_PER_MESSAGE = 10
+TASK_CARDS_BUTTONS_PER_ROW = 2
 LEGACY_TASK_THREAD_MAP_FILENAME = "legacy_task_thread_map.json"
 
 INTERNAL_AGENT_TEXT_PATTERNS = (
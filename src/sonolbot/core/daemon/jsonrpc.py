@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+NotificationFilter = Callable[[dict[str, Any]], bool]
+
+
+class JsonRpcError(Exception):
+    """A request failed: error reply, timeout, send failure or closed channel."""
+
+    def __init__(self, message: str, *, error: Any = None, timed_out: bool = False) -> None:
+        super().__init__(message)
+        self.error = error
+        self.timed_out = timed_out
+
+
+class NotificationSubscription:
+    """
+    Handle for a notification subscription.
+
+    The callback runs on the reader thread; returning True consumes the
+    notification so the caller's default routing skips it.
+    """
+
+    def __init__(
+        self,
+        client: JsonRpcClient,
+        callback: Callable[[dict[str, Any]], bool | None],
+        methods: frozenset[str] | None,
+        predicate: NotificationFilter | None,
+    ) -> None:
+        self._client = client
+        self.callback = callback
+        self.methods = methods
+        self.predicate = predicate
+
+    def matches(self, message: dict[str, Any]) -> bool:
+        if self.methods is not None and str(message.get("method") or "") not in self.methods:
+            return False
+        return self.predicate is None or bool(self.predicate(message))
+
+    def unsubscribe(self) -> None:
+        self._client._remove_subscription(self)
+
+    def __enter__(self) -> NotificationSubscription:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.unsubscribe()
+
+
+class NotificationCollector(NotificationSubscription):
+    """
+    Subscription that buffers (and consumes) matching notifications so a
+    caller can wait for one that only becomes identifiable later, e.g. a
+    turn id returned by the request that started it.
+    """
+
+    def __init__(
+        self,
+        client: JsonRpcClient,
+        methods: frozenset[str] | None,
+        predicate: NotificationFilter | None,
+    ) -> None:
+        super().__init__(client, self._collect, methods, predicate)
+        self._cond = threading.Condition()
+        self._messages: list[dict[str, Any]] = []
+        self._closed = False
+
+    def _collect(self, message: dict[str, Any]) -> bool:
+        with self._cond:
+            self._messages.append(message)
+            self._cond.notify_all()
+        return True
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def unsubscribe(self) -> None:
+        super().unsubscribe()
+        self.close()
+
+    def wait_for(self, match: NotificationFilter, timeout_sec: float) -> dict[str, Any] | None:
+        """First buffered or future message accepted by match; None on timeout or close."""
+        deadline = time.monotonic() + max(0.0, float(timeout_sec))
+        seen = 0
+        with self._cond:
+            while True:
+                while seen < len(self._messages):
+                    message = self._messages[seen]
+                    seen += 1
+                    if match(message):
+                        return message
+                remaining = deadline - time.monotonic()
+                if self._closed or remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+class JsonRpcClient:
+    """
+    JSON-RPC 2.0 style client over a line-oriented channel (codex app-server stdio).
+
+    Requests get ids and return concurrent.futures.Future objects, so any
+    number can be in flight on the same channel; replies are matched by id
+    from the reader thread via handle_message. Timeouts are enforced by one
+    shared deadline thread, cancelling a future forgets its id, and
+    fail_all() releases every waiter at once when the process goes away.
+    Notifications go to subscribers first; unconsumed ones are left to the
+    caller.
+    """
+
+    def __init__(self, send: Callable[[dict[str, Any]], bool], name: str = "jsonrpc", next_id: int = 1) -> None:
+        self._send = send
+        self.name = name
+        self._lock = threading.Lock()
+        self._next_id = max(1, int(next_id))
+        self._pending: dict[int, tuple[str, Future[Any]]] = {}
+        self._subscriptions: list[NotificationSubscription] = []
+        self._deadline_cond = threading.Condition(self._lock)
+        self._deadlines: list[tuple[float, int, int]] = []
+        self._deadline_seq = itertools.count()
+        self._deadline_thread: threading.Thread | None = None
+
+    @property
+    def next_request_id(self) -> int:
+        with self._lock:
+            return self._next_id
+
+    @next_request_id.setter
+    def next_request_id(self, value: int) -> None:
+        with self._lock:
+            self._next_id = max(1, int(value))
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def request(
+        self,
+        method: str,
+        params: dict[str, Any] | None = None,
+        timeout_sec: float | None = None,
+        callback: Callable[[Future[Any]], None] | None = None,
+    ) -> Future[Any]:
+        """Send a request; the future resolves to the reply's result or fails with JsonRpcError."""
+        future: Future[Any] = Future()
+        with self._lock:
+            req_id = self._next_id
+            self._next_id += 1
+            self._pending[req_id] = (method, future)
+            if timeout_sec is not None:
+                self._schedule_deadline_locked(req_id, max(0.0, float(timeout_sec)))
+        future.add_done_callback(lambda _future: self._forget(req_id))
+        if callback is not None:
+            future.add_done_callback(callback)
+        payload: dict[str, Any] = {"id": req_id, "method": method}
+        if params is not None:
+            payload["params"] = params
+        if not self._send(payload):
+            self._fail(req_id, JsonRpcError(f"{self.name} send failed method={method} id={req_id}"))
+        return future
+
+    def call(self, method: str, params: dict[str, Any] | None = None, timeout_sec: float | None = None) -> Any:
+        """Blocking request; raises JsonRpcError on error reply, timeout or send failure."""
+        future = self.request(method, params, timeout_sec=timeout_sec)
+        try:
+            return future.result()
+        except CancelledError as exc:
+            raise JsonRpcError(f"{self.name} request cancelled method={method}") from exc
+        except FutureTimeoutError as exc:  # pragma: no cover - result() without timeout
+            raise JsonRpcError(f"{self.name} request timeout method={method}", timed_out=True) from exc
+
+    def notify(self, method: str, params: dict[str, Any] | None = None) -> bool:
+        payload: dict[str, Any] = {"method": method}
+        if params is not None:
+            payload["params"] = params
+        return self._send(payload)
+
+    def subscribe(
+        self,
+        callback: Callable[[dict[str, Any]], bool | None],
+        methods: set[str] | frozenset[str] | tuple[str, ...] | None = None,
+        predicate: NotificationFilter | None = None,
+    ) -> NotificationSubscription:
+        subscription = NotificationSubscription(
+            self, callback, frozenset(methods) if methods is not None else None, predicate
+        )
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def collect(
+        self,
+        methods: set[str] | frozenset[str] | tuple[str, ...] | None = None,
+        predicate: NotificationFilter | None = None,
+    ) -> NotificationCollector:
+        collector = NotificationCollector(self, frozenset(methods) if methods is not None else None, predicate)
+        with self._lock:
+            self._subscriptions.append(collector)
+        return collector
+
+    def handle_message(self, message: dict[str, Any]) -> bool:
+        """
+        Route one decoded message from the reader thread. Returns True when it
+        was a reply to one of our requests or a notification a subscriber
+        consumed; server requests and other notifications return False.
+        """
+        if "id" in message and ("result" in message or "error" in message):
+            req_id = message.get("id")
+            with self._lock:
+                entry = self._pending.pop(req_id, None) if isinstance(req_id, int) else None
+            if entry is None:
+                return True
+            method, future = entry
+            if "error" in message:
+                self._resolve(
+                    future,
+                    error=JsonRpcError(
+                        f"{self.name} request error method={method} id={req_id}",
+                        error=message.get("error"),
+                    ),
+                )
+            else:
+                self._resolve(future, result=message.get("result"))
+            return True
+        if "id" in message or not isinstance(message.get("method"), str):
+            return False
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        consumed = False
+        for subscription in subscriptions:
+            if not subscription.matches(message):
+                continue
+            try:
+                consumed = bool(subscription.callback(message)) or consumed
+            except Exception:
+                continue
+        return consumed
+
+    def fail_all(self, reason: str) -> None:
+        """Fail every in-flight request, e.g. when the peer process exits."""
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+            self._deadlines.clear()
+        for req_id, (method, future) in pending:
+            self._resolve(future, error=JsonRpcError(f"{self.name} {reason} method={method} id={req_id}"))
+
+    def _resolve(self, future: Future[Any], *, result: Any = None, error: BaseException | None = None) -> None:
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception:
+            # Already cancelled or resolved by a racing timeout.
+            pass
+
+    def _fail(self, req_id: int, error: JsonRpcError) -> None:
+        with self._lock:
+            entry = self._pending.pop(req_id, None)
+        if entry is not None:
+            self._resolve(entry[1], error=error)
+
+    def _forget(self, req_id: int) -> None:
+        with self._lock:
+            self._pending.pop(req_id, None)
+
+    def _remove_subscription(self, subscription: NotificationSubscription) -> None:
+        with self._lock:
+            try:
+                self._subscriptions.remove(subscription)
+            except ValueError:
+                pass
+
+    def _schedule_deadline_locked(self, req_id: int, timeout_sec: float) -> None:
+        heapq.heappush(self._deadlines, (time.monotonic() + timeout_sec, next(self._deadline_seq), req_id))
+        if self._deadline_thread is None or not self._deadline_thread.is_alive():
+            self._deadline_thread = threading.Thread(
+                target=self._deadline_loop,
+                name=f"{self.name}-rpc-deadlines",
+                daemon=True,
+            )
+            self._deadline_thread.start()
+        else:
+            self._deadline_cond.notify()
+
+    def _deadline_loop(self) -> None:
+        while True:
+            expired: list[tuple[int, str, Future[Any]]] = []
+            with self._deadline_cond:
+                while self._deadlines and self._deadlines[0][2] not in self._pending:
+                    heapq.heappop(self._deadlines)
+                if not self._deadlines:
+                    # Idle: exit; the next timed request starts a new thread.
+                    self._deadline_thread = None
+                    return
+                now = time.monotonic()
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    _deadline, _seq, req_id = heapq.heappop(self._deadlines)
+                    entry = self._pending.pop(req_id, None)
+                    if entry is not None:
+                        expired.append((req_id, entry[0], entry[1]))
+                if not expired:
+                    self._deadline_cond.wait(max(0.0, self._deadlines[0][0] - now))
+                    continue
+            for req_id, method, future in expired:
+                self._resolve(
+                    future,
+                    error=JsonRpcError(f"{self.name} request timeout method={method} id={req_id}", timed_out=True),
+                )
@@ -288,7 +288,12 @@ class DaemonService(
         ]
 
         try:
-            payload = json.loads(self.store_file.read_text(encoding="utf-8"))
+            _runtime, telegram = self._get_telegram_runtime_skill()
+            if telegram is None:
+                raise RuntimeError("telegram skill unavailable")
+            raw_messages = telegram.messages_for_chat(
+                str(self.store_file), int(chat_id), since=cutoff_epoch
+            )
         except Exception as exc:
             self.logger.warning(
                 f"recent chat summary load failed chat_id={chat_id}: {exc}"
@@ -296,20 +301,14 @@ class DaemonService(
             lines.append("- �޽��� ����Ҹ? ���� ���� ����? �������� ���߽��ϴ�.")
             return "\n".join(lines).strip()
 
-        raw_messages = payload.get("messages", []) if isinstance(payload, dict) else []
         if not isinstance(raw_messages, list):
             raw_messages = []
 
-        filtered: list[tuple[float, int, dict[str, Any]]] = []
-        for idx, raw in enumerate(raw_messages):
+        # messages_for_chat returns the window newest-first; render oldest-first.
+        filtered: list[dict[str, Any]] = []
+        for raw in reversed(raw_messages):
             if not isinstance(raw, dict):
                 continue
-            try:
-                row_chat_id = int(raw.get("chat_id"))
-            except Exception:
-                continue
-            if row_chat_id != int(chat_id):
-                continue
 
             msg_type = str(raw.get("type") or "").strip().lower() or "user"
             if exclude_message_id is not None and msg_type == "user":
@@ -318,14 +317,8 @@ class DaemonService(
                         continue
                 except Exception:
                     pass
+            filtered.append(raw)
 
-            ts_text = str(raw.get("timestamp") or "").strip()
-            ts_epoch = self._parse_datetime_epoch(ts_text)
-            if ts_epoch <= 0 or ts_epoch < cutoff_epoch:
-                continue
-            filtered.append((ts_epoch, idx, raw))
-
-        filtered.sort(key=lambda item: (item[0], item[1]))
         if not filtered:
             lines.append("- �ֱ� ��ȭ�� �����ϴ�.")
             return "\n".join(lines).strip()
@@ -339,7 +332,7 @@ class DaemonService(
         if omitted > 0:
             lines.insert(4, f"- ������ �׸� ����: {omitted}��")
 
-        for _, _, raw in filtered:
+        for raw in filtered:
             msg_type = str(raw.get("type") or "").strip().lower() or "user"
             ts_text = (
                 _service_utils.compact_prompt_text(raw.get("timestamp", ""), max_len=19)
@@ -1099,10 +1092,58 @@ class DaemonService(
             deduped.append(item)
         return deduped
 
+    def _last_pending_snapshot(self) -> list[dict[str, object]]:
+        """The pending messages as of the most recent snapshot, without re-reading the store."""
+        telegram_runtime = self._get_telegram_runtime()
+        if telegram_runtime is None:
+            return []
+        return list(telegram_runtime.pending_snapshot)
+
+    def _has_untracked_pending_messages(self, pending: list[dict[str, object]]) -> bool:
+        """
+        True when a pending message is not yet owned by a turn, queue, steer
+        batch or failed reply. Messages stay pending until their final reply,
+        so only these still need a retry tick.
+        """
+        now_epoch = time.time()
+        for item in pending:
+            try:
+                chat_id = int(item.get("chat_id"))
+                msg_id = int(item.get("message_id"))
+            except Exception:
+                continue
+            state = self.app_chat_states.get(chat_id)
+            if state is None:
+                return True
+            tracked: set[int] = set(state.get("active_message_ids") or set())
+            tracked.update(state.get("failed_reply_ids") or set())
+            for key in ("queued_messages", "steer_batch"):
+                tracked.update(
+                    int(queued.get("message_id") or 0)
+                    for queued in (state.get(key) or [])
+                    if isinstance(queued, dict)
+                )
+            if msg_id in tracked or self._is_message_recently_completed(msg_id, now_epoch=now_epoch):
+                continue
+            return True
+        return False
+
     def _snapshot_pending_messages(self) -> list[dict[str, object]]:
         runtime, telegram = self._get_telegram_runtime_skill()
         if runtime is None or telegram is None:
             return []
+        telegram_runtime = self._get_telegram_runtime()
+        pending_version: int | None = None
+        if telegram_runtime is not None and hasattr(telegram, "pending_version"):
+            try:
+                pending_version = int(telegram.pending_version(str(self.store_file)))
+            except Exception as exc:
+                self.logger.warning(f"pending version check failed: {exc}")
+            if (
+                pending_version is not None
+                and pending_version == telegram_runtime.pending_snapshot_version
+            ):
+                return [dict(item) for item in telegram_runtime.pending_snapshot]
         try:
             pending = telegram.get_pending_messages(
                 str(self.store_file), include_bot=False
@@ -1115,6 +1156,10 @@ class DaemonService(
         messages: list[dict[str, object]] = []
         seen_ids: set[tuple[int, int]] = set()
         for msg in pending:
+            if msg.get("download_pending"):
+                # The receiver resolves attachments in the background and wakes
+                # the loop; the message becomes eligible once they are on disk.
+                continue
             try:
                 msg_id = int(msg.get("message_id"))
                 chat_id = int(msg.get("chat_id"))
@@ -1146,6 +1191,9 @@ class DaemonService(
                 }
             )
         messages.sort(key=lambda item: int(item.get("message_id", 0)))
+        if telegram_runtime is not None and pending_version is not None:
+            telegram_runtime.pending_snapshot_version = pending_version
+            telegram_runtime.pending_snapshot = [dict(item) for item in messages]
         return messages
 
     def _lookup_mapped_thread_id(self, chat_id: int, task_id: str) -> str:
@@ -1240,14 +1288,18 @@ class DaemonService(
         if (
             runtime is None
             or telegram is None
-            or not hasattr(telegram, "load_message_store")
+            or not hasattr(telegram, "messages_for_chat")
         ):
             return ""
         try:
-            store = telegram.load_message_store(str(self.store_file))
+            messages = telegram.messages_for_chat(
+                str(self.store_file),
+                int(chat_id),
+                limit=DEFAULT_LATEST_USER_HINT_SCAN_LIMIT,
+                roles=("user",),
+            )
         except Exception:
             return ""
-        messages = store.get("messages", [])
         if not isinstance(messages, list):
             return ""
 
@@ -1255,18 +1307,10 @@ class DaemonService(
             int(v) for v in (state.get("active_message_ids") or set()) if int(v) > 0
         }
         normalized_items: list[dict[str, Any]] = []
-        for raw in messages:
+        # Newest-first from the store; keep the original oldest-first scan order.
+        for raw in reversed(messages):
             if not isinstance(raw, dict):
                 continue
-            msg_type = str(raw.get("type") or "").strip().lower()
-            if msg_type != "user":
-                continue
-            try:
-                row_chat_id = int(raw.get("chat_id"))
-            except Exception:
-                continue
-            if row_chat_id != int(chat_id):
-                continue
             msg_text = _service_utils.compact_prompt_text(
                 _service_utils.strip_new_command_prefix(str(raw.get("text", ""))),
                 max_len=220,
@@ -1300,21 +1344,21 @@ class DaemonService(
                 except Exception:
                     pass
         self.app_proc = None
-        with self.app_req_lock:
-            self.app_pending_responses.clear()
+        if self.app_rpc is not None:
+            self.app_rpc.fail_all(f"app-server stopped ({reason})")
         self.app_turn_to_chat.clear()
-        self.app_aux_turn_results = {}
-        for state in self.app_chat_states.values():
+        for state in list(self.app_chat_states.values()):
             state["active_turn_id"] = ""
             state["active_message_ids"] = set()
             state["active_task_ids"] = set()
-            state["delta_text"] = ""
+            state["delta_buffer"] = None
             state["final_text"] = ""
             state["last_agent_message_sent"] = ""
             state["last_agent_message_raw"] = ""
             state["last_progress_len"] = 0
             state["last_progress_sent_at"] = 0.0
             state["last_lease_heartbeat_at"] = 0.0
+            self._app_clear_live_progress(state)
         self._release_owned_chat_leases(reason=f"app_server_stop:{reason}")
         try:
             if self.codex_pid_file.exists():
@@ -1498,6 +1542,11 @@ class DaemonService(
             for item in queued_messages
             if isinstance(item, dict)
         }
+        queued_ids.update(
+            int(item.get("message_id"))
+            for item in (state.get("steer_batch") or [])
+            if isinstance(item, dict)
+        )
         failed_ids: set[int] = state.get("failed_reply_ids") or set()
         now_epoch = time.time()
 
@@ -1524,9 +1573,10 @@ class DaemonService(
         return any(
             bool(str(state.get("active_turn_id") or "").strip())
             or bool(state.get("queued_messages"))
+            or bool(state.get("steer_batch"))
             or bool(str(state.get("failed_reply_text") or "").strip())
-            for state in self.app_chat_states.values()
-        )
+            for state in list(self.app_chat_states.values())
+        ) or self._chat_workers_busy()
 
     def _workspace_latest_mtime(self) -> float:
         results_dir = Path(
@@ -1563,8 +1613,13 @@ class DaemonService(
                     ):
                         # Exclude daemon heartbeat logs from idle detector.
                         continue
-                    if path == self.store_file or path.name == "telegram_messages.json":
-                        # Telegram store can be rewritten by periodic polling even with no real work.
+                    if (
+                        path == self.store_file
+                        or path.name.startswith("telegram_messages.")
+                        or path.parent.name.startswith("telegram_messages.")
+                    ):
+                        # Telegram store (JSON, SQLite + WAL/lock files, or shard dir) can be rewritten
+                        # by periodic polling even with no real work.
                         continue
                     try:
                         latest = max(latest, path.stat().st_mtime)
@@ -1614,14 +1669,46 @@ class DaemonService(
         self._cleanup_logs()
         self._cleanup_activity_logs()
         self._rotate_activity_log_if_needed(force=False)
+        self._run_store_maintenance()
         rc = self._run_quick_check()
         if rc not in (0, 1):
             self.logger.info(f"quick_check failed rc={rc}")
             return rc
 
         self._app_process_cycle()
+        self._flush_outbox_inline()
         return rc
 
+    def _main_loop_wait_timeout(self) -> float:
+        """
+        How long the main loop may block before its next cycle.
+
+        New Telegram updates, app-server events and shutdown wake the loop
+        directly, so this only has to cover timers: per-chat deadlines, retries
+        of queued or failed work, and the slow maintenance / idle-shutdown tick.
+        Without the receiver thread Telegram is still polled every
+        poll_interval_sec.
+        """
+        poll_sec = max(1.0, float(self.poll_interval_sec))
+        timeout = max(poll_sec, float(self.main_loop_idle_tick_sec))
+        worker = self._get_outbox_worker()
+        if (
+            self._active_telegram_receiver() is None
+            or self._has_untracked_pending_messages(self._last_pending_snapshot())
+            or any(
+                state.get("queued_messages") or str(state.get("failed_reply_text") or "").strip()
+                for state in list(self.app_chat_states.values())
+            )
+            or (worker is not None and not worker.is_alive() and self._outbox_backlog() > 0)
+        ):
+            timeout = poll_sec
+        deadline = self._app_next_deadline_in()
+        if deadline is not None:
+            # Still overdue right after a cycle means the handler did not clear
+            # it (or a chat worker has it queued); don't spin on it.
+            timeout = min(timeout, deadline if deadline > 0 else poll_sec)
+        return max(0.05, timeout)
+
     def drain_pending_once(
         self, max_cycles: int = 120, sleep_sec: float = 1.0, use_lock: bool = True
     ) -> int:
@@ -1648,11 +1735,11 @@ class DaemonService(
                     return rc
 
                 pending = bool(self._snapshot_pending_messages())
-                stateful = self._has_app_stateful_work()
+                stateful = self._has_app_stateful_work() or self._outbox_backlog() > 0
                 if not pending and not stateful:
                     return 0
 
-                time.sleep(pause)
+                self._wait_main_loop(pause)
 
             self.logger.warning(f"drain mode reached max_cycles={cycles} before idle")
             return 1
@@ -1697,12 +1784,19 @@ class DaemonService(
             f"tasks_partition_by_chat={self.tasks_partition_by_chat}"
         )
         self._run_doc_runtime_check()
+        self._start_telegram_receiver()
+        self._start_outbox_worker()
 
         try:
             while not self.stop_requested:
                 self._run_main_cycle()
-                time.sleep(max(1, self.poll_interval_sec))
+                if self.stop_requested:
+                    break
+                self._wait_main_loop(self._main_loop_wait_timeout())
         finally:
+            self._stop_telegram_receiver()
+            self._stop_outbox_worker()
+            self._stop_chat_workers()
             self._stop_app_server("daemon_shutdown")
             self._release_lock()
             self.logger.info("Daemon stopped")
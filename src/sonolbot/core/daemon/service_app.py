@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from collections import deque
+
 from sonolbot.core.daemon.runtime_shared import *
 from sonolbot.core.daemon import service_utils as _service_utils
+from sonolbot.core.daemon.jsonrpc import JsonRpcClient, JsonRpcError
 
 try:
     import errno
@@ -25,15 +28,19 @@ class DaemonServiceAppRuntime:
         self.app_proc: subprocess.Popen[str] | None = None
         self.app_proc_generation = 0
         self.app_json_send_lock = threading.Lock()
-        self.app_req_lock = threading.Lock()
-        self.app_pending_responses: dict[int, queue.Queue[dict[str, Any]]] = {}
+        self.app_rpc = JsonRpcClient(lambda payload: self._owner._app_send_json(payload), name="app-server")
         self.app_event_queue: queue.Queue[dict[str, Any]] = queue.Queue()
-        self.app_next_request_id = 1
         self.app_chat_states: dict[int, dict[str, Any]] = {}
         self.app_thread_to_chat: dict[str, int] = {}
         self.app_turn_to_chat: dict[str, int] = {}
-        self.app_aux_turn_results: dict[str, dict[str, Any]] = {}
         self.app_last_restart_try_epoch = 0.0
+        # Guards the shared state/meta files, which chat workers write concurrently.
+        self.app_state_write_lock = threading.RLock()
+        self.chat_workers: DaemonChatWorkerPool | None = None
+        # Main-loop bookkeeping for pooled chats: pending-id signature and time
+        # of the last cycle dispatch, and chats that received events since.
+        self.chat_cycle_marks: dict[int, tuple[tuple[int, ...], float]] = {}
+        self.chat_cycle_dirty: set[int] = set()
         self._app_server_lock_fd: int | None = None
         self._app_server_lock_busy_logged_at = 0.0
 
@@ -53,7 +60,7 @@ class DaemonServiceAppRuntime:
 
     def save_state(self) -> None:
         data_map: dict[int, str] = {}
-        for chat_id, state in self.app_chat_states.items():
+        for chat_id, state in list(self.app_chat_states.items()):
             thread_id = str(state.get("thread_id") or "").strip()
             if not thread_id:
                 continue
@@ -135,7 +142,7 @@ class DaemonServiceAppRuntime:
         thread_ids_by_chat: dict[str, str] = {}
         first_thread = ""
         active_thread = ""
-        for chat_id in sorted(self.app_chat_states.keys()):
+        for chat_id in sorted(list(self.app_chat_states.keys())):
             state = self.get_chat_state(chat_id)
             thread_id = str(state.get("thread_id") or "").strip()
             if not thread_id:
@@ -375,6 +382,136 @@ class DaemonServiceAppRuntime:
         for log_path in self._owner.logs_dir.glob("*.log"):
             self.secure_file(log_path)
 
+class AgentDeltaBuffer:
+    """
+    Streamed agentMessage deltas of one turn.
+
+    Only what progress updates read is kept, so memory stays bounded however
+    long the reply grows: ``length`` counts every character received
+    (progress throttling compares against it) and ``tail`` is a bounded
+    preview of the latest text. The final reply comes from turn/completed.
+    """
+
+    def __init__(self, tail_chars: int = APP_SERVER_DELTA_TAIL_CHARS) -> None:
+        self.tail_chars = max(1, int(tail_chars))
+        self.length = 0
+        self._tail = ""
+
+    def append(self, delta: str) -> None:
+        if not delta:
+            return
+        self.length += len(delta)
+        self._tail = (self._tail + delta)[-self.tail_chars :]
+
+    def tail(self, max_chars: int | None = None) -> str:
+        if max_chars is None:
+            return self._tail
+        return self._tail[-max_chars:] if max_chars > 0 else ""
+
+
+class DaemonChatWorkerPool:
+    """
+    Per-chat serial lanes on a bounded set of worker threads.
+
+    Jobs submitted for one chat run one at a time in submission order, so a
+    chat's state is only ever touched by one worker. Different chats run
+    concurrently up to max_workers. A failing job is logged and affects
+    neither other chats nor later jobs of the same chat.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        logger: Any,
+        on_job_done: Callable[[], None] | None = None,
+    ) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self._logger = logger
+        self._on_job_done = on_job_done
+        self._cond = threading.Condition()
+        self._lanes: dict[int, deque[tuple[str, Callable[[], None]]]] = {}
+        self._ready: deque[int] = deque()
+        self._running: dict[int, str] = {}
+        self._threads: list[threading.Thread] = []
+        self._idle_threads = 0
+        self._stopping = False
+
+    def submit(self, chat_id: int, label: str, job: Callable[[], None]) -> bool:
+        with self._cond:
+            if self._stopping:
+                return False
+            lane = self._lanes.setdefault(chat_id, deque())
+            lane.append((label, job))
+            if chat_id not in self._running and len(lane) == 1:
+                self._ready.append(chat_id)
+                if len(self._ready) > self._idle_threads and len(self._threads) < self.max_workers:
+                    thread = threading.Thread(
+                        target=self._worker_loop,
+                        name=f"chat-worker-{len(self._threads) + 1}",
+                        daemon=True,
+                    )
+                    self._threads.append(thread)
+                    thread.start()
+                self._cond.notify()
+            return True
+
+    def has_job(self, chat_id: int, label: str) -> bool:
+        """True while a job with this label is queued or running for the chat."""
+        with self._cond:
+            if self._running.get(chat_id) == label:
+                return True
+            return any(queued_label == label for queued_label, _job in self._lanes.get(chat_id) or ())
+
+    def busy(self) -> bool:
+        with self._cond:
+            return bool(self._running or self._ready)
+
+    def stop(self, timeout_sec: float = 5.0) -> None:
+        """Drop queued jobs and wait (bounded) for running ones to return."""
+        with self._cond:
+            self._stopping = True
+            self._lanes.clear()
+            self._ready.clear()
+            self._cond.notify_all()
+            threads = list(self._threads)
+        deadline = time.time() + max(0.0, float(timeout_sec))
+        for thread in threads:
+            thread.join(timeout=max(0.0, deadline - time.time()))
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._idle_threads += 1
+                    self._cond.wait()
+                    self._idle_threads -= 1
+                if self._stopping:
+                    return
+                chat_id = self._ready.popleft()
+                lane = self._lanes[chat_id]
+                label, job = lane.popleft()
+                self._running[chat_id] = label
+            try:
+                job()
+            except Exception as exc:
+                self._logger.warning(f"chat worker job failed chat_id={chat_id} job={label}: {exc}")
+            with self._cond:
+                self._running.pop(chat_id, None)
+                if self._stopping:
+                    return
+                if lane:
+                    # Re-queue at the back so a busy chat cannot starve the others.
+                    self._ready.append(chat_id)
+                    self._cond.notify()
+                elif self._lanes.get(chat_id) is lane:
+                    del self._lanes[chat_id]
+            if self._on_job_done is not None:
+                try:
+                    self._on_job_done()
+                except Exception:
+                    pass
+
+
 class DaemonServiceAppMixin:
 
     def _get_app_runtime(self) -> DaemonServiceAppRuntime | None:
@@ -434,32 +571,11 @@ class DaemonServiceAppMixin:
         runtime.app_json_send_lock = value
 
     @property
-    def app_req_lock(self) -> threading.Lock:
-        runtime = self._get_app_runtime()
-        if runtime is None:
-            return threading.Lock()
-        return runtime.app_req_lock
-
-    @app_req_lock.setter
-    def app_req_lock(self, value: threading.Lock) -> None:
-        runtime = self._get_app_runtime()
-        if runtime is None:
-            return
-        runtime.app_req_lock = value
-
-    @property
-    def app_pending_responses(self) -> dict[int, queue.Queue[dict[str, Any]]]:
-        runtime = self._get_app_runtime()
-        if runtime is None:
-            return {}
-        return runtime.app_pending_responses
-
-    @app_pending_responses.setter
-    def app_pending_responses(self, value: dict[int, queue.Queue[dict[str, Any]]]) -> None:
+    def app_rpc(self) -> JsonRpcClient | None:
         runtime = self._get_app_runtime()
         if runtime is None:
-            return
-        runtime.app_pending_responses = value
+            return None
+        return runtime.app_rpc
 
     @property
     def app_event_queue(self) -> queue.Queue[dict[str, Any]]:
@@ -480,14 +596,14 @@ class DaemonServiceAppMixin:
         runtime = self._get_app_runtime()
         if runtime is None:
             return 1
-        return runtime.app_next_request_id
+        return runtime.app_rpc.next_request_id
 
     @app_next_request_id.setter
     def app_next_request_id(self, value: int) -> None:
         runtime = self._get_app_runtime()
         if runtime is None:
             return
-        runtime.app_next_request_id = value
+        runtime.app_rpc.next_request_id = value
 
     @property
     def app_chat_states(self) -> dict[int, dict[str, Any]]:
@@ -531,20 +647,6 @@ class DaemonServiceAppMixin:
             return
         runtime.app_turn_to_chat = value
 
-    @property
-    def app_aux_turn_results(self) -> dict[str, dict[str, Any]]:
-        runtime = self._get_app_runtime()
-        if runtime is None:
-            return {}
-        return runtime.app_aux_turn_results
-
-    @app_aux_turn_results.setter
-    def app_aux_turn_results(self, value: dict[str, dict[str, Any]]) -> None:
-        runtime = self._get_app_runtime()
-        if runtime is None:
-            return
-        runtime.app_aux_turn_results = value
-
     @property
     def app_last_restart_try_epoch(self) -> float:
         runtime = self._get_app_runtime()
@@ -569,7 +671,8 @@ class DaemonServiceAppMixin:
         runtime = self._get_app_runtime()
         if runtime is None:
             return
-        runtime.save_state()
+        with runtime.app_state_write_lock:
+            runtime.save_state()
 
     def _write_app_server_log(self, prefix: str, line: str) -> None:
         runtime = self._get_app_runtime()
@@ -639,7 +742,38 @@ class DaemonServiceAppMixin:
         runtime = self._get_app_runtime()
         if runtime is None:
             return
-        runtime.sync_app_server_session_meta(active_chat_id=active_chat_id)
+        with runtime.app_state_write_lock:
+            runtime.sync_app_server_session_meta(active_chat_id=active_chat_id)
+
+    def _get_chat_workers(self) -> DaemonChatWorkerPool | None:
+        """Lazily create the per-chat worker pool; None when chats run inline."""
+        runtime = self._get_app_runtime()
+        if runtime is None:
+            return None
+        if runtime.chat_workers is None:
+            concurrency = int(getattr(self, "app_server_chat_concurrency", 0) or 0)
+            if concurrency <= 0:
+                return None
+            runtime.chat_workers = DaemonChatWorkerPool(
+                concurrency,
+                self.logger,
+                on_job_done=lambda: self._wake_main_loop("chat_worker"),
+            )
+        return runtime.chat_workers
+
+    def _chat_workers_busy(self) -> bool:
+        runtime = self._get_app_runtime()
+        if runtime is None or runtime.chat_workers is None:
+            return False
+        return runtime.chat_workers.busy()
+
+    def _stop_chat_workers(self, timeout_sec: float = 5.0) -> None:
+        runtime = self._get_app_runtime()
+        if runtime is None or runtime.chat_workers is None:
+            return
+        workers = runtime.chat_workers
+        runtime.chat_workers = None
+        workers.stop(timeout_sec=timeout_sec)
 
     def _read_pid_file(self, path: Path) -> int:
         runtime = self._get_app_runtime()
@@ -730,53 +864,46 @@ class DaemonServiceAppMixin:
         if not thread_id:
             return None
 
-        started_turn = self._app_request(
-            "turn/start",
-            {
-                "threadId": thread_id,
-                "input": [{"type": "text", "text": str(prompt_text)}],
-                "model": self.codex_model,
-                "effort": self.codex_reasoning_effort,
-                "approvalPolicy": self.app_server_approval_policy,
-            },
-            timeout_sec=self.task_search_llm_request_timeout_sec,
-        )
-        if started_turn is None:
+        rpc = self.app_rpc
+        if rpc is None:
             return None
-
-        turn = started_turn.get("turn")
-        turn_id = ""
-        if isinstance(turn, dict):
-            turn_id = str(turn.get("id") or "").strip()
-        if not turn_id:
-            turn_id = str(started_turn.get("turnId") or "").strip()
-        if not turn_id:
+        # Collect the aux thread's notifications before starting the turn so a
+        # fast turn cannot finish unseen; this also keeps them out of chat routing.
+        collector = rpc.collect(predicate=lambda message: _service_utils.app_notification_ids(message)[0] == thread_id)
+        try:
+            started_turn = self._app_request(
+                "turn/start",
+                {
+                    "threadId": thread_id,
+                    "input": [{"type": "text", "text": str(prompt_text)}],
+                    "model": self.codex_model,
+                    "effort": self.codex_reasoning_effort,
+                    "approvalPolicy": self.app_server_approval_policy,
+                },
+                timeout_sec=self.task_search_llm_request_timeout_sec,
+            )
+            if started_turn is None:
+                return None
+
+            turn = started_turn.get("turn")
+            turn_id = ""
+            if isinstance(turn, dict):
+                turn_id = str(turn.get("id") or "").strip()
+            if not turn_id:
+                turn_id = str(started_turn.get("turnId") or "").strip()
+            if not turn_id:
+                return None
+
+            finished = collector.wait_for(
+                lambda message: _service_utils.app_turn_finished(message, turn_id),
+                timeout_sec=max(1.0, float(timeout_sec)),
+            )
+        finally:
+            collector.unsubscribe()
+        text = _service_utils.app_turn_final_text(finished)
+        if not text:
             return None
-
-        self.app_aux_turn_results[turn_id] = {
-            "status": "started",
-            "text": "",
-            "thread_id": thread_id,
-            "updated_at": time.time(),
-        }
-        deadline = time.time() + max(1.0, float(timeout_sec))
-        while time.time() < deadline:
-            self._app_drain_events(max_items=200)
-            current = self.app_aux_turn_results.get(turn_id)
-            if isinstance(current, dict):
-                status = str(current.get("status") or "").strip().lower()
-                text = str(current.get("text") or "").strip()
-                if status in {"failed", "cancelled", "error", "errored"}:
-                    self.app_aux_turn_results.pop(turn_id, None)
-                    return None
-                if status == "completed" and text:
-                    self.app_aux_turn_results.pop(turn_id, None)
-                    return self._parse_json_object_from_text(text)
-            if not self._app_is_running():
-                break
-            time.sleep(0.05)
-        self.app_aux_turn_results.pop(turn_id, None)
-        return None
+        return self._parse_json_object_from_text(text)
 
     def _app_is_running(self) -> bool:
         return self.app_proc is not None and self.app_proc.poll() is None
@@ -807,38 +934,18 @@ class DaemonServiceAppMixin:
         params: dict[str, Any] | None = None,
         timeout_sec: float | None = None,
     ) -> dict[str, Any] | None:
-        if not self._app_is_running():
+        rpc = self.app_rpc
+        if rpc is None or not self._app_is_running():
             return None
-
-        req_id = 0
-        response_q: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=1)
-        with self.app_req_lock:
-            req_id = self.app_next_request_id
-            self.app_next_request_id += 1
-            self.app_pending_responses[req_id] = response_q
-
-        payload: dict[str, Any] = {"id": req_id, "method": method}
-        if params is not None:
-            payload["params"] = params
-
-        if not self._app_send_json(payload):
-            with self.app_req_lock:
-                self.app_pending_responses.pop(req_id, None)
-            return None
-
         wait_sec = timeout_sec if timeout_sec is not None else self.app_server_request_timeout_sec
         try:
-            reply = response_q.get(timeout=max(1.0, wait_sec))
-        except queue.Empty:
-            self.logger.warning(f"app-server request timeout method={method} id={req_id}")
-            with self.app_req_lock:
-                self.app_pending_responses.pop(req_id, None)
-            return None
-
-        if "error" in reply:
-            self.logger.warning(f"app-server request error method={method} id={req_id} error={reply.get('error')}")
+            result = rpc.call(method, params, timeout_sec=max(1.0, float(wait_sec)))
+        except JsonRpcError as exc:
+            if exc.error is not None:
+                self.logger.warning(f"{exc} error={exc.error}")
+            else:
+                self.logger.warning(str(exc))
             return None
-        result = reply.get("result")
         if isinstance(result, dict):
             return result
         return {"value": result}
@@ -892,15 +999,9 @@ class DaemonServiceAppMixin:
         if not isinstance(obj, dict):
             return
 
-        if "id" in obj and ("result" in obj or "error" in obj):
-            req_id = obj.get("id")
-            with self.app_req_lock:
-                pending_q = self.app_pending_responses.pop(req_id, None)
-            if pending_q is not None:
-                try:
-                    pending_q.put_nowait(obj)
-                except Exception:
-                    pass
+        # Replies to our requests, and notifications a subscriber consumed.
+        rpc = self.app_rpc
+        if rpc is not None and rpc.handle_message(obj):
             return
 
         method = obj.get("method")
@@ -916,6 +1017,8 @@ class DaemonServiceAppMixin:
             self.app_event_queue.put_nowait(obj)
         except Exception:
             self.logger.warning(f"app-server event queue full; dropping event")
+            return
+        self._wake_main_loop("app_server")
 
     def _app_stdout_reader(self) -> None:
         proc = self.app_proc
@@ -926,6 +1029,11 @@ class DaemonServiceAppMixin:
             if not line:
                 continue
             self._app_dispatch_incoming(line)
+        # EOF: the app-server exited. Release waiters now instead of at their
+        # timeouts, and let the main loop notice without waiting for a timer.
+        if self.app_rpc is not None and proc is self.app_proc:
+            self.app_rpc.fail_all("app-server exited")
+        self._wake_main_loop("app_server_exit")
 
     def _app_stderr_reader(self) -> None:
         proc = self.app_proc
@@ -1101,7 +1209,7 @@ class DaemonServiceAppMixin:
 
         state["active_turn_id"] = turn_id
         state["active_message_ids"] = batch_message_ids
-        state["delta_text"] = ""
+        state["delta_buffer"] = None
         state["final_text"] = ""
         state["last_agent_message_sent"] = ""
         state["last_agent_message_raw"] = ""
@@ -1184,8 +1292,38 @@ class DaemonServiceAppMixin:
         if not ordered_ids:
             return False
 
-        ok = False
+        idem_key = (
+            telegram.outbox_idempotency_key("final", chat_id, *ordered_ids, text)
+            if hasattr(telegram, "outbox_idempotency_key")
+            else None
+        )
+        state = self._get_chat_state(chat_id)
+        progress_key = str(state.get("progress_key") or "")
+        if self._enqueue_telegram_text(
+            chat_id,
+            text,
+            idem_key=idem_key,
+            reply_to_message_ids=ordered_ids,
+            keyboard_rows=self._main_menu_keyboard_rows(),
+            progress_key=progress_key or None,
+        ):
+            state["progress_key"] = ""
+            # The outbox is durable, so the turn is done once the reply is queued.
+            try:
+                changed = int(telegram.mark_messages_processed(str(self.store_file), ordered_ids, chat_id=chat_id))
+            except Exception as exc:
+                self.logger.warning(f"failed to mark processed chat={chat_id}: {exc}")
+                changed = 0
+            self.logger.info(
+                f"Final reply queued chat_id={chat_id} message_count={len(ordered_ids)} marked={changed}"
+            )
+            return True
+
+        ok = bool(progress_key) and self._telegram_finish_progress(chat_id, progress_key, final_text=text)
+        state["progress_key"] = ""
         for attempt in range(1, self.fallback_send_max_attempts + 1):
+            if ok:
+                break
             try:
                 ok = bool(
                     self._telegram_send_text(
@@ -1219,7 +1357,7 @@ class DaemonServiceAppMixin:
             self.logger.warning(f"failed to save bot response chat={chat_id}: {exc}")
 
         try:
-            changed = int(telegram.mark_messages_processed(str(self.store_file), ordered_ids))
+            changed = int(telegram.mark_messages_processed(str(self.store_file), ordered_ids, chat_id=chat_id))
         except Exception as exc:
             self.logger.warning(f"failed to mark processed chat={chat_id}: {exc}")
             changed = 0
@@ -1235,15 +1373,21 @@ class DaemonServiceAppMixin:
         turn_id = str(state.get("active_turn_id") or "").strip()
         if not turn_id:
             return
-        delta_text = str(state.get("delta_text") or "")
-        if not delta_text.strip():
+        # Read-only: only the delta handler installs the buffer.
+        delta_buffer = state.get("delta_buffer")
+        if not isinstance(delta_buffer, AgentDeltaBuffer) or not delta_buffer.tail().strip():
             return
         now_epoch = time.time()
         last_sent = float(state.get("last_progress_sent_at") or 0.0)
-        if (now_epoch - last_sent) < self.app_server_progress_interval_sec:
+        interval_sec = float(self.app_server_progress_interval_sec)
+        if self.app_server_progress_edit_in_place:
+            # Back off edits on long turns: 1x, 2x, 4x, 8x the interval.
+            steps = min(int(state.get("progress_updates") or 0), APP_SERVER_PROGRESS_EDIT_MAX_BACKOFF_STEPS)
+            interval_sec *= 2**steps
+        if (now_epoch - last_sent) < interval_sec:
             return
         last_len = int(state.get("last_progress_len") or 0)
-        if len(delta_text) <= last_len:
+        if delta_buffer.length <= last_len:
             return
         active_ids: set[int] = state.get("active_message_ids") or set()
         if not active_ids:
@@ -1257,12 +1401,29 @@ class DaemonServiceAppMixin:
                 task_prefix = f"thread_{thread_id}"
             else:
                 task_prefix = f"msg_{min(active_ids)}"
-        snippet = delta_text[-220:].strip()
+        snippet = delta_buffer.tail(220).strip()
         progress_text = f"[] {task_prefix}\n{snippet}"
 
         runtime, telegram = self._get_telegram_runtime_skill()
         if runtime is None or telegram is None:
             return
+        if self.app_server_progress_edit_in_place:
+            if progress_text == str(state.get("last_progress_text") or ""):
+                return
+            progress_key = f"{chat_id}:{turn_id}"
+            if self._enqueue_telegram_progress(chat_id, progress_key, progress_text) or self._telegram_upsert_progress(
+                chat_id, progress_key, progress_text
+            ):
+                state["progress_key"] = progress_key
+                state["last_progress_text"] = progress_text
+                state["progress_updates"] = int(state.get("progress_updates") or 0) + 1
+                state["last_progress_sent_at"] = now_epoch
+                state["last_progress_len"] = delta_buffer.length
+            return
+        if self._enqueue_telegram_text(chat_id, progress_text, keyboard_rows=self._main_menu_keyboard_rows()):
+            state["last_progress_sent_at"] = now_epoch
+            state["last_progress_len"] = delta_buffer.length
+            return
         try:
             ok = bool(
                 self._telegram_send_text(
@@ -1277,12 +1438,40 @@ class DaemonServiceAppMixin:
             ok = False
         if ok:
             state["last_progress_sent_at"] = now_epoch
-            state["last_progress_len"] = len(delta_text)
+            state["last_progress_len"] = delta_buffer.length
+
+    def _app_clear_live_progress(self, state: dict[str, Any]) -> None:
+        """Delete a live progress message the final reply did not take over."""
+        progress_key = str(state.get("progress_key") or "")
+        state["progress_key"] = ""
+        state["last_progress_text"] = ""
+        state["progress_updates"] = 0
+        if not progress_key:
+            return
+        try:
+            chat_id = int(progress_key.split(":", 1)[0])
+        except ValueError:
+            return
+        if not self._enqueue_telegram_progress(chat_id, progress_key, None):
+            self._telegram_finish_progress(chat_id, progress_key)
 
     def _app_try_send_agent_message(self, chat_id: int, text: str) -> bool:
         runtime, telegram = self._get_telegram_runtime_skill()
         if runtime is None or telegram is None:
             return False
+        turn_id = str(self._get_chat_state(chat_id).get("active_turn_id") or "").strip()
+        idem_key = (
+            telegram.outbox_idempotency_key("agent", chat_id, turn_id, text)
+            if turn_id and hasattr(telegram, "outbox_idempotency_key")
+            else None
+        )
+        if self._enqueue_telegram_text(
+            chat_id,
+            text,
+            idem_key=idem_key,
+            keyboard_rows=self._main_menu_keyboard_rows(),
+        ):
+            return True
         try:
             return bool(
                 self._telegram_send_text(
@@ -1315,7 +1504,7 @@ class DaemonServiceAppMixin:
             self.logger.warning(f"failed to save streamed bot response chat={chat_id}: {exc}")
 
         try:
-            changed = int(telegram.mark_messages_processed(str(self.store_file), ordered_ids))
+            changed = int(telegram.mark_messages_processed(str(self.store_file), ordered_ids, chat_id=chat_id))
         except Exception as exc:
             self.logger.warning(f"failed to mark streamed reply processed chat={chat_id}: {exc}")
             return False
@@ -1387,11 +1576,12 @@ class DaemonServiceAppMixin:
         if status == "completed" and message_ids:
             self._remember_completed_message_ids(message_ids)
         self._chat_lease_release(chat_id, reason=f"turn_completed:{status or 'completed'}")
+        self._app_clear_live_progress(state)
 
         state["active_turn_id"] = ""
         state["active_message_ids"] = set()
         state["active_task_ids"] = set()
-        state["delta_text"] = ""
+        state["delta_buffer"] = None
         state["final_text"] = ""
         state["last_agent_message_sent"] = ""
         state["last_agent_message_raw"] = ""
@@ -1440,7 +1630,7 @@ class DaemonServiceAppMixin:
             if not delta:
                 return
             state = self._get_chat_state(chat_id)
-            state["delta_text"] = str(state.get("delta_text") or "") + delta
+            self._app_delta_buffer(state).append(delta)
             return
 
         if method == "item/completed":
@@ -1496,14 +1686,6 @@ class DaemonServiceAppMixin:
             if not raw_final_text:
                 return
             turn_id = str(msg.get("turn_id") or params.get("id") or "").strip()
-            if turn_id:
-                aux_state = self.app_aux_turn_results.get(turn_id)
-                if isinstance(aux_state, dict):
-                    aux_state["status"] = "completed"
-                    aux_state["text"] = raw_final_text
-                    aux_state["updated_at"] = time.time()
-                    self.app_aux_turn_results[turn_id] = aux_state
-                    return
             thread_id = str(params.get("conversationId") or "").strip()
             if not thread_id:
                 thread_id = str(msg.get("thread_id") or "").strip()
@@ -1522,48 +1704,155 @@ class DaemonServiceAppMixin:
             turn = params.get("turn")
             if not isinstance(turn, dict):
                 return
-            aux_turn_id = str(turn.get("id") or "").strip()
-            if aux_turn_id:
-                aux_state = self.app_aux_turn_results.get(aux_turn_id)
-                if isinstance(aux_state, dict):
-                    aux_state["status"] = str(turn.get("status") or "").strip().lower() or "completed"
-                    aux_state["updated_at"] = time.time()
-                    self.app_aux_turn_results[aux_turn_id] = aux_state
-                    return
             self._app_on_turn_completed(thread_id, turn)
             return
 
+    def _app_event_chat_id(self, event: dict[str, Any]) -> int | None:
+        """Chat an app-server notification belongs to; None for unmapped threads."""
+        thread_id, turn_id = _service_utils.app_notification_ids(event)
+        chat_id = self.app_thread_to_chat.get(thread_id) if thread_id else None
+        if chat_id is None and turn_id:
+            chat_id = self.app_turn_to_chat.get(turn_id)
+        return chat_id
+
     def _app_drain_events(self, max_items: int = 400) -> None:
+        workers = self._get_chat_workers()
         for _ in range(max_items):
             try:
                 event = self.app_event_queue.get_nowait()
             except queue.Empty:
                 break
+            # Chat events go to that chat's lane so a slow rewrite or reply
+            # send only delays its own conversation.
+            chat_id = self._app_event_chat_id(event) if workers is not None else None
+            if chat_id is not None and workers is not None:
+                if workers.submit(chat_id, "event", lambda event=event: self._app_process_notification(event)):
+                    runtime = self._get_app_runtime()
+                    if runtime is not None:
+                        runtime.chat_cycle_dirty.add(chat_id)
+                    continue
             try:
                 self._app_process_notification(event)
             except Exception as exc:
                 self.logger.warning(f"app-server event handling failed: {exc}")
 
     def _app_retry_failed_replies(self) -> None:
-        for chat_id, state in self.app_chat_states.items():
-            failed_text = str(state.get("failed_reply_text") or "").strip()
-            failed_ids: set[int] = state.get("failed_reply_ids") or set()
-            if not failed_text or not failed_ids:
-                continue
-            ok = self._app_try_send_final_reply(chat_id=chat_id, message_ids=failed_ids, text=failed_text)
-            if ok:
-                thread_id = str(state.get("thread_id") or "").strip()
-                retry_task_ids: set[str] = {f"thread_{thread_id}"} if thread_id else set()
-                self._task_record_batch_change(
-                    chat_id=chat_id,
-                    task_ids=retry_task_ids,
-                    message_ids=set(failed_ids),
-                    status="completed",
-                    result_text=failed_text,
-                    sent_ok=True,
-                )
-                state["failed_reply_text"] = ""
-                state["failed_reply_ids"] = set()
+        for chat_id, state in list(self.app_chat_states.items()):
+            self._app_retry_failed_reply_for_chat(chat_id, state)
+
+    def _app_retry_failed_reply_for_chat(self, chat_id: int, state: dict[str, Any]) -> None:
+        failed_text = str(state.get("failed_reply_text") or "").strip()
+        failed_ids: set[int] = state.get("failed_reply_ids") or set()
+        if not failed_text or not failed_ids:
+            return
+        ok = self._app_try_send_final_reply(chat_id=chat_id, message_ids=failed_ids, text=failed_text)
+        if ok:
+            thread_id = str(state.get("thread_id") or "").strip()
+            retry_task_ids: set[str] = {f"thread_{thread_id}"} if thread_id else set()
+            self._task_record_batch_change(
+                chat_id=chat_id,
+                task_ids=retry_task_ids,
+                message_ids=set(failed_ids),
+                status="completed",
+                result_text=failed_text,
+                sent_ok=True,
+            )
+            state["failed_reply_text"] = ""
+            state["failed_reply_ids"] = set()
+
+    def _app_requeue_steer_batch(self, state: dict[str, Any]) -> None:
+        """Move follow-ups held for a steer into queued_messages."""
+        steer_batch = list(state.get("steer_batch") or [])
+        state["steer_batch"] = []
+        state["steer_flush_at"] = 0.0
+        if not steer_batch:
+            return
+        queued = list(state.get("queued_messages") or [])
+        queued.extend(steer_batch)
+        state["queued_messages"] = self._dedupe_messages_by_message_id(messages=queued)
+
+    def _app_delta_buffer(self, state: dict[str, Any]) -> AgentDeltaBuffer:
+        delta_buffer = state.get("delta_buffer")
+        if not isinstance(delta_buffer, AgentDeltaBuffer):
+            delta_buffer = AgentDeltaBuffer()
+            state["delta_buffer"] = delta_buffer
+        return delta_buffer
+
+    def _app_next_deadline_in(self, now_epoch: float | None = None) -> float | None:
+        """
+        Seconds until the earliest per-chat timer (steer flush, progress flush,
+        lease heartbeat, turn timeout) comes due, or None when no turn is active.
+        Event-driven work wakes the main loop by itself; this only covers timers.
+        """
+        now_epoch = time.time() if now_epoch is None else float(now_epoch)
+        deadlines = [
+            deadline
+            for deadline in (self._app_chat_next_deadline(state) for state in list(self.app_chat_states.values()))
+            if deadline is not None
+        ]
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - now_epoch)
+
+    def _app_chat_next_deadline(self, state: dict[str, Any]) -> float | None:
+        """Epoch of the chat's earliest timer, or None when it has no active turn."""
+        if not str(state.get("active_turn_id") or "").strip():
+            return None
+        deadlines: list[float] = []
+        if state.get("steer_batch"):
+            deadlines.append(float(state.get("steer_flush_at") or 0.0))
+        started_epoch = float(state.get("last_turn_started_at") or 0.0)
+        if started_epoch > 0:
+            deadlines.append(started_epoch + float(self.app_server_turn_timeout_sec))
+        deadlines.append(float(state.get("last_lease_heartbeat_at") or 0.0) + float(self.chat_lease_heartbeat_sec))
+        # Runs on the main thread while the chat's lane may be streaming into
+        # this state, so never install a buffer here.
+        delta_buffer = state.get("delta_buffer")
+        if (
+            not self.app_server_forward_agent_message
+            and isinstance(delta_buffer, AgentDeltaBuffer)
+            and delta_buffer.length > int(state.get("last_progress_len") or 0)
+        ):
+            interval_sec = float(self.app_server_progress_interval_sec)
+            if self.app_server_progress_edit_in_place:
+                steps = min(int(state.get("progress_updates") or 0), APP_SERVER_PROGRESS_EDIT_MAX_BACKOFF_STEPS)
+                interval_sec *= 2**steps
+            deadlines.append(float(state.get("last_progress_sent_at") or 0.0) + interval_sec)
+        return min(deadlines)
+
+    def _app_chat_cycle_due(
+        self,
+        runtime: DaemonServiceAppRuntime,
+        chat_id: int,
+        pending_chat_messages: list[dict[str, Any]],
+        now_epoch: float,
+    ) -> bool:
+        """
+        Whether a pooled chat needs a cycle job now. Worker completions wake the
+        main loop, so re-dispatching chats with nothing new would spin.
+        """
+        state = self._get_chat_state(chat_id)
+        signature = tuple(sorted(int(item.get("message_id", 0)) for item in pending_chat_messages))
+        last_signature, last_dispatch_at = runtime.chat_cycle_marks.get(chat_id, ((), 0.0))
+        deadline = self._app_chat_next_deadline(state)
+        # A timer still overdue after a dispatch that ran past it was not
+        # cleared by its handler; retry it at the poll cadence instead.
+        has_retry_work = bool(
+            self._has_untracked_pending_messages(pending_chat_messages)
+            or state.get("queued_messages")
+            or str(state.get("failed_reply_text") or "").strip()
+            or (deadline is not None and deadline <= now_epoch)
+        )
+        due = (
+            signature != last_signature
+            or chat_id in runtime.chat_cycle_dirty
+            or (deadline is not None and last_dispatch_at < deadline <= now_epoch)
+            or (has_retry_work and (now_epoch - last_dispatch_at) >= max(1.0, float(self.poll_interval_sec)))
+        )
+        if due:
+            runtime.chat_cycle_marks[chat_id] = (signature, now_epoch)
+            runtime.chat_cycle_dirty.discard(chat_id)
+        return due
 
     def _app_process_cycle(self) -> None:
         self._prune_completed_message_cache()
@@ -1585,115 +1874,160 @@ class DaemonServiceAppMixin:
         if not self._ensure_app_server():
             return
         self._app_drain_events()
-        self._app_retry_failed_replies()
+        workers = self._get_chat_workers()
+        if workers is None:
+            self._app_retry_failed_replies()
         # turn/completed ó processed ŷ ݿ  Ƿ
         # pending    ޽  Ŭ  Ѵ.
         pending_messages = self._snapshot_pending_messages()
 
         grouped = self._group_pending_by_chat(pending_messages)
         chat_ids = set(grouped.keys())
-        for chat_id, state in self.app_chat_states.items():
+        for chat_id, state in list(self.app_chat_states.items()):
             if (
                 str(state.get("active_turn_id") or "").strip()
                 or state.get("queued_messages")
+                or state.get("steer_batch")
                 or str(state.get("failed_reply_text") or "").strip()
             ):
                 chat_ids.add(chat_id)
 
+        runtime = self._get_app_runtime()
+        now_epoch = time.time()
         for chat_id in sorted(chat_ids):
             pending_chat_messages = grouped.get(chat_id, [])
-            state = self._get_chat_state(chat_id)
-            pending_chat_messages = self._process_chat_control_messages(
-                chat_id=chat_id,
-                state=state,
-                pending_chat_messages=pending_chat_messages,
+            if workers is None or runtime is None:
+                self._app_process_chat(chat_id, pending_chat_messages)
+                continue
+            # One cycle job per chat at a time; the lane keeps it ordered
+            # behind that chat's app-server events.
+            if workers.has_job(chat_id, "cycle"):
+                continue
+            if not self._app_chat_cycle_due(runtime, chat_id, pending_chat_messages, now_epoch):
+                continue
+            workers.submit(
+                chat_id,
+                "cycle",
+                lambda chat_id=chat_id, items=pending_chat_messages: self._app_process_chat(
+                    chat_id, items, retry_failed_reply=True
+                ),
             )
-            # Turn timeout guard.
-            active_turn = str(state.get("active_turn_id") or "").strip()
-            if active_turn:
-                started_epoch = float(state.get("last_turn_started_at") or 0.0)
-                if started_epoch > 0 and (time.time() - started_epoch) > self.app_server_turn_timeout_sec:
-                    thread_id = str(state.get("thread_id") or "").strip()
-                    if thread_id:
-                        self.logger.warning(
-                            f"interrupting stale turn chat_id={chat_id} turn_id={active_turn} "
-                            f"timeout={self.app_server_turn_timeout_sec}s"
-                        )
-                        self._app_request(
-                            "turn/interrupt",
-                            {"threadId": thread_id, "turnId": active_turn},
-                            timeout_sec=10.0,
-                        )
-                    state["active_turn_id"] = ""
-                    state["active_message_ids"] = set()
-                    state["active_task_ids"] = set()
-                    state["delta_text"] = ""
-                    state["final_text"] = ""
-                    state["last_agent_message_sent"] = ""
-                    state["last_agent_message_raw"] = ""
-                    state["last_lease_heartbeat_at"] = 0.0
-                    self._chat_lease_release(chat_id, reason="turn_timeout_interrupt")
-                    self._sync_app_server_session_meta(active_chat_id=chat_id)
-                    active_turn = ""
-
-            new_items = self._collect_new_messages_for_chat(chat_id, state, pending_chat_messages)
-            if str(state.get("active_turn_id") or "").strip():
-                last_lease_heartbeat = float(state.get("last_lease_heartbeat_at") or 0.0)
-                if (time.time() - last_lease_heartbeat) >= float(self.chat_lease_heartbeat_sec):
-                    touched = self._chat_lease_touch(
-                        chat_id=chat_id,
-                        turn_id=str(state.get("active_turn_id") or ""),
-                        message_ids=set(state.get("active_message_ids") or set()),
+
+    def _app_process_chat(
+        self,
+        chat_id: int,
+        pending_chat_messages: list[dict[str, Any]],
+        retry_failed_reply: bool = False,
+    ) -> None:
+        """
+        One chat's share of a cycle: control messages, turn timeout, lease
+        heartbeat, steer or turn start, and progress. Runs on the chat's worker
+        lane when the pool is enabled, otherwise inline on the main loop.
+        """
+        state = self._get_chat_state(chat_id)
+        if retry_failed_reply:
+            self._app_retry_failed_reply_for_chat(chat_id, state)
+        pending_chat_messages = self._process_chat_control_messages(
+            chat_id=chat_id,
+            state=state,
+            pending_chat_messages=pending_chat_messages,
+        )
+        # Turn timeout guard.
+        active_turn = str(state.get("active_turn_id") or "").strip()
+        if active_turn:
+            started_epoch = float(state.get("last_turn_started_at") or 0.0)
+            if started_epoch > 0 and (time.time() - started_epoch) > self.app_server_turn_timeout_sec:
+                thread_id = str(state.get("thread_id") or "").strip()
+                if thread_id:
+                    self.logger.warning(
+                        f"interrupting stale turn chat_id={chat_id} turn_id={active_turn} "
+                        f"timeout={self.app_server_turn_timeout_sec}s"
                     )
-                    if touched:
-                        state["last_lease_heartbeat_at"] = time.time()
-                if not new_items:
-                    self._app_try_send_progress(chat_id, state)
-                    continue
-                if bool(state.get("force_new_thread_once")):
+                    self._app_request(
+                        "turn/interrupt",
+                        {"threadId": thread_id, "turnId": active_turn},
+                        timeout_sec=10.0,
+                    )
+                state["active_turn_id"] = ""
+                state["active_message_ids"] = set()
+                state["active_task_ids"] = set()
+                state["delta_buffer"] = None
+                state["final_text"] = ""
+                state["last_agent_message_sent"] = ""
+                state["last_agent_message_raw"] = ""
+                state["last_lease_heartbeat_at"] = 0.0
+                self._app_requeue_steer_batch(state)
+                self._chat_lease_release(chat_id, reason="turn_timeout_interrupt")
+                self._sync_app_server_session_meta(active_chat_id=chat_id)
+                active_turn = ""
+
+        new_items = self._collect_new_messages_for_chat(chat_id, state, pending_chat_messages)
+        if str(state.get("active_turn_id") or "").strip():
+            last_lease_heartbeat = float(state.get("last_lease_heartbeat_at") or 0.0)
+            if (time.time() - last_lease_heartbeat) >= float(self.chat_lease_heartbeat_sec):
+                touched = self._chat_lease_touch(
+                    chat_id=chat_id,
+                    turn_id=str(state.get("active_turn_id") or ""),
+                    message_ids=set(state.get("active_message_ids") or set()),
+                )
+                if touched:
+                    state["last_lease_heartbeat_at"] = time.time()
+            if bool(state.get("force_new_thread_once")):
+                if new_items:
                     queued = list(state.get("queued_messages") or [])
                     queued.extend(new_items)
                     state["queued_messages"] = self._dedupe_messages_by_message_id(messages=queued)
-                    self._app_try_send_progress(chat_id, state)
-                    continue
-                # Small coalescing window before steer to reduce call count.
-                time.sleep(self.app_server_steer_batch_window_ms / 1000.0)
-                steer_ok = self._app_steer_turn_for_chat(chat_id, new_items)
+                self._app_requeue_steer_batch(state)
+                self._app_try_send_progress(chat_id, state)
+                return
+            if new_items:
+                # Coalesce follow-ups for a short window before steering to
+                # reduce call count. The window is a per-chat deadline, so
+                # other chats and app-server events keep flowing meanwhile.
+                steer_batch = list(state.get("steer_batch") or [])
+                if not steer_batch:
+                    state["steer_flush_at"] = time.time() + self.app_server_steer_batch_window_ms / 1000.0
+                steer_batch.extend(new_items)
+                state["steer_batch"] = self._dedupe_messages_by_message_id(messages=steer_batch)
+            steer_batch = list(state.get("steer_batch") or [])
+            if steer_batch and time.time() >= float(state.get("steer_flush_at") or 0.0):
+                state["steer_batch"] = []
+                state["steer_flush_at"] = 0.0
+                steer_ok = self._app_steer_turn_for_chat(chat_id, steer_batch)
                 if not steer_ok:
                     queued = list(state.get("queued_messages") or [])
-                    queued.extend(new_items)
+                    queued.extend(steer_batch)
                     # de-duplicate queued rows by message id while keeping order.
                     state["queued_messages"] = self._dedupe_messages_by_message_id(messages=queued)
-                self._app_try_send_progress(chat_id, state)
-                continue
-
-            batch = list(state.get("queued_messages") or [])
-            if not batch and not new_items:
-                continue
-            if not batch:
-                batch = new_items
-            else:
-                merged = batch + new_items
-                batch = self._dedupe_messages_by_message_id(messages=merged)
-
-            started = self._app_start_turn_for_chat(chat_id, batch)
-            if not started:
-                now_epoch = time.time()
-                retry_batch: list[dict[str, Any]] = []
-                for item in batch:
-                    msg_id = int(item.get("message_id", 0))
-                    if msg_id <= 0:
-                        continue
-                    if self._is_message_recently_completed(msg_id, now_epoch=now_epoch):
-                        age_sec = self._recently_completed_message_age_sec(msg_id, now_epoch=now_epoch)
-                        if age_sec >= 0.0:
-                            self._log_recently_completed_drop(chat_id, msg_id, age_sec)
-                        continue
-                    retry_batch.append(item)
-                state["queued_messages"] = retry_batch
-            else:
-                state["queued_messages"] = []
-
-
-
+            self._app_try_send_progress(chat_id, state)
+            return
 
+        # The turn ended before the steer window closed: fold the held
+        # follow-ups into the next turn instead.
+        self._app_requeue_steer_batch(state)
+        batch = list(state.get("queued_messages") or [])
+        if not batch and not new_items:
+            return
+        if not batch:
+            batch = new_items
+        else:
+            merged = batch + new_items
+            batch = self._dedupe_messages_by_message_id(messages=merged)
+
+        started = self._app_start_turn_for_chat(chat_id, batch)
+        if not started:
+            now_epoch = time.time()
+            retry_batch: list[dict[str, Any]] = []
+            for item in batch:
+                msg_id = int(item.get("message_id", 0))
+                if msg_id <= 0:
+                    continue
+                if self._is_message_recently_completed(msg_id, now_epoch=now_epoch):
+                    age_sec = self._recently_completed_message_age_sec(msg_id, now_epoch=now_epoch)
+                    if age_sec >= 0.0:
+                        self._log_recently_completed_drop(chat_id, msg_id, age_sec)
+                    continue
+                retry_batch.append(item)
+            state["queued_messages"] = retry_batch
+        else:
+            state["queued_messages"] = []
@@ -51,6 +51,7 @@ class DaemonServiceConfig:
     chat_locks_dir: Path
     activity_file: Path
     poll_interval_sec: int
+    main_loop_idle_tick_sec: float
     idle_timeout_sec: int
     log_retention_days: int
     activity_max_bytes: int
@@ -66,7 +67,10 @@ class DaemonServiceConfig:
     tasks_partition_by_chat: bool
     app_server_listen: str
     app_server_progress_interval_sec: float
+    app_server_progress_edit_in_place: bool
+    app_server_progress_final_mode: str
     app_server_steer_batch_window_ms: int
+    app_server_chat_concurrency: int
     app_server_turn_timeout_sec: int
     app_server_restart_backoff_sec: float
     app_server_request_timeout_sec: float
@@ -76,6 +80,13 @@ class DaemonServiceConfig:
     telegram_force_parse_mode: bool
     telegram_default_parse_mode: str
     telegram_parse_fallback_raw_on_fail: bool
+    telegram_receiver_enabled: bool
+    telegram_receiver_poll_timeout_sec: int
+    store_maintenance_interval_sec: int
+    telegram_outbox_enabled: bool
+    telegram_outbox_file: Path
+    telegram_outbox_max_attempts: int
+    task_cards_batch_enabled: bool
     agent_rewriter_enabled: bool
     agent_rewriter_timeout_sec: float
     agent_rewriter_request_timeout_sec: float
@@ -137,11 +148,19 @@ class DaemonServiceConfig:
         chat_locks_dir = Path(
             os.getenv("DAEMON_CHAT_LOCKS_DIR", str(state_dir / "chat_locks"))
         ).resolve()
+        telegram_outbox_file = Path(
+            os.getenv("DAEMON_TELEGRAM_OUTBOX_FILE", str(state_dir / "telegram-outbox.sqlite3"))
+        ).resolve()
         activity_file = Path(
             os.getenv("DAEMON_ACTIVITY_FILE", str(logs_dir / "codex-app-server.log"))
         ).resolve()
 
         poll_interval_sec = _env_int("DAEMON_POLL_INTERVAL_SEC", 1, minimum=0)
+        main_loop_idle_tick_sec = _env_float(
+            "DAEMON_MAIN_LOOP_IDLE_TICK_SEC",
+            _constants.DEFAULT_MAIN_LOOP_IDLE_TICK_SEC,
+            minimum=1.0,
+        )
         idle_timeout_sec = _env_int("DAEMON_IDLE_TIMEOUT_SEC", 600, minimum=0)
         log_retention_days = _env_int("LOG_RETENTION_DAYS", 7, minimum=1)
         activity_max_bytes = _env_int("DAEMON_ACTIVITY_MAX_BYTES", _constants.DEFAULT_ACTIVITY_MAX_BYTES, minimum=1)
@@ -184,11 +203,28 @@ class DaemonServiceConfig:
             _constants.DEFAULT_APP_SERVER_PROGRESS_INTERVAL_SEC,
             minimum=5.0,
         )
+        app_server_progress_edit_in_place = _env_bool(
+            "DAEMON_APP_SERVER_PROGRESS_EDIT_IN_PLACE",
+            _constants.DEFAULT_APP_SERVER_PROGRESS_EDIT_IN_PLACE,
+        )
+        app_server_progress_final_raw = (os.getenv("DAEMON_APP_SERVER_PROGRESS_FINAL_MODE", "") or "").strip().lower()
+        app_server_progress_final_mode = app_server_progress_final_raw or _constants.DEFAULT_APP_SERVER_PROGRESS_FINAL_MODE
+        if app_server_progress_final_mode not in _constants.APP_SERVER_PROGRESS_FINAL_MODES:
+            warnings.append(
+                f"invalid DAEMON_APP_SERVER_PROGRESS_FINAL_MODE={app_server_progress_final_raw!r}; "
+                f"fallback={_constants.DEFAULT_APP_SERVER_PROGRESS_FINAL_MODE}"
+            )
+            app_server_progress_final_mode = _constants.DEFAULT_APP_SERVER_PROGRESS_FINAL_MODE
         app_server_steer_batch_window_ms = _env_int(
             "DAEMON_APP_SERVER_STEER_BATCH_WINDOW_MS",
             _constants.DEFAULT_APP_SERVER_STEER_BATCH_WINDOW_MS,
             minimum=100,
         )
+        app_server_chat_concurrency = _env_int(
+            "DAEMON_APP_SERVER_CHAT_CONCURRENCY",
+            _constants.DEFAULT_APP_SERVER_CHAT_CONCURRENCY,
+            minimum=0,
+        )
         app_server_turn_timeout_sec = _env_int(
             "DAEMON_APP_SERVER_TURN_TIMEOUT_SEC",
             _constants.DEFAULT_APP_SERVER_TURN_TIMEOUT_SEC,
@@ -239,6 +275,36 @@ class DaemonServiceConfig:
             "DAEMON_TELEGRAM_PARSE_FALLBACK_RAW_ON_FAIL",
             _constants.DEFAULT_TELEGRAM_PARSE_FALLBACK_RAW_ON_FAIL,
         )
+        telegram_receiver_enabled = _env_bool(
+            "DAEMON_TELEGRAM_RECEIVER_ENABLED",
+            _constants.DEFAULT_TELEGRAM_RECEIVER_ENABLED,
+        )
+        telegram_receiver_poll_timeout_sec = min(
+            50,
+            _env_int(
+                "DAEMON_TELEGRAM_RECEIVER_POLL_TIMEOUT_SEC",
+                _constants.DEFAULT_TELEGRAM_RECEIVER_POLL_TIMEOUT_SEC,
+                minimum=1,
+            ),
+        )
+        store_maintenance_interval_sec = _env_int(
+            "DAEMON_STORE_MAINTENANCE_INTERVAL_SEC",
+            _constants.DEFAULT_STORE_MAINTENANCE_INTERVAL_SEC,
+            minimum=60,
+        )
+        telegram_outbox_enabled = _env_bool(
+            "DAEMON_TELEGRAM_OUTBOX_ENABLED",
+            _constants.DEFAULT_TELEGRAM_OUTBOX_ENABLED,
+        )
+        telegram_outbox_max_attempts = _env_int(
+            "DAEMON_TELEGRAM_OUTBOX_MAX_ATTEMPTS",
+            _constants.DEFAULT_TELEGRAM_OUTBOX_MAX_ATTEMPTS,
+            minimum=1,
+        )
+        task_cards_batch_enabled = _env_bool(
+            "DAEMON_TASK_CARDS_BATCH_ENABLED",
+            _constants.DEFAULT_TASK_CARDS_BATCH_ENABLED,
+        )
         agent_rewriter_enabled = _env_bool(
             "DAEMON_AGENT_REWRITER_ENABLED",
             _constants.DEFAULT_AGENT_REWRITER_ENABLED,
@@ -421,6 +487,7 @@ class DaemonServiceConfig:
             chat_locks_dir=chat_locks_dir,
             activity_file=activity_file,
             poll_interval_sec=poll_interval_sec,
+            main_loop_idle_tick_sec=main_loop_idle_tick_sec,
             idle_timeout_sec=idle_timeout_sec,
             log_retention_days=log_retention_days,
             activity_max_bytes=activity_max_bytes,
@@ -436,7 +503,10 @@ class DaemonServiceConfig:
             tasks_partition_by_chat=tasks_partition_by_chat,
             app_server_listen=app_server_listen,
             app_server_progress_interval_sec=app_server_progress_interval_sec,
+            app_server_progress_edit_in_place=app_server_progress_edit_in_place,
+            app_server_progress_final_mode=app_server_progress_final_mode,
             app_server_steer_batch_window_ms=app_server_steer_batch_window_ms,
+            app_server_chat_concurrency=app_server_chat_concurrency,
             app_server_turn_timeout_sec=app_server_turn_timeout_sec,
             app_server_restart_backoff_sec=app_server_restart_backoff_sec,
             app_server_request_timeout_sec=app_server_request_timeout_sec,
@@ -446,6 +516,13 @@ class DaemonServiceConfig:
             telegram_force_parse_mode=telegram_force_parse_mode,
             telegram_default_parse_mode=telegram_default_parse_mode,
             telegram_parse_fallback_raw_on_fail=telegram_parse_fallback_raw_on_fail,
+            telegram_receiver_enabled=telegram_receiver_enabled,
+            telegram_receiver_poll_timeout_sec=telegram_receiver_poll_timeout_sec,
+            store_maintenance_interval_sec=store_maintenance_interval_sec,
+            telegram_outbox_enabled=telegram_outbox_enabled,
+            telegram_outbox_file=telegram_outbox_file,
+            telegram_outbox_max_attempts=telegram_outbox_max_attempts,
+            task_cards_batch_enabled=task_cards_batch_enabled,
             agent_rewriter_enabled=agent_rewriter_enabled,
             agent_rewriter_timeout_sec=agent_rewriter_timeout_sec,
             agent_rewriter_request_timeout_sec=agent_rewriter_request_timeout_sec,
@@ -46,6 +46,34 @@ class DaemonServiceCorePythonPolicy:
         return candidates
 
 
+class DaemonWakeup:
+    """
+    Single wait primitive for the daemon main loop.
+
+    Producers (Telegram receiver, app-server stdout reader, signal handler)
+    call `notify(reason)`; the loop blocks in `wait(timeout)` until one of them
+    fires or its next timer deadline passes. Reasons accumulate until the next
+    wait returns, so a notification sent while the loop is busy is never lost.
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._reasons: set[str] = set()
+
+    def notify(self, reason: str = "event") -> None:
+        with self._cond:
+            self._reasons.add(str(reason or "event"))
+            self._cond.notify_all()
+
+    def wait(self, timeout: float) -> set[str]:
+        """Block up to `timeout` seconds; return the reasons that woke us (empty on timeout)."""
+        with self._cond:
+            if not self._reasons:
+                self._cond.wait(max(0.0, float(timeout)))
+            reasons, self._reasons = self._reasons, set()
+        return reasons
+
+
 class DaemonServiceCoreRuntime:
     def __init__(
         self,
@@ -60,6 +88,7 @@ class DaemonServiceCoreRuntime:
         self.codex_run_meta: Optional[dict[str, object]] = None
         self.codex_cli_version = ""
         self.stop_requested = False
+        self.wakeup = DaemonWakeup()
         self.env = self._build_default_env()
 
     def _build_default_env(self) -> dict[str, str]:
@@ -174,6 +203,21 @@ class DaemonServiceCoreMixin:
         if runtime is None:
             return
         runtime.stop_requested = bool(value)
+        if runtime.stop_requested:
+            runtime.wakeup.notify("shutdown")
+
+    def _wake_main_loop(self, reason: str = "event") -> None:
+        runtime = self._get_core_runtime()
+        if runtime is not None:
+            runtime.wakeup.notify(reason)
+
+    def _wait_main_loop(self, timeout_sec: float) -> set[str]:
+        """Block until a producer wakes the main loop or `timeout_sec` passes."""
+        runtime = self._get_core_runtime()
+        if runtime is None:
+            time.sleep(max(0.0, float(timeout_sec)))
+            return set()
+        return runtime.wakeup.wait(timeout_sec)
 
     @property
     def env(self) -> dict[str, str]:
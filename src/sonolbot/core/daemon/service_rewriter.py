@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from sonolbot.core.daemon.runtime_shared import *
 from sonolbot.core.daemon import service_utils as _service_utils
+from sonolbot.core.daemon.jsonrpc import JsonRpcClient, JsonRpcError
 
 
 class DaemonServiceRewriterRuntime:
@@ -9,12 +10,12 @@ class DaemonServiceRewriterRuntime:
         self.service = service
         self.rewriter_proc: subprocess.Popen[str] | None = None
         self.rewriter_json_send_lock = threading.Lock()
-        self.rewriter_req_lock = threading.Lock()
-        self.rewriter_pending_responses: dict[int, queue.Queue[dict[str, Any]] ] = {}
-        self.rewriter_event_queue: queue.Queue[dict[str, Any]] = queue.Queue()
-        self.rewriter_next_request_id = 1
-        self.rewriter_turn_results: dict[str, dict[str, Any]] = {}
+        self.rewriter_rpc = JsonRpcClient(lambda payload: self._owner._rewriter_send_json(payload), name="agent-rewriter")
         self.rewriter_chat_threads: dict[int, str] = {}
+        # Chat lanes rewrite concurrently: one lock serializes the thread map
+        # and its state file, another the check-then-start of the process.
+        self.rewriter_state_lock = threading.RLock()
+        self.rewriter_start_lock = threading.Lock()
         self.rewriter_last_restart_try_epoch = 0.0
         self._lock: _ProcessFileLock | None = None
         self._lock_busy_logged_at = 0.0
@@ -39,22 +40,24 @@ class DaemonServiceRewriterRuntime:
                 thread_id = str(raw_thread or "").strip()
                 if thread_id:
                     threads[chat_id] = thread_id
-            self.rewriter_chat_threads = threads
+            with self.rewriter_state_lock:
+                self.rewriter_chat_threads = threads
 
         next_request_id = payload.get("next_request_id")
         if isinstance(next_request_id, int):
-            self.rewriter_next_request_id = max(1, next_request_id)
+            self.rewriter_rpc.next_request_id = max(1, next_request_id)
 
     def save_state(self) -> None:
-        payload: dict[str, Any] = {
-            "version": 1,
-            "saved_at": time.time(),
-            "next_request_id": self.rewriter_next_request_id,
-            "chat_threads": {
-                str(chat_id): thread_id for chat_id, thread_id in self.rewriter_chat_threads.items()
-            },
-        }
-        _service_utils.write_json_dict_atomic(self._owner.agent_rewriter_state_file, payload)
+        with self.rewriter_state_lock:
+            payload: dict[str, Any] = {
+                "version": 1,
+                "saved_at": time.time(),
+                "next_request_id": self.rewriter_rpc.next_request_id,
+                "chat_threads": {
+                    str(chat_id): thread_id for chat_id, thread_id in list(self.rewriter_chat_threads.items())
+                },
+            }
+            _service_utils.write_json_dict_atomic(self._owner.agent_rewriter_state_file, payload)
 
     def read_pid_file(self, path: Path) -> int:
         if not path.exists():
@@ -175,74 +178,39 @@ class DaemonServiceRewriterMixin:
         runtime.rewriter_json_send_lock = value
 
     @property
-    def rewriter_req_lock(self) -> threading.Lock:
+    def rewriter_state_lock(self) -> threading.RLock:
         runtime = self._get_rewriter_runtime()
         if runtime is None:
-            return threading.Lock()
-        return runtime.rewriter_req_lock
-
-    @rewriter_req_lock.setter
-    def rewriter_req_lock(self, value: threading.Lock) -> None:
-        runtime = self._get_rewriter_runtime()
-        if runtime is None:
-            return
-        runtime.rewriter_req_lock = value
+            return threading.RLock()
+        return runtime.rewriter_state_lock
 
     @property
-    def rewriter_pending_responses(self) -> dict[int, queue.Queue[dict[str, Any]]]:
+    def rewriter_start_lock(self) -> threading.Lock:
         runtime = self._get_rewriter_runtime()
         if runtime is None:
-            return {}
-        return runtime.rewriter_pending_responses
-
-    @rewriter_pending_responses.setter
-    def rewriter_pending_responses(self, value: dict[int, queue.Queue[dict[str, Any]]]) -> None:
-        runtime = self._get_rewriter_runtime()
-        if runtime is None:
-            return
-        runtime.rewriter_pending_responses = value
+            return threading.Lock()
+        return runtime.rewriter_start_lock
 
     @property
-    def rewriter_event_queue(self) -> queue.Queue[dict[str, Any]]:
-        runtime = self._get_rewriter_runtime()
-        if runtime is None:
-            return queue.Queue()
-        return runtime.rewriter_event_queue
-
-    @rewriter_event_queue.setter
-    def rewriter_event_queue(self, value: queue.Queue[dict[str, Any]]) -> None:
+    def rewriter_rpc(self) -> JsonRpcClient | None:
         runtime = self._get_rewriter_runtime()
         if runtime is None:
-            return
-        runtime.rewriter_event_queue = value
+            return None
+        return runtime.rewriter_rpc
 
     @property
     def rewriter_next_request_id(self) -> int:
         runtime = self._get_rewriter_runtime()
         if runtime is None:
             return 1
-        return runtime.rewriter_next_request_id
+        return runtime.rewriter_rpc.next_request_id
 
     @rewriter_next_request_id.setter
     def rewriter_next_request_id(self, value: int) -> None:
         runtime = self._get_rewriter_runtime()
         if runtime is None:
             return
-        runtime.rewriter_next_request_id = value
-
-    @property
-    def rewriter_turn_results(self) -> dict[str, dict[str, Any]]:
-        runtime = self._get_rewriter_runtime()
-        if runtime is None:
-            return {}
-        return runtime.rewriter_turn_results
-
-    @rewriter_turn_results.setter
-    def rewriter_turn_results(self, value: dict[str, dict[str, Any]]) -> None:
-        runtime = self._get_rewriter_runtime()
-        if runtime is None:
-            return
-        runtime.rewriter_turn_results = value
+        runtime.rewriter_rpc.next_request_id = value
 
     @property
     def rewriter_chat_threads(self) -> dict[int, str]:
@@ -362,37 +330,18 @@ class DaemonServiceRewriterMixin:
         params: dict[str, Any] | None = None,
         timeout_sec: float | None = None,
     ) -> dict[str, Any] | None:
-        if not self._rewriter_is_running():
-            return None
-
-        with self.rewriter_req_lock:
-            req_id = self.rewriter_next_request_id
-            self.rewriter_next_request_id += 1
-            response_q: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=1)
-            self.rewriter_pending_responses[req_id] = response_q
-
-        payload: dict[str, Any] = {"id": req_id, "method": method}
-        if params is not None:
-            payload["params"] = params
-
-        if not self._rewriter_send_json(payload):
-            with self.rewriter_req_lock:
-                self.rewriter_pending_responses.pop(req_id, None)
+        rpc = self.rewriter_rpc
+        if rpc is None or not self._rewriter_is_running():
             return None
-
         wait_sec = timeout_sec if timeout_sec is not None else self.agent_rewriter_request_timeout_sec
         try:
-            reply = response_q.get(timeout=max(1.0, float(wait_sec)))
-        except queue.Empty:
-            self.logger.warning(f"agent-rewriter request timeout method={method} id={req_id}")
-            with self.rewriter_req_lock:
-                self.rewriter_pending_responses.pop(req_id, None)
+            result = rpc.call(method, params, timeout_sec=max(1.0, float(wait_sec)))
+        except JsonRpcError as exc:
+            if exc.error is not None:
+                self.logger.warning(f"{exc} error={exc.error}")
+            else:
+                self.logger.warning(str(exc))
             return None
-
-        if "error" in reply:
-            self.logger.warning(f"agent-rewriter request error method={method} id={req_id} error={reply.get('error')}")
-            return None
-        result = reply.get("result")
         if isinstance(result, dict):
             return result
         return {"value": result}
@@ -446,15 +395,9 @@ class DaemonServiceRewriterMixin:
         if not isinstance(obj, dict):
             return
 
-        if "id" in obj and ("result" in obj or "error" in obj):
-            req_id = obj.get("id")
-            with self.rewriter_req_lock:
-                pending_q = self.rewriter_pending_responses.pop(req_id, None)
-            if pending_q is not None:
-                try:
-                    pending_q.put_nowait(obj)
-                except Exception:
-                    pass
+        # Replies to our requests, and turn notifications a rewrite is waiting for.
+        rpc = self.rewriter_rpc
+        if rpc is not None and rpc.handle_message(obj):
             return
 
         method = obj.get("method")
@@ -464,11 +407,7 @@ class DaemonServiceRewriterMixin:
         if "id" in obj:
             self._rewriter_handle_server_request(obj)
             return
-
-        try:
-            self.rewriter_event_queue.put_nowait(obj)
-        except Exception:
-            self.logger.warning(f"agent-rewriter event queue full; dropping event")
+        # Other notifications carry nothing the rewriter uses.
 
     def _rewriter_stdout_reader(self) -> None:
         proc = self.rewriter_proc
@@ -479,6 +418,8 @@ class DaemonServiceRewriterMixin:
             if not line:
                 continue
             self._rewriter_dispatch_incoming(line)
+        if self.rewriter_rpc is not None and proc is self.rewriter_proc:
+            self.rewriter_rpc.fail_all("agent-rewriter exited")
 
     def _rewriter_stderr_reader(self) -> None:
         proc = self.rewriter_proc
@@ -492,71 +433,35 @@ class DaemonServiceRewriterMixin:
             if "ERROR" in line or "WARN" in line:
                 self.logger.info(f"[agent-rewriter][stderr] {line}")
 
-    def _rewriter_process_notification(self, event: dict[str, Any]) -> None:
-        method = str(event.get("method") or "")
-        params = event.get("params")
-        if not isinstance(params, dict):
-            params = {}
-
-        if method == "codex/event/task_complete":
-            msg = params.get("msg")
-            if not isinstance(msg, dict):
-                return
-            turn_id = str(msg.get("turn_id") or params.get("id") or "").strip()
+    def _rewriter_run_turn(self, thread_id: str, payload: dict[str, Any]) -> str | None:
+        """Start a rewrite turn and block until it finishes; its final text, or None."""
+        rpc = self.rewriter_rpc
+        if rpc is None:
+            return None
+        # Subscribe before turn/start: with low reasoning effort the turn can
+        # finish before the start reply has been handed back to us.
+        collector = rpc.collect(predicate=lambda message: _service_utils.app_notification_ids(message)[0] == thread_id)
+        try:
+            started = self._rewriter_request("turn/start", payload, timeout_sec=self.agent_rewriter_request_timeout_sec)
+            if started is None:
+                return None
+            turn = started.get("turn")
+            turn_id = ""
+            if isinstance(turn, dict):
+                turn_id = str(turn.get("id") or "").strip()
             if not turn_id:
-                return
-            last_text = str(msg.get("last_agent_message") or "").strip()
-            self.rewriter_turn_results[turn_id] = {
-                "status": "completed",
-                "text": last_text,
-                "updated_at": time.time(),
-            }
-            return
-
-        if method == "turn/completed":
-            turn = params.get("turn")
-            if not isinstance(turn, dict):
-                return
-            turn_id = str(turn.get("id") or "").strip()
+                turn_id = str(started.get("turnId") or "").strip()
             if not turn_id:
-                return
-            status = str(turn.get("status") or "").strip().lower() or "completed"
-            current = self.rewriter_turn_results.get(turn_id, {})
-            if not isinstance(current, dict):
-                current = {}
-            current.setdefault("text", "")
-            current["status"] = status
-            current["updated_at"] = time.time()
-            self.rewriter_turn_results[turn_id] = current
-            return
-
-    def _rewriter_drain_events(self, max_items: int = 200) -> None:
-        for _ in range(max_items):
-            try:
-                event = self.rewriter_event_queue.get_nowait()
-            except queue.Empty:
-                break
-            try:
-                self._rewriter_process_notification(event)
-            except Exception as exc:
-                self.logger.warning(f"agent-rewriter event handling failed: {exc}")
-
-    def _rewriter_wait_turn_result(self, turn_id: str, timeout_sec: float) -> dict[str, Any] | None:
-        if not turn_id:
+                return None
+            finished = collector.wait_for(
+                lambda message: _service_utils.app_turn_finished(message, turn_id),
+                timeout_sec=max(0.5, float(self.agent_rewriter_timeout_sec)),
+            )
+        finally:
+            collector.unsubscribe()
+        if finished is None:
             return None
-        deadline = time.time() + max(0.5, float(timeout_sec))
-        while time.time() < deadline:
-            self._rewriter_drain_events(max_items=200)
-            current = self.rewriter_turn_results.get(turn_id)
-            if isinstance(current, dict):
-                status = str(current.get("status") or "").strip().lower()
-                if status == "completed":
-                    self.rewriter_turn_results.pop(turn_id, None)
-                    return current
-            if not self._rewriter_is_running():
-                break
-            time.sleep(0.05)
-        return None
+        return _service_utils.app_turn_final_text(finished)
 
     def _build_agent_rewriter_input(self, chat_id: int, state: dict[str, Any], raw_text: str) -> str:
         user_hint = self._load_latest_user_hint(chat_id=chat_id, state=state)
@@ -610,11 +515,11 @@ class DaemonServiceRewriterMixin:
                 except Exception:
                     pass
         self.rewriter_proc = None
-        with self.rewriter_req_lock:
-            self.rewriter_pending_responses.clear()
-        self.rewriter_turn_results = {}
-        self.rewriter_chat_threads = {}
-        self._save_agent_rewriter_state()
+        if self.rewriter_rpc is not None:
+            self.rewriter_rpc.fail_all(f"agent-rewriter stopped ({reason})")
+        with self.rewriter_state_lock:
+            self.rewriter_chat_threads = {}
+            self._save_agent_rewriter_state()
         try:
             if self.agent_rewriter_pid_file.exists():
                 self.agent_rewriter_pid_file.unlink()
@@ -666,6 +571,13 @@ class DaemonServiceRewriterMixin:
             return False
         if self._rewriter_is_running():
             return True
+        with self.rewriter_start_lock:
+            # Another lane may have started it while we waited for the lock.
+            if self._rewriter_is_running():
+                return True
+            return self._start_agent_rewriter()
+
+    def _start_agent_rewriter(self) -> bool:
         if self.rewriter_proc is not None and self.rewriter_proc.poll() is not None:
             self._stop_agent_rewriter("agent_rewriter_exited")
         now_epoch = time.time()
@@ -739,7 +651,8 @@ class DaemonServiceRewriterMixin:
         return True
 
     def _agent_rewriter_attach_or_create_thread(self, chat_id: int) -> str:
-        thread_id = str(self.rewriter_chat_threads.get(int(chat_id)) or "").strip()
+        with self.rewriter_state_lock:
+            thread_id = str(self.rewriter_chat_threads.get(int(chat_id)) or "").strip()
         if thread_id:
             resumed = self._rewriter_request(
                 "thread/resume",
@@ -754,8 +667,9 @@ class DaemonServiceRewriterMixin:
             )
             if resumed is not None:
                 return thread_id
-            self.rewriter_chat_threads.pop(int(chat_id), None)
-            self._save_agent_rewriter_state()
+            with self.rewriter_state_lock:
+                self.rewriter_chat_threads.pop(int(chat_id), None)
+                self._save_agent_rewriter_state()
 
         started = self._rewriter_request(
             "thread/start",
@@ -775,8 +689,9 @@ class DaemonServiceRewriterMixin:
         thread_id = str(thread.get("id") or "").strip()
         if not thread_id:
             return ""
-        self.rewriter_chat_threads[int(chat_id)] = thread_id
-        self._save_agent_rewriter_state()
+        with self.rewriter_state_lock:
+            self.rewriter_chat_threads[int(chat_id)] = thread_id
+            self._save_agent_rewriter_state()
         self.logger.info(f"agent-rewriter thread started chat_id={chat_id} thread_id={thread_id}")
         return thread_id
 
@@ -813,22 +728,10 @@ class DaemonServiceRewriterMixin:
                 "effort": self.agent_rewriter_reasoning_effort,
                 "approvalPolicy": self.app_server_approval_policy,
             }
-            started = self._rewriter_request("turn/start", payload, timeout_sec=self.agent_rewriter_request_timeout_sec)
-            if started is None:
-                continue
-            turn = started.get("turn")
-            turn_id = ""
-            if isinstance(turn, dict):
-                turn_id = str(turn.get("id") or "").strip()
-            if not turn_id:
-                turn_id = str(started.get("turnId") or "").strip()
-            if not turn_id:
-                continue
-
-            result = self._rewriter_wait_turn_result(turn_id=turn_id, timeout_sec=self.agent_rewriter_timeout_sec)
-            if not isinstance(result, dict):
+            result_text = self._rewriter_run_turn(thread_id, payload)
+            if result_text is None:
                 continue
-            rewritten = self._normalize_agent_rewriter_output(str(result.get("text") or ""))
+            rewritten = self._normalize_agent_rewriter_output(result_text)
             if not rewritten:
                 continue
             if self._contains_internal_agent_text(rewritten):
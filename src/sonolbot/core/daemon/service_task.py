@@ -7,6 +7,7 @@ class DaemonServiceTaskRuntime:
     def __init__(self, service: Any) -> None:
         self.service = service
         self.task_skill: Any = None
+        self.task_write_lock = threading.RLock()
 
 
 class DaemonServiceTaskMixin:
@@ -40,6 +41,16 @@ class DaemonServiceTaskMixin:
         runtime.task_skill = skill
         return runtime.task_skill
 
+    @contextmanager
+    def _task_write_guard(self):
+        """Serialize task-skill writes across chat lanes while every chat shares one task root."""
+        runtime = self._get_task_runtime()
+        if self.tasks_partition_by_chat or runtime is None:
+            yield
+            return
+        with runtime.task_write_lock:
+            yield
+
     def _run_task_commands_json(self, args: list[str], timeout_sec: float = 25.0) -> dict[str, Any] | None:
         cmd = [self.python_bin, "-m", "sonolbot.tools.task_commands", *args]
         try:
@@ -71,16 +82,32 @@ class DaemonServiceTaskMixin:
             self.logger.warning(f"task command json parse failed args={args}: {exc}")
             return None
 
+    @staticmethod
+    def _task_row_epoch(row: dict[str, Any], field: str) -> int | None:
+        value = row.get(field)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return None
+
     def _task_row_recency_epoch(self, row: dict[str, Any]) -> float:
-        latest_change = str(row.get("latest_change") or "").strip()
-        if latest_change:
-            ts_prefix = latest_change.split("|", 1)[0].strip()
-            parsed = self._parse_datetime_epoch(ts_prefix)
-            if parsed > 0:
-                return parsed
-        ts = self._parse_datetime_epoch(str(row.get("timestamp") or ""))
-        if ts > 0:
-            return ts
+        ts_epoch = self._task_row_epoch(row, "ts_epoch")
+        if ts_epoch is not None:
+            # Rows from task_commands carry epochs computed once at write time.
+            latest_change_epoch = self._task_row_epoch(row, "latest_change_epoch") or 0
+            if latest_change_epoch > 0:
+                return float(latest_change_epoch)
+            if ts_epoch > 0:
+                return float(ts_epoch)
+        else:
+            latest_change = str(row.get("latest_change") or "").strip()
+            if latest_change:
+                ts_prefix = latest_change.split("|", 1)[0].strip()
+                parsed = self._parse_datetime_epoch(ts_prefix)
+                if parsed > 0:
+                    return parsed
+            ts = self._parse_datetime_epoch(str(row.get("timestamp") or ""))
+            if ts > 0:
+                return ts
         task_dir = str(row.get("task_dir") or "").strip()
         if not task_dir:
             return 0.0
@@ -105,6 +132,17 @@ class DaemonServiceTaskMixin:
         return f"tasks/thread_{normalized_thread_id}/{TASK_AGENTS_FILENAME}"
 
     def _task_row_recent_timestamp(self, row: dict[str, Any]) -> str:
+        if self._task_row_epoch(row, "ts_epoch") is not None:
+            latest_change = str(row.get("latest_change") or "").strip()
+            if latest_change and (self._task_row_epoch(row, "latest_change_epoch") or 0) > 0:
+                return latest_change.split("|", 1)[0].strip()
+            title_updated = str(row.get("title_updated_at") or "").strip()
+            if title_updated and (self._task_row_epoch(row, "title_updated_epoch") or 0) > 0:
+                return title_updated
+            ts = str(row.get("timestamp") or "").strip()
+            if ts and (self._task_row_epoch(row, "ts_epoch") or 0) > 0:
+                return ts
+            return ""
         latest_change = str(row.get("latest_change") or "").strip()
         if latest_change:
             prefix = latest_change.split("|", 1)[0].strip()
@@ -118,7 +156,6 @@ class DaemonServiceTaskMixin:
             return ts
         return ""
 
-    @staticmethod
     def _task_root_for_chat(self, chat_id: int) -> Path:
         if not self.tasks_partition_by_chat:
             self.tasks_dir.mkdir(parents=True, exist_ok=True)
@@ -173,17 +210,18 @@ class DaemonServiceTaskMixin:
         lead_instruction = query_tokens[-1]
         task_id = f"thread_{thread_id}"
         try:
-            session = task_skill.init_task_session(
-                tasks_dir=str(task_root),
-                task_id=task_id,
-                thread_id=thread_id,
-                instruction=lead_instruction,
-                message_id=max(source_message_ids) if source_message_ids else 0,
-                source_message_ids=sorted(source_message_ids),
-                chat_id=chat_id,
-                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                logs_dir=str(self.logs_dir),
-            )
+            with self._task_write_guard():
+                session = task_skill.init_task_session(
+                    tasks_dir=str(task_root),
+                    task_id=task_id,
+                    thread_id=thread_id,
+                    instruction=lead_instruction,
+                    message_id=max(source_message_ids) if source_message_ids else 0,
+                    source_message_ids=sorted(source_message_ids),
+                    chat_id=chat_id,
+                    timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    logs_dir=str(self.logs_dir),
+                )
             task_dir = str(session.get("task_dir") or "").strip()
             if task_dir:
                 task_skill.read_instrunction_first(task_dir=task_dir, logs_dir=str(self.logs_dir))
@@ -250,18 +288,19 @@ class DaemonServiceTaskMixin:
 
         for task_id in sorted(normalized_task_ids):
             try:
-                task_skill.record_task_change(
-                    tasks_dir=str(task_root),
-                    task_id=task_id,
-                    thread_id=(task_id[len("thread_") :] if task_id.startswith("thread_") else ""),
-                    message_id=(max(message_ids) if message_ids else 0),
-                    source_message_ids=sorted(int(v) for v in message_ids if int(v) > 0),
-                    change_note=note,
-                    result_summary=summary or "( ؽƮ )",
-                    sent_files=[],
-                    timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    logs_dir=str(self.logs_dir),
-                )
+                with self._task_write_guard():
+                    task_skill.record_task_change(
+                        tasks_dir=str(task_root),
+                        task_id=task_id,
+                        thread_id=(task_id[len("thread_") :] if task_id.startswith("thread_") else ""),
+                        message_id=(max(message_ids) if message_ids else 0),
+                        source_message_ids=sorted(int(v) for v in message_ids if int(v) > 0),
+                        change_note=note,
+                        result_summary=summary or "( ؽƮ )",
+                        sent_files=[],
+                        timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        logs_dir=str(self.logs_dir),
+                    )
             except Exception as exc:
                 self.logger.warning(f"task record failed chat_id={chat_id} task_id={task_id}: {exc}")
 
@@ -480,6 +519,94 @@ class DaemonServiceTaskMixin:
         *,
         parse_mode: str | None = "HTML",
         request_max_attempts: int = 1,
+    ) -> bool:
+        if not bool(getattr(self, "task_cards_batch_enabled", False)):
+            return self._send_task_cards_individually(
+                chat_id=chat_id,
+                rows=rows,
+                header_text=header_text,
+                footer_text=footer_text,
+                parse_mode=parse_mode,
+                request_max_attempts=request_max_attempts,
+            )
+        sent = False
+        for text, inline_keyboard_rows in self._pack_task_cards(rows, header_text=header_text, footer_text=footer_text):
+            delivered = self._enqueue_telegram_text(
+                chat_id,
+                text,
+                inline_keyboard_rows=inline_keyboard_rows or None,
+                parse_mode=parse_mode,
+            ) or self._telegram_send_text(
+                chat_id=chat_id,
+                text=text,
+                keyboard_rows=None,
+                inline_keyboard_rows=inline_keyboard_rows or None,
+                request_max_attempts=request_max_attempts,
+                parse_mode=parse_mode,
+            )
+            sent = bool(sent or delivered)
+        return sent
+
+    def _pack_task_cards(
+        self,
+        rows: list[dict[str, Any]],
+        *,
+        header_text: str = "",
+        footer_text: str = "",
+    ) -> list[tuple[str, list[list[dict[str, str]]]]]:
+        """
+        Pack header, task cards and footer into as few HTML messages as fit
+        TASK_CARDS_MESSAGE_MAX_CHARS / TASK_CARDS_MAX_PER_MESSAGE, each with one
+        combined inline keyboard selecting the cards it contains.
+        """
+        messages: list[tuple[str, list[list[dict[str, str]]]]] = []
+        parts: list[str] = [header_text] if header_text else []
+        buttons: list[dict[str, str]] = []
+
+        def flush() -> None:
+            if not parts:
+                return
+            keyboard = [
+                buttons[i : i + TASK_CARDS_BUTTONS_PER_ROW] for i in range(0, len(buttons), TASK_CARDS_BUTTONS_PER_ROW)
+            ]
+            messages.append(("\n\n".join(parts), keyboard))
+            parts.clear()
+            buttons.clear()
+
+        for idx, row in enumerate(rows, start=1):
+            row_task_id = _service_utils.task_row_id(row)
+            if not row_task_id:
+                continue
+            card_text = self._render_task_item_card_text(idx=idx, row=row)
+            if buttons and (
+                len(buttons) >= TASK_CARDS_MAX_PER_MESSAGE
+                or len("\n\n".join([*parts, card_text])) > TASK_CARDS_MESSAGE_MAX_CHARS
+            ):
+                flush()
+            parts.append(card_text)
+            buttons.append(
+                {
+                    "text": TASK_CARD_SELECT_BUTTON_LABEL.format(idx=idx),
+                    "callback_data": f"{INLINE_TASK_SELECT_CALLBACK_PREFIX}{row_task_id}",
+                }
+            )
+        if footer_text:
+            footer_html = self._escape_telegram_html(footer_text)
+            if parts and len("\n\n".join([*parts, footer_html])) > TASK_CARDS_MESSAGE_MAX_CHARS:
+                flush()
+            parts.append(footer_html)
+        flush()
+        return messages
+
+    def _send_task_cards_individually(
+        self,
+        chat_id: int,
+        rows: list[dict[str, Any]],
+        header_text: str = "",
+        footer_text: str = "",
+        *,
+        parse_mode: str | None = "HTML",
+        request_max_attempts: int = 1,
     ) -> bool:
         sent = False
         if header_text:
@@ -1049,11 +1176,12 @@ class DaemonServiceTaskMixin:
         normalized_thread_id = _service_utils.compact_prompt_text(thread_id, max_len=200)
         if not normalized_task_id or not normalized_thread_id:
             return
-        mapping = self._load_legacy_task_thread_map(chat_id)
-        if mapping.get(normalized_task_id) == normalized_thread_id:
-            return
-        mapping[normalized_task_id] = normalized_thread_id
-        self._save_legacy_task_thread_map(chat_id, mapping)
+        with self._task_write_guard():
+            mapping = self._load_legacy_task_thread_map(chat_id)
+            if mapping.get(normalized_task_id) == normalized_thread_id:
+                return
+            mapping[normalized_task_id] = normalized_thread_id
+            self._save_legacy_task_thread_map(chat_id, mapping)
 
 
 
@@ -9,6 +9,14 @@ class DaemonServiceTelegramRuntime:
         self.service = service
         self.telegram_runtime: dict[str, object] | None = None
         self.telegram_skill: object | None = None
+        self.pending_snapshot_version: int | None = None
+        self.pending_snapshot: list[dict[str, object]] = []
+        self.update_receiver: Any | None = None
+        self.last_store_maintenance_at: float = 0.0
+        self.outbox_worker: Any | None = None
+        # Live progress messages keyed by "<chat_id>:<turn_id>": {"message_id", "text"}.
+        self.progress_messages: dict[str, dict[str, Any]] = {}
+        self.progress_lock = threading.Lock()
 
 
 class DaemonServiceTelegramMixin:
@@ -65,6 +73,406 @@ class DaemonServiceTelegramMixin:
         runtime.telegram_skill = skill
         return runtime_data, skill
 
+    def _active_telegram_receiver(self) -> Any | None:
+        runtime = self._get_telegram_runtime()
+        if runtime is None or runtime.update_receiver is None:
+            return None
+        receiver = runtime.update_receiver
+        try:
+            return receiver if receiver.is_alive() else None
+        except Exception:
+            return None
+
+    def _start_telegram_receiver(self) -> bool:
+        telegram_runtime = self._get_telegram_runtime()
+        if telegram_runtime is None or not bool(getattr(self, "telegram_receiver_enabled", False)):
+            return False
+        if self._active_telegram_receiver() is not None:
+            return True
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if runtime is None or telegram is None or not hasattr(telegram, "TelegramUpdateReceiver"):
+            return False
+        try:
+            try:
+                receiver = telegram.TelegramUpdateReceiver(
+                    runtime,
+                    str(self.store_file),
+                    poll_timeout_sec=int(self.telegram_receiver_poll_timeout_sec),
+                    on_messages=lambda: self._wake_main_loop("telegram"),
+                )
+            except TypeError:
+                receiver = telegram.TelegramUpdateReceiver(
+                    runtime,
+                    str(self.store_file),
+                    poll_timeout_sec=int(self.telegram_receiver_poll_timeout_sec),
+                )
+            receiver.start()
+        except Exception as exc:
+            self.logger.warning(f"telegram receiver start failed: {exc}")
+            return False
+        telegram_runtime.update_receiver = receiver
+        self.logger.info(f"telegram receiver started poll_timeout={receiver.poll_timeout_sec}s")
+        return True
+
+    def _stop_telegram_receiver(self) -> None:
+        telegram_runtime = self._get_telegram_runtime()
+        if telegram_runtime is None or telegram_runtime.update_receiver is None:
+            return
+        receiver = telegram_runtime.update_receiver
+        telegram_runtime.update_receiver = None
+        try:
+            receiver.stop(timeout=2.0)
+        except Exception as exc:
+            self.logger.warning(f"telegram receiver stop failed: {exc}")
+
+    def _get_outbox_worker(self) -> Any | None:
+        telegram_runtime = self._get_telegram_runtime()
+        if telegram_runtime is None or not bool(getattr(self, "telegram_outbox_enabled", False)):
+            return None
+        if telegram_runtime.outbox_worker is not None:
+            return telegram_runtime.outbox_worker
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if runtime is None or telegram is None or not hasattr(telegram, "TelegramOutboxWorker"):
+            return None
+        try:
+            worker = telegram.TelegramOutboxWorker(
+                telegram.TelegramOutbox(self.telegram_outbox_file),
+                self._deliver_outbox_item,
+                runtime,
+                max_attempts=int(self.telegram_outbox_max_attempts),
+                retry_delay_sec=float(self.fallback_send_retry_delay_sec),
+                retry_backoff=float(self.fallback_send_retry_backoff),
+                on_failed=self._on_outbox_item_failed,
+            )
+        except Exception as exc:
+            self.logger.warning(f"telegram outbox init failed: {exc}")
+            return None
+        telegram_runtime.outbox_worker = worker
+        return worker
+
+    def _start_outbox_worker(self) -> bool:
+        worker = self._get_outbox_worker()
+        if worker is None:
+            return False
+        try:
+            worker.start()
+        except Exception as exc:
+            self.logger.warning(f"telegram outbox worker start failed: {exc}")
+            return False
+        self.logger.info(f"telegram outbox worker started file={self.telegram_outbox_file}")
+        return True
+
+    def _stop_outbox_worker(self) -> None:
+        telegram_runtime = self._get_telegram_runtime()
+        if telegram_runtime is None or telegram_runtime.outbox_worker is None:
+            return
+        try:
+            telegram_runtime.outbox_worker.stop(timeout=5.0)
+        except Exception as exc:
+            self.logger.warning(f"telegram outbox worker stop failed: {exc}")
+
+    def _flush_outbox_inline(self) -> None:
+        """Deliver due outbox entries on the caller thread when no worker thread runs (drain mode)."""
+        worker = self._get_outbox_worker()
+        if worker is None or worker.is_alive():
+            return
+        try:
+            worker.run_once()
+        except Exception as exc:
+            self.logger.warning(f"telegram outbox flush failed: {exc}")
+
+    def _outbox_backlog(self) -> int:
+        worker = self._get_outbox_worker()
+        if worker is None:
+            return 0
+        try:
+            return int(worker.outbox.backlog())
+        except Exception:
+            return 0
+
+    def _enqueue_telegram_text(
+        self,
+        chat_id: int,
+        text: str,
+        *,
+        idem_key: str | None = None,
+        reply_to_message_ids: list[int] | None = None,
+        keyboard_rows: list[list[str]] | None = None,
+        inline_keyboard_rows: list[list[dict[str, str]]] | None = None,
+        parse_mode: str | None = None,
+        progress_key: str | None = None,
+    ) -> bool:
+        """
+        Hand a message to the durable outbox. Returns False when the outbox is
+        unavailable so the caller can fall back to a direct send.
+        """
+        worker = self._get_outbox_worker()
+        if worker is None:
+            return False
+        payload = {
+            "kind": "text",
+            "text": str(text or ""),
+            "keyboard_rows": keyboard_rows or None,
+            "inline_keyboard_rows": inline_keyboard_rows or None,
+            "parse_mode": parse_mode,
+            "reply_to_message_ids": sorted(int(v) for v in (reply_to_message_ids or [])),
+        }
+        if progress_key:
+            # Delivered after the progress updates of this chat, so it retires the live message.
+            payload["progress_key"] = progress_key
+        try:
+            worker.outbox.enqueue(int(chat_id), payload, idem_key=idem_key)
+        except Exception as exc:
+            self.logger.warning(f"telegram outbox enqueue failed chat_id={chat_id}: {exc}")
+            return False
+        worker.notify()
+        return True
+
+    def _enqueue_telegram_progress(self, chat_id: int, progress_key: str, text: str | None) -> bool:
+        """Queue a live-progress update (latest wins), or its removal when `text` is None."""
+        worker = self._get_outbox_worker()
+        if worker is None:
+            return False
+        if text is None:
+            payload: dict[str, Any] = {"kind": "progress_clear", "progress_key": progress_key}
+            coalesce_key = None
+        else:
+            payload = {"kind": "progress", "progress_key": progress_key, "text": str(text)}
+            coalesce_key = f"progress:{progress_key}"
+        try:
+            worker.outbox.enqueue(int(chat_id), payload, coalesce_key=coalesce_key)
+        except Exception as exc:
+            self.logger.warning(f"telegram outbox enqueue failed chat_id={chat_id}: {exc}")
+            return False
+        worker.notify()
+        return True
+
+    def _telegram_upsert_progress(
+        self,
+        chat_id: int,
+        progress_key: str,
+        text: str,
+        telegram_runtime: dict[str, object] | None = None,
+    ) -> bool:
+        """Edit the turn's live progress message in place, sending it first if it does not exist yet."""
+        telegram_state = self._get_telegram_runtime()
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if telegram_state is None or runtime is None or telegram is None:
+            return False
+        runtime = telegram_runtime if telegram_runtime is not None else dict(runtime)
+        with telegram_state.progress_lock:
+            entry = dict(telegram_state.progress_messages.get(progress_key) or {})
+        if entry.get("text") == text:
+            return True
+        message_id = int(entry.get("message_id") or 0)
+        if message_id > 0:
+            if self._telegram_edit_message_text(
+                chat_id=chat_id,
+                message_id=message_id,
+                text=text,
+                telegram_runtime=runtime,
+            ) or self._telegram_error_is_not_modified(runtime):
+                with telegram_state.progress_lock:
+                    telegram_state.progress_messages[progress_key] = {"message_id": message_id, "text": text}
+                return True
+            last_err = runtime.get("_telegram_last_error")
+            if not isinstance(last_err, dict) or str(last_err.get("kind") or "") != "http":
+                return False
+            # The message is gone or no longer editable: post a fresh one.
+        sent = self._telegram_send_text(
+            chat_id=chat_id,
+            text=text,
+            request_max_attempts=1,
+            telegram_runtime=runtime,
+        )
+        if not sent:
+            return False
+        new_message_id = int(runtime.get("_telegram_last_sent_message_id") or 0)
+        with telegram_state.progress_lock:
+            if new_message_id > 0:
+                telegram_state.progress_messages[progress_key] = {"message_id": new_message_id, "text": text}
+            else:
+                telegram_state.progress_messages.pop(progress_key, None)
+        return True
+
+    def _telegram_finish_progress(
+        self,
+        chat_id: int,
+        progress_key: str,
+        final_text: str | None = None,
+        telegram_runtime: dict[str, object] | None = None,
+    ) -> bool:
+        """
+        Retire the turn's live progress message.
+
+        With DAEMON_APP_SERVER_PROGRESS_FINAL_MODE=edit and a `final_text` that
+        fits one message, the progress message is edited into the final answer
+        and True is returned. Otherwise it is deleted and False tells the caller
+        to send the final answer normally.
+        """
+        telegram_state = self._get_telegram_runtime()
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if telegram_state is None or runtime is None or telegram is None:
+            return False
+        with telegram_state.progress_lock:
+            entry = telegram_state.progress_messages.pop(progress_key, None)
+        message_id = int((entry or {}).get("message_id") or 0)
+        if message_id <= 0:
+            return False
+        runtime = telegram_runtime if telegram_runtime is not None else dict(runtime)
+        max_len = int(getattr(telegram, "MAX_TELEGRAM_TEXT_LEN", 4096))
+        text_length = getattr(telegram, "telegram_text_length", len)
+        if (
+            final_text
+            and str(getattr(self, "app_server_progress_final_mode", "")) == "edit"
+            and text_length(final_text) <= max_len
+            and self._telegram_edit_message_text(
+                chat_id=chat_id,
+                message_id=message_id,
+                text=final_text,
+                telegram_runtime=runtime,
+            )
+        ):
+            return True
+        if hasattr(telegram, "delete_message"):
+            try:
+                telegram.delete_message(runtime, chat_id=int(chat_id), message_id=message_id, request_max_attempts=1)
+            except Exception as exc:
+                self.logger.warning(f"progress message delete failed chat_id={chat_id}: {exc}")
+        return False
+
+    @staticmethod
+    def _telegram_error_is_not_modified(runtime: dict[str, object]) -> bool:
+        last_err = runtime.get("_telegram_last_error")
+        if not isinstance(last_err, dict) or str(last_err.get("kind") or "") != "http":
+            return False
+        return "message is not modified" in str(last_err.get("body") or "")
+
+    def _deliver_outbox_item(self, item: dict[str, Any]) -> bool:
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if runtime is None or telegram is None:
+            return False
+        chat_id = int(item["chat_id"])
+        payload = item.get("payload") or {}
+        kind = str(payload.get("kind") or "text")
+        text = str(payload.get("text") or "")
+        progress_key = str(payload.get("progress_key") or "")
+        if kind == "progress":
+            # Best effort: a newer update supersedes this one, so never hold the chat's queue for it.
+            if not self._telegram_upsert_progress(chat_id, progress_key, text, telegram_runtime=dict(runtime)):
+                self.logger.warning(f"progress update dropped chat_id={chat_id} key={progress_key}")
+            return True
+        if kind == "progress_clear":
+            self._telegram_finish_progress(chat_id, progress_key, telegram_runtime=dict(runtime))
+            return True
+        send_runtime = dict(runtime)
+        if progress_key and self._telegram_finish_progress(
+            chat_id, progress_key, final_text=text, telegram_runtime=dict(runtime)
+        ):
+            sent = True
+        else:
+            sent = self._telegram_send_text(
+                chat_id=chat_id,
+                text=text,
+                request_max_attempts=1,
+                keyboard_rows=payload.get("keyboard_rows") or None,
+                inline_keyboard_rows=payload.get("inline_keyboard_rows") or None,
+                parse_mode=payload.get("parse_mode") or None,
+                telegram_runtime=send_runtime,
+            )
+        if not sent:
+            last_error = send_runtime.get("_telegram_last_error")
+            if hasattr(telegram, "OutboxDeliveryRejected") and telegram.is_permanent_send_error(last_error):
+                # Resending cannot help (bot blocked, chat gone); fail now so the chat's queue moves on.
+                raise telegram.OutboxDeliveryRejected(
+                    f"status={last_error.get('status_code')} {str(last_error.get('body') or '')[:200]}"
+                )
+            return False
+        reply_to_message_ids = [int(v) for v in payload.get("reply_to_message_ids") or []]
+        if reply_to_message_ids:
+            try:
+                telegram.save_bot_response(
+                    store_path=str(self.store_file),
+                    chat_id=chat_id,
+                    text=text,
+                    reply_to_message_ids=reply_to_message_ids,
+                )
+            except Exception as exc:
+                self.logger.warning(f"failed to save bot response chat={chat_id}: {exc}")
+            self.logger.info(
+                f"Final reply delivered chat_id={chat_id} message_count={len(reply_to_message_ids)} "
+                f"attempts={int(item.get('attempts', 0)) + 1}"
+            )
+        return True
+
+    def _on_outbox_item_failed(self, item: dict[str, Any], error: str) -> None:
+        payload = item.get("payload") or {}
+        reply_to_message_ids = [int(v) for v in payload.get("reply_to_message_ids") or []]
+        if reply_to_message_ids:
+            self.logger.error(
+                f"Final reply undeliverable chat_id={item.get('chat_id')} "
+                f"message_ids={reply_to_message_ids} attempts={int(item.get('attempts', 0)) + 1} error={error}"
+            )
+        else:
+            self.logger.warning(f"telegram outbox entry dropped chat_id={item.get('chat_id')} error={error}")
+
+    def _run_quick_check(self) -> int:
+        """
+        Ingest new updates and report pending state.
+
+        Returns 0 (nothing pending), 1 (pending user messages) or 2 (error).
+        When the receiver thread is running it owns getUpdates, so this only
+        drains its queue instead of polling Telegram from the main loop.
+        """
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if runtime is None or telegram is None:
+            return 2
+        receiver = self._active_telegram_receiver()
+        if receiver is not None:
+            receiver.drain()
+        else:
+            try:
+                telegram.poll_store_and_get_pending(
+                    runtime=runtime,
+                    store_path=str(self.store_file),
+                    include_bot=False,
+                )
+            except Exception as exc:
+                self.logger.warning(f"telegram poll failed: {exc}")
+                return 2
+        return 1 if self._snapshot_pending_messages() else 0
+
+    def _run_store_maintenance(self, *, force: bool = False) -> None:
+        """Prune the message store on a slow tick instead of on every poll."""
+        telegram_runtime = self._get_telegram_runtime()
+        if telegram_runtime is None:
+            return
+        now = time.monotonic()
+        interval = max(60, int(getattr(self, "store_maintenance_interval_sec", DEFAULT_STORE_MAINTENANCE_INTERVAL_SEC)))
+        if not force and telegram_runtime.last_store_maintenance_at and (
+            now - telegram_runtime.last_store_maintenance_at < interval
+        ):
+            return
+        runtime, telegram = self._get_telegram_runtime_skill()
+        if runtime is None or telegram is None or not hasattr(telegram, "prune_message_store"):
+            return
+        telegram_runtime.last_store_maintenance_at = now
+        try:
+            result = telegram.prune_message_store(str(self.store_file), runtime=runtime)
+        except Exception as exc:
+            self.logger.warning(f"message store maintenance failed: {exc}")
+            return
+        if int(result.get("removed", 0) or 0) > 0:
+            self.logger.info(
+                f"message store pruned removed={result.get('removed')} remaining={result.get('remaining')}"
+            )
+        worker = self._get_outbox_worker()
+        if worker is not None:
+            try:
+                worker.outbox.prune()
+            except Exception as exc:
+                self.logger.warning(f"telegram outbox prune failed: {exc}")
+
     @staticmethod
     def _escape_telegram_html(value: object) -> str:
         return html.escape(str(value or "").strip(), quote=True)
@@ -251,10 +659,14 @@ class DaemonServiceTelegramMixin:
         keyboard_rows: list[list[str]] | None = None,
         inline_keyboard_rows: list[list[dict[str, str]]] | None = None,
         parse_mode: str | None = None,
+        telegram_runtime: dict[str, object] | None = None,
     ) -> bool:
         runtime, telegram = self._get_telegram_runtime_skill()
         if runtime is None or telegram is None:
             return False
+        # Chat lanes send concurrently: each call reads _telegram_last_error from
+        # its own copy, or the caller's when it needs the result afterwards.
+        runtime = telegram_runtime if telegram_runtime is not None else dict(runtime)
         effective_parse_mode = self._resolve_telegram_parse_mode(parse_mode)
         normalized_text = self._sanitize_telegram_text_for_parse_mode(text, effective_parse_mode)
         sent = self._telegram_send_text_once(
@@ -328,12 +740,14 @@ class DaemonServiceTelegramMixin:
         inline_keyboard_rows: list[list[dict[str, str]]] | None = None,
         request_max_attempts: int = 1,
         parse_mode: str | None = None,
+        telegram_runtime: dict[str, object] | None = None,
     ) -> bool:
         runtime, telegram = self._get_telegram_runtime_skill()
         if runtime is None or telegram is None:
             return False
         if not hasattr(telegram, "edit_message_text"):
             return False
+        runtime = telegram_runtime if telegram_runtime is not None else dict(runtime)
         effective_parse_mode = self._resolve_telegram_parse_mode(parse_mode)
         normalized_text = self._sanitize_telegram_text_for_parse_mode(text, effective_parse_mode)
         edited = self._telegram_send_text_once(
@@ -414,7 +828,9 @@ class DaemonServiceTelegramMixin:
             self.logger.warning(f"control response save failed chat_id={chat_id} msg_id={message_id}: {exc}")
 
         try:
-            changed = int(telegram.mark_messages_processed(str(self.store_file), [int(message_id)]))
+            changed = int(telegram.mark_messages_processed(
+                str(self.store_file), [int(message_id)], chat_id=int(chat_id)
+            ))
         except Exception as exc:
             self.logger.warning(f"control mark processed failed chat_id={chat_id} msg_id={message_id}: {exc}")
             changed = 0
@@ -284,4 +284,37 @@ def task_row_id(row: dict[str, Any]) -> str:
     return ""
 
 
+def app_notification_ids(message: dict[str, Any]) -> tuple[str, str]:
+    """(thread_id, turn_id) of a codex app-server notification; empty when absent."""
+    params = message.get("params")
+    if not isinstance(params, dict):
+        return "", ""
+    msg = params.get("msg") if isinstance(params.get("msg"), dict) else {}
+    turn = params.get("turn") if isinstance(params.get("turn"), dict) else {}
+    thread_id = str(params.get("threadId") or params.get("conversationId") or msg.get("thread_id") or "").strip()
+    turn_id = str(turn.get("id") or msg.get("turn_id") or params.get("id") or "").strip()
+    return thread_id, turn_id
+
+
+def app_turn_final_text(message: dict[str, Any] | None) -> str:
+    """Final agent text carried by a task_complete notification, else ""."""
+    if not isinstance(message, dict) or message.get("method") != "codex/event/task_complete":
+        return ""
+    params = message.get("params")
+    msg = params.get("msg") if isinstance(params, dict) else None
+    if not isinstance(msg, dict):
+        return ""
+    return str(msg.get("last_agent_message") or "").strip()
+
+
+def app_turn_finished(message: dict[str, Any], turn_id: str) -> bool:
+    """True for turn_id's task_complete with final text, or its turn/completed."""
+    method = str(message.get("method") or "")
+    if method not in {"codex/event/task_complete", "turn/completed"}:
+        return False
+    if app_notification_ids(message)[1] != turn_id:
+        return False
+    return method == "turn/completed" or bool(app_turn_final_text(message))
+
+
 __all__ = [name for name in globals() if not name.startswith("__")]
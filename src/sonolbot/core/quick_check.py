@@ -29,6 +29,7 @@ def main() -> int:
         store_path=str(store_path),
         include_bot=False,
     )
+    telegram.prune_message_store(str(store_path), runtime=runtime)
 
     print(f"[QUICK_CHECK] pending={len(pending)} store={store_path}")
     return 1 if pending else 0
@@ -40,6 +40,7 @@ _SKILLS_DIR = _skills_root()
 _TELEGRAM_SKILL_CACHE = None
 _TASK_SKILL_CACHE = None
 _DEFAULT_MAX_TELEGRAM_FILE_BYTES = 50 * 1024 * 1024
+_DEFAULT_ATTACHMENT_CACHE_MAX_BYTES = 512 * 1024 * 1024
 _DEFAULT_ALLOWED_SKILLS = ("sonolbot-telegram", "sonolbot-tasks")
 
 
@@ -122,6 +123,14 @@ def get_logs_dir() -> Path:
     return Path(val).resolve()
 
 
+def get_attachment_cache_dir() -> Path:
+    val = os.getenv("TELEGRAM_ATTACHMENT_CACHE_DIR")
+    if not val:
+        tasks_dir = os.getenv("TELEGRAM_TASKS_DIR") or str(get_tasks_dir())
+        val = str(Path(tasks_dir) / ".file_cache")
+    return Path(val).resolve()
+
+
 def build_telegram_runtime() -> dict[str, Any]:
     mod = get_telegram_skill()
     token = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
@@ -139,6 +148,24 @@ def build_telegram_runtime() -> dict[str, Any]:
     except ValueError:
         max_file_bytes = _DEFAULT_MAX_TELEGRAM_FILE_BYTES
     max_file_bytes = max(1, max_file_bytes)
+    try:
+        download_concurrency = int(os.getenv("TELEGRAM_DOWNLOAD_CONCURRENCY", "4").strip() or "4")
+    except ValueError:
+        download_concurrency = 4
+    try:
+        upload_concurrency = int(os.getenv("TELEGRAM_UPLOAD_CONCURRENCY", "3").strip() or "3")
+    except ValueError:
+        upload_concurrency = 3
+    try:
+        download_timeout = float(os.getenv("TELEGRAM_DOWNLOAD_TIMEOUT_SEC", "120").strip() or "120")
+    except ValueError:
+        download_timeout = 120.0
+    try:
+        attachment_cache_max_bytes = int(
+            os.getenv("TELEGRAM_ATTACHMENT_CACHE_MAX_BYTES", "").strip() or _DEFAULT_ATTACHMENT_CACHE_MAX_BYTES
+        )
+    except ValueError:
+        attachment_cache_max_bytes = _DEFAULT_ATTACHMENT_CACHE_MAX_BYTES
 
     work_dir = os.getenv("WORK_DIR") or str(_BASE_DIR)
     tasks_dir = os.getenv("TELEGRAM_TASKS_DIR") or str(get_tasks_dir())
@@ -157,5 +184,10 @@ def build_telegram_runtime() -> dict[str, Any]:
             "polling_timeout_sec": polling_timeout,
             "message_retention_days": message_retention_days,
             "max_telegram_file_bytes": max_file_bytes,
+            "download_concurrency": download_concurrency,
+            "download_timeout_sec": download_timeout,
+            "upload_concurrency": upload_concurrency,
+            "attachment_cache_dir": str(get_attachment_cache_dir()),
+            "attachment_cache_max_bytes": attachment_cache_max_bytes,
         }
     )
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Split telegram_messages.json into per-chat store shards.
+
+This script supports dry-run and apply modes.
+- dry-run (default): prints how many records each chat shard would receive
+- apply: writes telegram_messages.shards/chat_<id>.json and offset.json
+
+The source file is kept as-is. Set TELEGRAM_MESSAGE_STORE_BACKEND=sharded
+afterwards so the daemon reads and writes the shards.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from sonolbot.core.skill_bridge import get_telegram_skill
+from sonolbot.runtime import project_root
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Split the Telegram message store into per-chat shards")
+    parser.add_argument(
+        "--store",
+        default=os.getenv("TELEGRAM_MESSAGE_STORE", str(project_root() / "telegram_messages.json")),
+        help="Single-file JSON message store",
+    )
+    parser.add_argument("--apply", action="store_true", help="Apply changes (default: dry-run)")
+    parser.add_argument("--force", action="store_true", help="Overwrite shards that were already migrated")
+    parser.add_argument("--json", action="store_true", help="JSON output")
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    store_path = Path(args.store).resolve()
+    if not store_path.is_file():
+        print(f"store not found: {store_path}")
+        return 1
+
+    telegram = get_telegram_skill()
+    summary = telegram.migrate_message_store_to_shards(str(store_path), apply=bool(args.apply), force=bool(args.force))
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 0
+
+    if summary.get("already_migrated") and not args.force:
+        print(f"already migrated: {summary['shard_dir']} (use --force to overwrite)")
+        return 0
+    mode = "APPLY" if args.apply else "DRY-RUN"
+    chats = summary.get("chats", {})
+    print(
+        f"mode={mode} source={summary['source']} shard_dir={summary['shard_dir']} "
+        f"messages={summary.get('messages', 0)} chats={len(chats)} last_update_id={summary.get('last_update_id', 0)}"
+    )
+    for chat_id, count in sorted(chats.items(), key=lambda item: item[1], reverse=True):
+        print(f"- chat_{chat_id}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
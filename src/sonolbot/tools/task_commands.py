@@ -79,6 +79,15 @@ def _parse_datetime_epoch(value: Any) -> float:
     return 0.0
 
 
+def _entry_epoch(entry: dict[str, Any], field: str = "timestamp", epoch_field: str = "ts_epoch") -> int:
+    value = entry.get(epoch_field)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    epoch = int(_parse_datetime_epoch(entry.get(field)))
+    entry[epoch_field] = epoch
+    return epoch
+
+
 def _sanitize_thread_id(value: Any) -> str:
     text = str(value or "").strip()
     if not text:
@@ -138,8 +147,8 @@ def _task_id_from_entry(entry: dict[str, Any]) -> str:
     return ""
 
 
-def _entry_sort_key(item: dict[str, Any]) -> tuple[float, int, str]:
-    ts = _parse_datetime_epoch(item.get("timestamp"))
+def _entry_sort_key(item: dict[str, Any]) -> tuple[int, int, str]:
+    ts = _entry_epoch(item)
     latest_message_id = _safe_int(item.get("latest_message_id"), _safe_int(item.get("message_id"), 0))
     task_id = str(item.get("task_id") or "")
     return (ts, latest_message_id, task_id)
@@ -211,19 +220,20 @@ def _extract_result_line(task_dir: Path) -> str:
     return ""
 
 
-def _extract_latest_change(task_dir: Path) -> str:
+def _extract_latest_change(task_dir: Path) -> tuple[str, int]:
     payload = _read_json(task_dir / TASK_META_FILENAME, {})
     notes = payload.get("change_notes", [])
     if not isinstance(notes, list) or not notes:
-        return ""
+        return "", 0
     last = notes[-1]
     if not isinstance(last, dict):
-        return ""
+        return "", 0
     ts = str(last.get("timestamp") or "").strip()
     note = str(last.get("note") or "").strip()
+    ts_epoch = _entry_epoch(last)
     if ts and note:
-        return f"{ts} | {note}"
-    return note or ts
+        return f"{ts} | {note}", ts_epoch
+    return note or ts, ts_epoch
 
 
 def _extract_related_ids(task_dir: Path) -> list[str]:
@@ -362,7 +372,7 @@ def _build_task_item(
     result_summary = str(entry.get("result_summary") or "").strip()
     result_line = _extract_result_line(task_dir)
     related_ids = _extract_related_ids(task_dir)
-    latest_change = _extract_latest_change(task_dir)
+    latest_change, latest_change_epoch = _extract_latest_change(task_dir)
     codex_session = entry.get("codex_session") if isinstance(entry.get("codex_session"), dict) else {}
     work_status = _derive_work_status(result_summary, result_line, latest_change)
     ops_status = _derive_ops_status(result_summary, result_line, latest_change)
@@ -372,6 +382,11 @@ def _build_task_item(
     if title_state not in ("provisional", "final"):
         title_state = "provisional"
     title_updated_at = str(entry.get("title_updated_at") or "").strip() or str(entry.get("timestamp") or "").strip()
+    ts_epoch = _entry_epoch(dict(entry))
+    if str(entry.get("title_updated_at") or "").strip():
+        title_updated_epoch = _entry_epoch(dict(entry), field="title_updated_at", epoch_field="title_updated_epoch")
+    else:
+        title_updated_epoch = ts_epoch
 
     source_message_ids = entry.get("source_message_ids")
     if not isinstance(source_message_ids, list):
@@ -387,6 +402,7 @@ def _build_task_item(
         "task_dir": str(task_dir),
         "task_dir_name": task_dir.name,
         "timestamp": str(entry.get("timestamp") or "").strip(),
+        "ts_epoch": ts_epoch,
         "status": work_status,
         "work_status": work_status,
         "ops_status": ops_status,
@@ -398,12 +414,14 @@ def _build_task_item(
         "instruction_file": str(instruction_file) if instruction_file else "",
         "instruction_text": instruction_text,
         "latest_change": latest_change,
+        "latest_change_epoch": latest_change_epoch,
         "related_task_ids": related_ids,
         "codex_session": codex_session,
         "display_title": display_title,
         "display_subtitle": display_subtitle,
         "title_state": title_state,
         "title_updated_at": title_updated_at,
+        "title_updated_epoch": title_updated_epoch,
     }
 
 
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import sys
+import threading
+import types
+import unittest
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SRC_ROOT = PROJECT_ROOT / "src"
+for path in (PROJECT_ROOT, SRC_ROOT):
+    path_str = str(path)
+    if path_str not in sys.path:
+        sys.path.insert(0, path_str)
+
+
+def _ensure_fake_dotenv() -> None:
+    if "dotenv" in sys.modules:
+        return
+    fake = types.ModuleType("dotenv")
+
+    def _load_dotenv(*_args: object, **_kwargs: object) -> bool:
+        return False
+
+    fake.load_dotenv = _load_dotenv
+    sys.modules["dotenv"] = fake
+
+
+def _import_jsonrpc():
+    try:
+        from sonolbot.core.daemon import jsonrpc
+
+        return jsonrpc, None
+    except ModuleNotFoundError as exc:
+        if "dotenv" not in str(exc):
+            return None, exc
+        _ensure_fake_dotenv()
+        try:
+            from sonolbot.core.daemon import jsonrpc
+
+            return jsonrpc, None
+        except Exception as inner_exc:  # pragma: no cover
+            return None, inner_exc
+    except Exception as exc:  # pragma: no cover
+        return None, exc
+
+
+jsonrpc, _IMPORT_ERROR = _import_jsonrpc()
+
+if jsonrpc is None:
+
+    @unittest.skip("daemon jsonrpc dependency unavailable")
+    class TestJsonRpcClientDependency(unittest.TestCase):
+        def test_jsonrpc_import_dependency(self) -> None:
+            self.assertIsNone(_IMPORT_ERROR)
+
+else:
+
+    class TestJsonRpcClient(unittest.TestCase):
+        def setUp(self) -> None:
+            self.sent: list[dict[str, Any]] = []
+            self.send_ok = True
+            self.client = jsonrpc.JsonRpcClient(self._send, name="unit")
+
+        def _send(self, payload: dict[str, Any]) -> bool:
+            self.sent.append(payload)
+            return self.send_ok
+
+        def test_reply_resolves_future_by_id(self) -> None:
+            first = self.client.request("thread/start", {"cwd": "/tmp"})
+            second = self.client.request("turn/start")
+
+            self.assertEqual([item["id"] for item in self.sent], [1, 2])
+            self.assertEqual(self.sent[0]["params"], {"cwd": "/tmp"})
+            self.assertNotIn("params", self.sent[1])
+            self.assertEqual(self.client.pending_count(), 2)
+
+            self.assertTrue(self.client.handle_message({"id": 2, "result": {"turn": {"id": "t2"}}}))
+            self.assertTrue(self.client.handle_message({"id": 1, "result": {"thread": {"id": "th1"}}}))
+
+            self.assertEqual(first.result(timeout=1), {"thread": {"id": "th1"}})
+            self.assertEqual(second.result(timeout=1), {"turn": {"id": "t2"}})
+            self.assertEqual(self.client.pending_count(), 0)
+            self.assertEqual(self.client.next_request_id, 3)
+
+        def test_error_reply_raises_from_call(self) -> None:
+            def _reply() -> None:
+                while not self.sent:
+                    threading.Event().wait(0.01)
+                self.client.handle_message({"id": self.sent[0]["id"], "error": {"code": -1, "message": "boom"}})
+
+            worker = threading.Thread(target=_reply, daemon=True)
+            worker.start()
+            with self.assertRaises(jsonrpc.JsonRpcError) as ctx:
+                self.client.call("turn/steer", timeout_sec=5.0)
+            worker.join(timeout=1)
+
+            self.assertEqual(ctx.exception.error, {"code": -1, "message": "boom"})
+            self.assertFalse(ctx.exception.timed_out)
+
+        def test_timeout_fails_request_and_forgets_id(self) -> None:
+            future = self.client.request("turn/start", timeout_sec=0.05)
+
+            with self.assertRaises(jsonrpc.JsonRpcError) as ctx:
+                future.result(timeout=2)
+
+            self.assertTrue(ctx.exception.timed_out)
+            self.assertEqual(self.client.pending_count(), 0)
+            # A late reply for the expired id is swallowed without effect.
+            self.assertTrue(self.client.handle_message({"id": 1, "result": {}}))
+
+        def test_send_failure_fails_immediately(self) -> None:
+            self.send_ok = False
+
+            future = self.client.request("turn/start", timeout_sec=5.0)
+
+            self.assertIsInstance(future.exception(timeout=1), jsonrpc.JsonRpcError)
+            self.assertEqual(self.client.pending_count(), 0)
+
+        def test_cancel_forgets_pending_request(self) -> None:
+            future = self.client.request("turn/start", timeout_sec=5.0)
+
+            self.assertTrue(future.cancel())
+
+            self.assertEqual(self.client.pending_count(), 0)
+            self.assertTrue(self.client.handle_message({"id": 1, "result": {}}))
+
+        def test_fail_all_releases_every_waiter(self) -> None:
+            futures: list[Future[Any]] = [self.client.request("turn/start") for _ in range(3)]
+
+            self.client.fail_all("app-server exited")
+
+            for future in futures:
+                error = future.exception(timeout=1)
+                self.assertIsInstance(error, jsonrpc.JsonRpcError)
+                self.assertIn("app-server exited", str(error))
+            self.assertEqual(self.client.pending_count(), 0)
+
+        def test_subscription_consumes_matching_notifications(self) -> None:
+            seen: list[dict[str, Any]] = []
+            subscription = self.client.subscribe(lambda message: seen.append(message) or True, methods={"turn/completed"})
+
+            consumed = self.client.handle_message({"method": "turn/completed", "params": {}})
+            skipped = self.client.handle_message({"method": "item/completed", "params": {}})
+            server_request = self.client.handle_message({"id": 9, "method": "item/commandExecution/requestApproval"})
+            subscription.unsubscribe()
+            after_unsubscribe = self.client.handle_message({"method": "turn/completed", "params": {}})
+
+            self.assertTrue(consumed)
+            self.assertFalse(skipped)
+            self.assertFalse(server_request)
+            self.assertFalse(after_unsubscribe)
+            self.assertEqual(len(seen), 1)
+
+        def test_collector_sees_notifications_buffered_before_wait(self) -> None:
+            collector = self.client.collect(predicate=lambda message: message["params"].get("threadId") == "th1")
+
+            self.assertTrue(self.client.handle_message({"method": "turn/completed", "params": {"threadId": "th1", "turnId": "t1"}}))
+            self.assertFalse(self.client.handle_message({"method": "turn/completed", "params": {"threadId": "th2"}}))
+
+            found = collector.wait_for(lambda message: message["params"].get("turnId") == "t1", timeout_sec=1.0)
+            missing = collector.wait_for(lambda message: message["params"].get("turnId") == "t9", timeout_sec=0.05)
+            collector.unsubscribe()
+
+            self.assertIsNotNone(found)
+            self.assertIsNone(missing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,12 @@
 ﻿from __future__ import annotations
 
 import json
+import logging
 import os
 import sys
 import tempfile
+import threading
+import time
 import types
 import unittest
 from pathlib import Path
@@ -83,7 +86,7 @@ else:
                 "queued_messages": [],
                 "active_message_ids": set(),
                 "active_task_ids": set(),
-                "delta_text": "",
+                "delta_buffer": None,
                 "final_text": "",
                 "last_agent_message_sent": "",
                 "last_agent_message_raw": "",
@@ -96,6 +99,17 @@ else:
         def _log(self, message: str) -> None:
             self._log_messages.append(message)
 
+        @staticmethod
+        def _dedupe_messages_by_message_id(messages: list[dict[str, object]]) -> list[dict[str, object]]:
+            seen: set[object] = set()
+            deduped: list[dict[str, object]] = []
+            for item in messages:
+                if item.get("message_id") in seen:
+                    continue
+                seen.add(item.get("message_id"))
+                deduped.append(item)
+            return deduped
+
 
     class TestDaemonServiceAppRuntimeInjection(unittest.TestCase):
         def test_init_app_runtime_loads_state(self) -> None:
@@ -172,3 +186,151 @@ else:
                         os.environ.pop("SONOLBOT_UNIT_TEST_ENV", None)
                     else:
                         os.environ["SONOLBOT_UNIT_TEST_ENV"] = original
+
+        def test_steer_batch_deadline_and_requeue(self) -> None:
+            with tempfile.TemporaryDirectory() as td:
+                root = Path(td)
+                service = _FakeServiceForAppRuntime(root)
+                service._init_app_runtime()
+                service.app_server_turn_timeout_sec = 600
+                service.chat_lease_heartbeat_sec = 30
+                service.app_server_forward_agent_message = True
+
+                state = service._get_chat_state(101)
+                state["active_turn_id"] = "turn-1"
+                state["last_turn_started_at"] = 1000.0
+                state["last_lease_heartbeat_at"] = 1000.0
+                state["steer_batch"] = [{"message_id": 2}, {"message_id": 3}]
+                state["steer_flush_at"] = 1000.8
+                state["queued_messages"] = [{"message_id": 1}, {"message_id": 2}]
+
+                self.assertAlmostEqual(service._app_next_deadline_in(now_epoch=1000.5), 0.3)
+
+                service._app_requeue_steer_batch(state)
+                self.assertEqual([item["message_id"] for item in state["queued_messages"]], [1, 2, 3])
+                self.assertEqual(state["steer_batch"], [])
+                self.assertAlmostEqual(service._app_next_deadline_in(now_epoch=1000.5), 29.5)
+
+
+
+    class TestDaemonChatWorkerPool(unittest.TestCase):
+        def _pool(self, max_workers: int, **kwargs: object):
+            from sonolbot.core.daemon.service_app import DaemonChatWorkerPool
+
+            pool = DaemonChatWorkerPool(max_workers, logging.getLogger("test-chat-workers"), **kwargs)
+            self.addCleanup(pool.stop)
+            return pool
+
+        def _wait_until(self, predicate, timeout_sec: float = 5.0) -> None:
+            deadline = time.time() + timeout_sec
+            while not predicate() and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(predicate())
+
+        def test_slow_chat_does_not_block_others_and_keeps_order(self) -> None:
+            done: list[str] = []
+            pool = self._pool(2, on_job_done=lambda: done.append("job"))
+            gate = threading.Event()
+            order: dict[int, list[object]] = {1: [], 2: []}
+
+            def _slow_job() -> None:
+                gate.wait(5.0)
+                order[1].append("slow")
+
+            def _failing_job() -> None:
+                raise RuntimeError("boom")
+
+            pool.submit(1, "slow", _slow_job)
+            for index in range(3):
+                pool.submit(1, "event", lambda index=index: order[1].append(index))
+            pool.submit(2, "event", _failing_job)
+            for index in range(3):
+                pool.submit(2, "event", lambda index=index: order[2].append(index))
+
+            self._wait_until(lambda: len(order[2]) == 3)
+            self.assertEqual(order[2], [0, 1, 2])
+            self.assertEqual(order[1], [])
+            self.assertTrue(pool.has_job(1, "event"))
+
+            gate.set()
+            self._wait_until(lambda: not pool.busy())
+            self.assertEqual(order[1], ["slow", 0, 1, 2])
+            self.assertFalse(pool.has_job(1, "event"))
+            self._wait_until(lambda: len(done) == 8)
+
+        def test_concurrency_is_capped(self) -> None:
+            pool = self._pool(2)
+            lock = threading.Lock()
+            counters = {"active": 0, "peak": 0}
+
+            def _job() -> None:
+                with lock:
+                    counters["active"] += 1
+                    counters["peak"] = max(counters["peak"], counters["active"])
+                time.sleep(0.05)
+                with lock:
+                    counters["active"] -= 1
+
+            for chat_id in range(6):
+                pool.submit(chat_id, "cycle", _job)
+            self._wait_until(lambda: not pool.busy())
+            self.assertEqual(counters["peak"], 2)
+
+        def test_stop_rejects_new_jobs(self) -> None:
+            pool = self._pool(1)
+            pool.stop()
+            self.assertFalse(pool.submit(1, "cycle", lambda: None))
+
+
+    class TestAgentDeltaBuffer(unittest.TestCase):
+        def test_append_tracks_length_and_bounded_tail(self) -> None:
+            from sonolbot.core.daemon.service_app import AgentDeltaBuffer
+
+            delta_buffer = AgentDeltaBuffer(tail_chars=8)
+            for chunk in ("Hello", ", ", "world", "!!"):
+                delta_buffer.append(chunk)
+
+            self.assertEqual(delta_buffer.length, 14)
+            self.assertEqual(delta_buffer.tail(), " world!!")
+            self.assertEqual(delta_buffer.tail(3), "d!!")
+            self.assertEqual(delta_buffer.tail(0), "")
+            self.assertEqual(vars(delta_buffer), {"tail_chars": 8, "length": 14, "_tail": " world!!"})
+
+        def test_streamed_deltas_keep_only_length_and_tail(self) -> None:
+            with tempfile.TemporaryDirectory() as td:
+                service = _FakeServiceForAppRuntime(Path(td))
+                service._init_app_runtime()
+                service.app_thread_to_chat["thread-1"] = 101
+                for chunk in ("part one ", "part two"):
+                    service._app_process_notification(
+                        {
+                            "method": "item/agentMessage/delta",
+                            "params": {"threadId": "thread-1", "itemId": "msg-1", "delta": chunk},
+                        }
+                    )
+                service._app_process_notification(
+                    {
+                        "method": "item/completed",
+                        "params": {"threadId": "thread-1", "item": {"id": "msg-1", "type": "agentMessage"}},
+                    }
+                )
+
+                state = service._get_chat_state(101)
+                self.assertEqual(state["delta_buffer"].length, len("part one part two"))
+                self.assertEqual(state["delta_buffer"].tail(), "part one part two")
+
+        def test_next_deadline_does_not_install_delta_buffer(self) -> None:
+            with tempfile.TemporaryDirectory() as td:
+                service = _FakeServiceForAppRuntime(Path(td))
+                service._init_app_runtime()
+                service.app_server_forward_agent_message = False
+                service.app_server_progress_interval_sec = 5.0
+                service.app_server_progress_edit_in_place = False
+                service.app_server_turn_timeout_sec = 600.0
+                service.chat_lease_heartbeat_sec = 30.0
+                state = service._get_chat_state(101)
+                state["active_turn_id"] = "turn-1"
+
+                service._app_chat_next_deadline(state)
+
+                self.assertIsNone(state.get("delta_buffer"))
@@ -335,3 +335,16 @@ else:
             self.assertIsNotNone(runtime)
             assert runtime is not None
             self.assertEqual(runtime.env.get("SONOLBOT_GUI_SESSION"), "0")
+
+        def test_wakeup_collects_reasons_and_stop_request_wakes_loop(self) -> None:
+            service = _FakeServiceForCoreRuntime(Path.cwd())
+            service._init_core_runtime()
+
+            self.assertEqual(service._wait_main_loop(0.01), set())
+
+            service._wake_main_loop("telegram")
+            service._wake_main_loop("app_server")
+            self.assertEqual(service._wait_main_loop(5.0), {"telegram", "app_server"})
+
+            service.stop_requested = True
+            self.assertEqual(service._wait_main_loop(5.0), {"shutdown"})
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import sys
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
 import types
@@ -84,3 +86,33 @@ else:
 
                 self.assertIs(service._get_rewriter_runtime(), runtime)
                 self.assertIs(service.rewriter_proc, runtime.rewriter_proc)
+
+        def test_concurrent_ensure_starts_rewriter_once(self) -> None:
+            with tempfile.TemporaryDirectory() as td:
+                service = _FakeServiceForRewriterRuntime(Path(td))
+                service._init_rewriter_runtime()
+                service.agent_rewriter_enabled = True
+                started: list[int] = []
+                running = threading.Event()
+                gate = threading.Barrier(4)
+
+                def fake_start() -> bool:
+                    started.append(1)
+                    time.sleep(0.05)
+                    running.set()
+                    return True
+
+                service._rewriter_is_running = running.is_set  # type: ignore[method-assign]
+                service._start_agent_rewriter = fake_start  # type: ignore[method-assign]
+
+                def lane() -> None:
+                    gate.wait()
+                    service._ensure_agent_rewriter()
+
+                threads = [threading.Thread(target=lane) for _ in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join(timeout=5.0)
+
+                self.assertEqual(len(started), 1)
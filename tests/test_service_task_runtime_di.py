@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import sys
+import tempfile
+import threading
+import time
 import types
 import unittest
 from pathlib import Path
@@ -111,3 +114,73 @@ else:
             self.assertEqual(call_count["count"], 1)
             self.assertIsInstance(first, dict)
             self.assertIs(first, second)
+
+        def test_task_cards_are_packed_with_combined_keyboard(self) -> None:
+            import sonolbot.core.daemon.service_task as service_task_module
+
+            class _CardService(_FakeServiceForTaskRuntime):
+                def _render_task_item_card_text(self, idx: int, row: dict) -> str:
+                    return f"<b>{idx}. {row['task_id']}</b>"
+
+                @staticmethod
+                def _escape_telegram_html(value: object) -> str:
+                    return str(value).replace("<", "&lt;")
+
+            service = _CardService()
+            rows = [{"task_id": f"thread_{n}"} for n in range(1, 13)]
+            messages = service._pack_task_cards(rows, header_text="<b>TASKS</b>", footer_text="pick <one>")
+
+            per_message = service_task_module.TASK_CARDS_MAX_PER_MESSAGE
+            self.assertEqual(len(messages), 2)
+            first_text, first_keyboard = messages[0]
+            self.assertTrue(first_text.startswith("<b>TASKS</b>"))
+            self.assertEqual(sum(len(row) for row in first_keyboard), per_message)
+            self.assertEqual(
+                first_keyboard[0][0]["callback_data"],
+                f"{service_task_module.INLINE_TASK_SELECT_CALLBACK_PREFIX}thread_1",
+            )
+            last_text, last_keyboard = messages[-1]
+            self.assertTrue(last_text.endswith("pick &lt;one>"))
+            self.assertEqual(sum(len(row) for row in last_keyboard), len(rows) - per_message)
+
+        def test_shared_task_root_serializes_record_writes(self) -> None:
+            index: dict[str, str] = {}
+            active = {"now": 0, "max": 0}
+
+            class _RacySkill:
+                def record_task_change(self, tasks_dir: str, task_id: str, **_kwargs: object) -> None:
+                    active["now"] += 1
+                    active["max"] = max(active["max"], active["now"])
+                    snapshot = dict(index)
+                    time.sleep(0.02)
+                    snapshot[task_id] = tasks_dir
+                    index.clear()
+                    index.update(snapshot)
+                    active["now"] -= 1
+
+            with tempfile.TemporaryDirectory() as tmp:
+                service = _FakeServiceForTaskRuntime()
+                service.tasks_partition_by_chat = False
+                service.tasks_dir = Path(tmp) / "tasks"
+                service.logs_dir = Path(tmp) / "logs"
+                service._init_task_runtime()
+                service._get_task_runtime().task_skill = _RacySkill()  # type: ignore[union-attr]
+
+                def record(chat_id: int) -> None:
+                    service._task_record_batch_change(
+                        chat_id=chat_id,
+                        task_ids={f"thread_{chat_id}"},
+                        message_ids={chat_id},
+                        status="completed",
+                        result_text="done",
+                        sent_ok=True,
+                    )
+
+                workers = [threading.Thread(target=record, args=(chat_id,)) for chat_id in (1, 2, 3)]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join(timeout=5)
+
+            self.assertEqual(sorted(index), ["thread_1", "thread_2", "thread_3"])
+            self.assertEqual(active["max"], 1)
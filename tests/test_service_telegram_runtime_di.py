@@ -130,3 +130,87 @@ else:
             self.assertEqual(counts["build"], 1)
             self.assertEqual(counts["skill"], 1)
             self.assertEqual(first, second)
+
+        def test_live_progress_is_edited_in_place_and_deleted(self) -> None:
+            calls: list[tuple[str, int]] = []
+
+            class _FakeTelegram:
+                MAX_TELEGRAM_TEXT_LEN = 4096
+
+                def send_text_raw(self, runtime, chat_id, text, request_max_attempts=None, parse_mode=None):
+                    calls.append(("send", chat_id))
+                    runtime["_telegram_last_sent_message_id"] = 77
+                    return True
+
+                def edit_message_text(self, runtime, chat_id, message_id, text, **_kwargs):
+                    calls.append(("edit", message_id))
+                    return True
+
+                def delete_message(self, runtime, chat_id, message_id, request_max_attempts=None):
+                    calls.append(("delete", message_id))
+                    return True
+
+            service = _FakeServiceForTelegramRuntime()
+            service.telegram_force_parse_mode = False
+            service.telegram_parse_fallback_raw_on_fail = False
+            service.app_server_progress_final_mode = "delete"
+            service._init_telegram_runtime()
+            runtime = service._get_telegram_runtime()
+            runtime.telegram_runtime = {}  # type: ignore[union-attr]
+            runtime.telegram_skill = _FakeTelegram()  # type: ignore[union-attr]
+
+            self.assertTrue(service._telegram_upsert_progress(5, "5:turn", "step 1"))
+            self.assertTrue(service._telegram_upsert_progress(5, "5:turn", "step 2"))
+            self.assertTrue(service._telegram_upsert_progress(5, "5:turn", "step 2"))
+            self.assertFalse(service._telegram_finish_progress(5, "5:turn", final_text="done"))
+            self.assertEqual(calls, [("send", 5), ("edit", 77), ("delete", 77)])
+            self.assertEqual(runtime.progress_messages, {})  # type: ignore[union-attr]
+
+        def test_send_text_does_not_write_shared_runtime(self) -> None:
+            class _FakeTelegram:
+                def send_text_raw(self, runtime, chat_id, text, request_max_attempts=None, parse_mode=None):
+                    runtime["_telegram_last_error"] = {"kind": "network", "chat_id": chat_id}
+                    return False
+
+            service = _FakeServiceForTelegramRuntime()
+            service.telegram_force_parse_mode = False
+            service.telegram_parse_fallback_raw_on_fail = False
+            service._init_telegram_runtime()
+            runtime = service._get_telegram_runtime()
+            runtime.telegram_runtime = {}  # type: ignore[union-attr]
+            runtime.telegram_skill = _FakeTelegram()  # type: ignore[union-attr]
+
+            self.assertFalse(service._telegram_send_text(chat_id=5, text="hi"))
+            self.assertEqual(runtime.telegram_runtime, {})  # type: ignore[union-attr]
+
+        def test_outbox_reply_rejected_by_telegram_raises_rejection(self) -> None:
+            class _Rejected(Exception):
+                pass
+
+            class _FakeTelegram:
+                OutboxDeliveryRejected = _Rejected
+
+                def __init__(self) -> None:
+                    self.status_code = 403
+
+                def send_text_raw(self, runtime, chat_id, text, request_max_attempts=None, parse_mode=None):
+                    runtime["_telegram_last_error"] = {"kind": "http", "status_code": self.status_code}
+                    return False
+
+                def is_permanent_send_error(self, error):
+                    return 400 <= int(error.get("status_code") or 0) < 500 and error.get("status_code") != 429
+
+            service = _FakeServiceForTelegramRuntime()
+            service.telegram_force_parse_mode = False
+            service.telegram_parse_fallback_raw_on_fail = False
+            service._init_telegram_runtime()
+            runtime = service._get_telegram_runtime()
+            runtime.telegram_runtime = {}  # type: ignore[union-attr]
+            fake = _FakeTelegram()
+            runtime.telegram_skill = fake  # type: ignore[union-attr]
+            item = {"id": 1, "chat_id": 5, "attempts": 0, "payload": {"text": "answer", "reply_to_message_ids": [10]}}
+
+            with self.assertRaises(_Rejected):
+                service._deliver_outbox_item(item)
+            fake.status_code = 502
+            self.assertFalse(service._deliver_outbox_item(item))
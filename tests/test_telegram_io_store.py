@@ -0,0 +1,1232 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TELEGRAM_IO_PATH = (
+    PROJECT_ROOT / "agent_runtime" / ".codex" / "skills" / "sonolbot-telegram" / "scripts" / "telegram_io.py"
+)
+
+
+def _load_telegram_io():
+    try:
+        spec = importlib.util.spec_from_file_location("sonolbot_telegram_io_store_test", TELEGRAM_IO_PATH)
+        if spec is None or spec.loader is None:
+            return None, RuntimeError(f"cannot load {TELEGRAM_IO_PATH}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module, None
+    except ModuleNotFoundError as exc:
+        return None, exc
+
+
+telegram_io, _IMPORT_ERROR = _load_telegram_io()
+
+
+def _user_message(message_id: int, chat_id: int = 111, text: str = "hello", **extra: object) -> dict[str, object]:
+    msg: dict[str, object] = {
+        "message_id": message_id,
+        "type": "user",
+        "chat_id": chat_id,
+        "text": text,
+        "files": [],
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "processed": False,
+    }
+    msg.update(extra)
+    return msg
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestMessageStoreBackends(unittest.TestCase):
+    def setUp(self) -> None:
+        self._env = os.environ.copy()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self) -> None:
+        os.environ.clear()
+        os.environ.update(self._env)
+        self._tmp.cleanup()
+
+    def _exercise_store(self, store_path: str, ordered: bool = True) -> None:
+        result = telegram_io.append_messages_to_store(
+            store_path,
+            [_user_message(1), _user_message(2, chat_id=222)],
+            10,
+        )
+        self.assertEqual([m["message_id"] for m in result["messages"]], [1, 2])
+        self.assertEqual(result["last_update_id"], 10)
+
+        again = telegram_io.append_messages_to_store(store_path, [_user_message(1)], 5)
+        self.assertEqual(again["messages"], [])
+        self.assertEqual(again["last_update_id"], 10)
+
+        pending = telegram_io.get_pending_messages(store_path)
+        self.assertEqual([m["message_id"] for m in pending], [1, 2])
+
+        self.assertEqual(telegram_io.mark_messages_processed(store_path, [1]), 1)
+        self.assertEqual(telegram_io.mark_messages_processed(store_path, 1), 0)
+        telegram_io.save_bot_response(store_path, chat_id=111, text="done", reply_to_message_ids=1)
+
+        pending = telegram_io.get_pending_messages(store_path)
+        self.assertEqual([m["message_id"] for m in pending], [2])
+
+        store = telegram_io.load_message_store(store_path)
+        self.assertEqual(store["last_update_id"], 10)
+        self.assertEqual(len(store["messages"]), 3)
+        if ordered:
+            self.assertTrue(store["messages"][0]["processed"])
+            self.assertEqual(store["messages"][2]["type"], "bot")
+        else:
+            # Shards merge by timestamp only; same-second records have no global order.
+            by_type = sorted((m["type"], m["message_id"], m["processed"]) for m in store["messages"])
+            self.assertEqual([(t, p) for t, _, p in by_type], [("bot", True), ("user", True), ("user", False)])
+
+    def test_json_backend_default(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        store_path = str(self.root / "telegram_messages.json")
+        self.assertEqual(telegram_io.open_message_store(store_path).backend, "json")
+        self._exercise_store(store_path)
+        self.assertFalse((self.root / "telegram_messages.sqlite3").exists())
+
+    def test_sqlite_backend_via_env(self) -> None:
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "sqlite"
+        store_path = str(self.root / "telegram_messages.json")
+        self.assertEqual(telegram_io.open_message_store(store_path).backend, "sqlite")
+        self._exercise_store(store_path)
+        self.assertTrue((self.root / "telegram_messages.sqlite3").exists())
+
+    def test_sqlite_backend_via_suffix(self) -> None:
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "json"
+        self._exercise_store(str(self.root / "telegram_messages.sqlite3"))
+
+    def test_sqlite_imports_legacy_json_once(self) -> None:
+        json_path = self.root / "telegram_messages.json"
+        legacy = {
+            "messages": [_user_message(7), _user_message(8, processed=True)],
+            "last_update_id": 42,
+        }
+        json_path.write_text(json.dumps(legacy), encoding="utf-8")
+
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "sqlite"
+        store = telegram_io.load_message_store(str(json_path))
+        self.assertEqual([m["message_id"] for m in store["messages"]], [7, 8])
+        self.assertEqual(store["last_update_id"], 42)
+        self.assertEqual([m["message_id"] for m in telegram_io.get_pending_messages(str(json_path))], [7])
+
+        sqlite_path = str(self.root / "telegram_messages.sqlite3")
+        self.assertEqual(telegram_io.import_json_message_store(str(json_path), sqlite_path), 0)
+
+    def test_sqlite_append_prunes_expired_rows(self) -> None:
+        store = telegram_io.open_message_store(str(self.root / "store.sqlite3"))
+        old = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        store.append([_user_message(1, timestamp=old)], 1)
+        result = store.append([_user_message(2)], 2, retention_days=7)
+        self.assertEqual(result["removed"], 1)
+        self.assertEqual(result["remaining"], 1)
+        self.assertEqual(store.last_update_id(), 2)
+
+    def _exercise_prune(self, store_path: str) -> None:
+        old = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        telegram_io.append_messages_to_store(
+            store_path,
+            [_user_message(2), _user_message(1, timestamp=old), _user_message(3, timestamp="")],
+            3,
+        )
+        result = telegram_io.prune_message_store(store_path, retention_days=7)
+        self.assertEqual(result["removed"], 1)
+        stored = telegram_io.load_message_store(store_path)["messages"]
+        self.assertEqual(sorted(m["message_id"] for m in stored), [2, 3])
+        self.assertEqual(telegram_io.prune_message_store(store_path, retention_days=7), {"removed": 0, "remaining": None})
+        self.assertEqual(telegram_io.open_message_store(store_path).last_update_id(), 3)
+
+    def test_json_prune_keeps_epoch_order(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        store_path = str(self.root / "telegram_messages.json")
+        self._exercise_prune(store_path)
+        telegram_io.append_messages_to_store(store_path, [_user_message(4, timestamp="2001-01-01 00:00:00")], 4)
+        stored = telegram_io.load_message_store(store_path)["messages"]
+        self.assertEqual([m["message_id"] for m in stored], [3, 4, 2])
+
+    def test_sqlite_prune(self) -> None:
+        self._exercise_prune(str(self.root / "store.sqlite3"))
+
+    def _exercise_pending_version(self, store_path: str) -> None:
+        v0 = telegram_io.pending_version(store_path)
+        telegram_io.append_messages_to_store(store_path, [_user_message(1)], 1)
+        v1 = telegram_io.pending_version(store_path)
+        self.assertNotEqual(v0, v1)
+
+        telegram_io.append_messages_to_store(store_path, [], 2)
+        telegram_io.save_bot_response(store_path, chat_id=111, text="ack", reply_to_message_ids=1)
+        self.assertEqual(telegram_io.pending_version(store_path), v1)
+
+        telegram_io.mark_messages_processed(store_path, 1)
+        self.assertNotEqual(telegram_io.pending_version(store_path), v1)
+        self.assertEqual(telegram_io.get_pending_messages(store_path), [])
+
+    def test_json_pending_version(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        self._exercise_pending_version(str(self.root / "telegram_messages.json"))
+
+    def test_sqlite_pending_version(self) -> None:
+        self._exercise_pending_version(str(self.root / "store.sqlite3"))
+
+    def test_json_pending_index_rebuilt_after_external_write(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        json_path = self.root / "telegram_messages.json"
+        telegram_io.append_messages_to_store(str(json_path), [_user_message(1)], 1)
+        before = telegram_io.pending_version(str(json_path))
+
+        data = json.loads(json_path.read_text(encoding="utf-8"))
+        data["messages"].append(_user_message(2))
+        json_path.write_text(json.dumps(data), encoding="utf-8")
+
+        pending = telegram_io.get_pending_messages(str(json_path))
+        self.assertEqual([m["message_id"] for m in pending], [1, 2])
+        self.assertNotEqual(telegram_io.pending_version(str(json_path)), before)
+
+    def test_json_pending_version_survives_lost_sidecar(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        json_path = self.root / "telegram_messages.json"
+        sidecar = json_path.with_name(f"{json_path.name}.pending.json")
+        seen = []
+        for message_id in (1, 2, 3):
+            telegram_io.append_messages_to_store(str(json_path), [_user_message(message_id)], message_id)
+            seen.append(telegram_io.pending_version(str(json_path)))
+
+        sidecar.unlink()
+        seen.append(telegram_io.pending_version(str(json_path)))
+        sidecar.write_text("{not json", encoding="utf-8")
+        telegram_io.append_messages_to_store(str(json_path), [_user_message(4)], 4)
+        seen.append(telegram_io.pending_version(str(json_path)))
+
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def _exercise_messages_for_chat(self, store_path: str) -> None:
+        now = datetime.now()
+
+        def ts(hours_ago: int) -> str:
+            return (now - timedelta(hours=hours_ago)).strftime("%Y-%m-%d %H:%M:%S")
+
+        telegram_io.append_messages_to_store(
+            store_path,
+            [
+                _user_message(3, timestamp=ts(1)),
+                _user_message(1, timestamp=ts(30)),
+                _user_message(2, timestamp=ts(5)),
+                _user_message(9, chat_id=222, timestamp=ts(1)),
+            ],
+            4,
+        )
+        telegram_io.save_bot_response(store_path, chat_id=111, text="done", reply_to_message_ids=3)
+
+        rows = telegram_io.messages_for_chat(store_path, 111)
+        self.assertEqual(rows[0]["type"], "bot")
+        self.assertEqual([m["message_id"] for m in rows[1:]], [3, 2, 1])
+
+        rows = telegram_io.messages_for_chat(store_path, 111, since=now - timedelta(hours=24), roles=("user",))
+        self.assertEqual([m["message_id"] for m in rows], [3, 2])
+
+        rows = telegram_io.messages_for_chat(store_path, 111, until=ts(2), limit=1)
+        self.assertEqual([m["message_id"] for m in rows], [2])
+        self.assertEqual(telegram_io.messages_for_chat(store_path, 333), [])
+
+        context = telegram_io.build_24h_context(None, current_message_id=3, store_path=store_path, chat_id=111)
+        self.assertIn("hello", context)
+        self.assertNotIn("BOT:", context)
+
+    def test_sharded_store_parity(self) -> None:
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "sharded"
+        store_path = str(self.root / "telegram_messages.json")
+        self._exercise_store(store_path, ordered=False)
+        self.assertEqual(telegram_io.open_message_store(store_path).backend, "sharded")
+
+    def test_sharded_writes_only_touch_own_chat(self) -> None:
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "sharded"
+        store_path = str(self.root / "telegram_messages.json")
+        messages = [_user_message(1, chat_id=111), _user_message(2, chat_id=222)]
+        telegram_io.append_messages_to_store(store_path, messages, 2)
+        shard_dir = self.root / "telegram_messages.shards"
+        other = shard_dir / "chat_222.json"
+        before = other.stat().st_mtime_ns
+        version = telegram_io.pending_version(store_path)
+
+        self.assertEqual(telegram_io.mark_messages_processed(store_path, 1), 1)
+        telegram_io.save_bot_response(store_path, chat_id=111, text="done", reply_to_message_ids=1)
+
+        self.assertEqual(other.stat().st_mtime_ns, before)
+        self.assertNotEqual(telegram_io.pending_version(store_path), version)
+        self.assertEqual([m["message_id"] for m in telegram_io.get_pending_messages(store_path)], [2])
+        self.assertEqual(json.loads((shard_dir / "offset.json").read_text(encoding="utf-8"))["last_update_id"], 2)
+        self.assertEqual(len(telegram_io.messages_for_chat(store_path, 111)), 2)
+
+    def test_sharded_pending_version_never_goes_back(self) -> None:
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "sharded"
+        store_path = str(self.root / "telegram_messages.json")
+        shard_dir = self.root / "telegram_messages.shards"
+        seen = []
+        for message_id, chat_id in ((1, 111), (2, 222), (3, 222)):
+            telegram_io.append_messages_to_store(store_path, [_user_message(message_id, chat_id=chat_id)], message_id)
+            seen.append(telegram_io.pending_version(store_path))
+
+        for path in shard_dir.glob("chat_222.json*"):
+            path.unlink()
+        seen.append(telegram_io.pending_version(store_path))
+        self.assertEqual(telegram_io.mark_messages_processed(store_path, 1, chat_id=222), 0)
+        self.assertEqual(telegram_io.mark_messages_processed(store_path, 1, chat_id=111), 1)
+        seen.append(telegram_io.pending_version(store_path))
+
+        self.assertEqual(seen, sorted(seen))
+        self.assertGreater(seen[-1], seen[2])
+
+    def test_mark_processed_is_scoped_to_chat(self) -> None:
+        for store_path in (str(self.root / "telegram_messages.json"), str(self.root / "store.sqlite3")):
+            os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+            telegram_io.append_messages_to_store(
+                store_path, [_user_message(7, chat_id=111), _user_message(7, chat_id=222)], 1
+            )
+            self.assertEqual(telegram_io.mark_messages_processed(store_path, 7, chat_id=222), 1)
+            self.assertEqual([m["chat_id"] for m in telegram_io.get_pending_messages(store_path)], [111])
+
+    def test_sharded_migrates_single_file_store(self) -> None:
+        json_path = self.root / "telegram_messages.json"
+        legacy = {"messages": [_user_message(1, chat_id=111), _user_message(2, chat_id=222)], "last_update_id": 9}
+        json_path.write_text(json.dumps(legacy), encoding="utf-8")
+
+        preview = telegram_io.migrate_message_store_to_shards(str(json_path), apply=False)
+        self.assertEqual(preview["chats"], {"111": 1, "222": 1})
+        self.assertFalse((self.root / "telegram_messages.shards").exists())
+
+        os.environ["TELEGRAM_MESSAGE_STORE_BACKEND"] = "sharded"
+        store = telegram_io.open_message_store(str(json_path))
+        self.assertEqual(store.last_update_id(), 9)
+        self.assertEqual(sorted(m["message_id"] for m in store.pending()), [1, 2])
+        again = telegram_io.migrate_message_store_to_shards(str(json_path))
+        self.assertTrue(again["already_migrated"])
+        self.assertFalse(again["applied"])
+
+    def test_json_messages_for_chat(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        self._exercise_messages_for_chat(str(self.root / "telegram_messages.json"))
+
+    def test_sqlite_messages_for_chat(self) -> None:
+        self._exercise_messages_for_chat(str(self.root / "store.sqlite3"))
+
+    def test_json_chat_index_is_patched_by_writes(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        store_path = str(self.root / "telegram_messages.json")
+        old = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        telegram_io.append_messages_to_store(store_path, [_user_message(1, timestamp=old), _user_message(2)], 2)
+        telegram_io.messages_for_chat(store_path, 111)
+
+        def snapshot() -> list[tuple[object, ...]]:
+            return [
+                (m["message_id"], m["type"], m.get("processed"), m.get("chat_id"))
+                for chat_id in (111, 222)
+                for m in telegram_io.messages_for_chat(store_path, chat_id)
+            ]
+
+        parses = {"count": 0}
+        original_load = telegram_io._JsonMessageStore.load
+
+        def counting_load(store):
+            parses["count"] += 1
+            return original_load(store)
+
+        telegram_io._JsonMessageStore.load = counting_load
+        try:
+            telegram_io.append_messages_to_store(store_path, [_user_message(3), _user_message(4, chat_id=222)], 4)
+            telegram_io.mark_messages_processed(store_path, 2)
+            telegram_io.save_bot_response(store_path, chat_id=111, text="done", reply_to_message_ids=2)
+            telegram_io.open_message_store(store_path).prune(retention_days=7)
+            patched = snapshot()
+            self.assertEqual(parses["count"], 0)
+        finally:
+            telegram_io._JsonMessageStore.load = original_load
+
+        telegram_io._drop_chat_index(Path(store_path))
+        self.assertEqual(patched, snapshot())
+        self.assertEqual(
+            [(row[1], row[2]) for row in patched],
+            [("bot", True), ("user", False), ("user", True), ("user", False)],
+        )
+        self.assertEqual([row[0] for row in patched if row[1] == "user"], [3, 2, 4])
+
+        rows = telegram_io.messages_for_chat(store_path, 111, roles={"user"})
+        rows[0]["files"].append({"path": "mutated"})
+        self.assertEqual(telegram_io.messages_for_chat(store_path, 111, roles={"user"})[0]["files"], [])
+
+    def test_json_backfills_epoch_for_legacy_records(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        json_path = self.root / "telegram_messages.json"
+        old = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+        legacy = {"messages": [_user_message(1), _user_message(2, timestamp=old)], "last_update_id": 1}
+        json_path.write_text(json.dumps(legacy), encoding="utf-8")
+
+        result = telegram_io.open_message_store(str(json_path)).append([_user_message(3)], 3, retention_days=7)
+        self.assertEqual(result["removed"], 1)
+        stored = json.loads(json_path.read_text(encoding="utf-8"))["messages"]
+        self.assertEqual([m["message_id"] for m in stored], [1, 3])
+        self.assertTrue(all(isinstance(m.get("ts_epoch"), int) and m["ts_epoch"] > 0 for m in stored))
+
+    def _assert_secret_never_on_disk(self, store_path: str, secret: str) -> None:
+        telegram_io.append_messages_to_store(
+            store_path,
+            [_user_message(1, text=f"token {secret}", username=f"api_key={secret}")],
+            1,
+        )
+        telegram_io.save_bot_response(store_path, chat_id=111, text=f"echo {secret}", reply_to_message_ids=1)
+        telegram_io.mark_messages_processed(store_path, 1)
+        telegram_io.get_pending_messages(store_path)
+
+        stored = telegram_io.load_message_store(store_path)["messages"]
+        self.assertTrue(all(m.get("redacted") is True for m in stored))
+        files = [p for p in self.root.iterdir() if p.is_file()]
+        self.assertTrue(files)
+        for path in files:
+            self.assertNotIn(secret.encode(), path.read_bytes(), path.name)
+
+    def test_json_secret_never_reaches_disk(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        self._assert_secret_never_on_disk(str(self.root / "telegram_messages.json"), "123456789:" + "A" * 30)
+
+    def test_sqlite_secret_never_reaches_disk(self) -> None:
+        self._assert_secret_never_on_disk(str(self.root / "store.sqlite3"), "123456789:" + "A" * 30)
+
+    def test_json_legacy_unredacted_record_is_redacted_on_next_save(self) -> None:
+        os.environ.pop("TELEGRAM_MESSAGE_STORE_BACKEND", None)
+        json_path = self.root / "telegram_messages.json"
+        secret = "sk-" + "B" * 30
+        legacy = {"messages": [_user_message(1, text=f"key {secret}")], "last_update_id": 1}
+        json_path.write_text(json.dumps(legacy), encoding="utf-8")
+
+        telegram_io.append_messages_to_store(str(json_path), [_user_message(2)], 2)
+        self.assertNotIn(secret, json_path.read_text(encoding="utf-8"))
+        stored = telegram_io.load_message_store(str(json_path))["messages"]
+        self.assertEqual([m.get("redacted") for m in stored], [True, True])
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestTelegramUpdateReceiver(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store_path = str(Path(self._tmp.name) / "store.sqlite3")
+        self._original_receive_once = telegram_io.receive_once
+        self.calls: list[int] = []
+        batches = [([_user_message(1), _user_message(2)], 7)]
+
+        def fake_receive_once(runtime, last_update_id=0):
+            self.calls.append(int(last_update_id))
+            if batches:
+                return batches.pop(0)
+            time.sleep(0.05)
+            return [], int(last_update_id)
+
+        telegram_io.receive_once = fake_receive_once
+        runtime = {"work_dir": self._tmp.name, "logs_dir": self._tmp.name, "api_timeout_sec": 5.0}
+        self.receiver = telegram_io.TelegramUpdateReceiver(runtime, self.store_path, poll_timeout_sec=99)
+
+    def tearDown(self) -> None:
+        self.receiver.stop(timeout=2.0)
+        telegram_io.receive_once = self._original_receive_once
+        self._tmp.cleanup()
+
+    def test_receiver_persists_and_wakes(self) -> None:
+        self.assertEqual(self.receiver.poll_timeout_sec, 50)
+        self.assertGreater(self.receiver.runtime["api_timeout_sec"], 50)
+        self.receiver.start()
+        self.assertTrue(self.receiver.wait(5.0))
+        self.assertEqual([m["message_id"] for m in self.receiver.drain()], [1, 2])
+        self.assertEqual(self.receiver.drain(), [])
+        self.assertEqual(telegram_io.open_message_store(self.store_path).last_update_id(), 7)
+        deadline = time.monotonic() + 5.0
+        while len(self.calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.calls[:2], [0, 7])
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestPendingDownloads(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self._original_download_file = telegram_io._download_file
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+        def fake_download_file(runtime, file_id, message_id, file_type, preferred_name, timeout_sec=None):
+            with self._lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            try:
+                time.sleep(0.05)
+                if file_id == "broken":
+                    return None
+                return {"type": file_type, "path": f"/tmp/msg_{message_id}/{file_id}", "size": 1}
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+        telegram_io._download_file = fake_download_file
+        self.runtime = {
+            "work_dir": self._tmp.name,
+            "logs_dir": self._tmp.name,
+            "tasks_dir": self._tmp.name,
+            "api_timeout_sec": 5.0,
+            "download_concurrency": 2,
+            "download_timeout_sec": 5.0,
+        }
+
+    def tearDown(self) -> None:
+        telegram_io._download_file = self._original_download_file
+        self._tmp.cleanup()
+
+    def _album(self, message_id: int, file_ids: list[str]) -> dict[str, object]:
+        photo = {"photo": [{"file_id": "thumb"}, {"file_id": file_ids[0], "file_size": 42}]}
+        files = telegram_io._attachment_placeholders(photo)
+        for file_id in file_ids[1:]:
+            files += telegram_io._attachment_placeholders({"document": {"file_id": file_id, "file_name": f"{file_id}.txt"}})
+        return _user_message(message_id, files=files, download_pending=True)
+
+    def _exercise(self, store_path: str) -> None:
+        messages = [self._album(1, ["p1", "d1", "broken"]), self._album(2, ["p2", "d2"])]
+        telegram_io.append_messages_to_store(store_path, messages, 2)
+        version = telegram_io.pending_version(store_path)
+
+        resolved = telegram_io.resolve_pending_downloads(self.runtime, messages, store_path=store_path)
+
+        self.assertEqual(resolved, 2)
+        self.assertLessEqual(self.peak, 2)
+        self.assertGreater(telegram_io.pending_version(store_path), version)
+        stored = {m["message_id"]: m for m in telegram_io.get_pending_messages(store_path)}
+        for msg in messages + list(stored.values()):
+            self.assertNotIn("download_pending", msg)
+            self.assertTrue(all("path" in f and "file_id" not in f for f in msg["files"]))
+        self.assertEqual([f["type"] for f in stored[1]["files"]], ["photo", "document"])
+        self.assertEqual(stored[1]["files"][0]["size"], 42)
+        self.assertEqual(stored[1]["files"][1]["name"], "d1.txt")
+        self.assertEqual(telegram_io.resolve_pending_downloads(self.runtime, messages, store_path=store_path), 0)
+
+    def test_json_resolve_pending_downloads(self) -> None:
+        self._exercise(str(self.root / "telegram_messages.json"))
+
+    def test_sqlite_resolve_pending_downloads(self) -> None:
+        self._exercise(str(self.root / "store.sqlite3"))
+
+    def test_receiver_resolves_leftover_downloads_in_background(self) -> None:
+        store_path = str(self.root / "store.sqlite3")
+        telegram_io.append_messages_to_store(store_path, [self._album(1, ["p1"])], 1)
+        original_receive_once = telegram_io.receive_once
+
+        def idle_receive_once(runtime, last_update_id=0):
+            time.sleep(0.05)
+            return [], int(last_update_id)
+
+        telegram_io.receive_once = idle_receive_once
+        receiver = telegram_io.TelegramUpdateReceiver(self.runtime, store_path, poll_timeout_sec=1)
+        try:
+            receiver.start()
+            self.assertTrue(receiver.wait(5.0))
+            self.assertEqual([m["message_id"] for m in receiver.drain()], [1])
+        finally:
+            receiver.stop(timeout=2.0)
+            telegram_io.receive_once = original_receive_once
+        stored = telegram_io.get_pending_messages(store_path)
+        self.assertNotIn("download_pending", stored[0])
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestAttachmentCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self._original_download_file = telegram_io._download_file
+        self.downloads: list[str] = []
+
+        def fake_download_file(runtime, file_id, message_id, file_type, preferred_name, timeout_sec=None):
+            self.downloads.append(file_id)
+            task_dir = self.root / f"msg_{message_id}"
+            task_dir.mkdir(parents=True, exist_ok=True)
+            path = task_dir / (preferred_name or f"{file_type}_{message_id}.jpg")
+            path.write_bytes(file_id.encode("utf-8") * 200)
+            return {"type": file_type, "path": str(path), "size": path.stat().st_size}
+
+        telegram_io._download_file = fake_download_file
+        self.runtime = {
+            "logs_dir": self._tmp.name,
+            "tasks_dir": self._tmp.name,
+            "api_timeout_sec": 5.0,
+            "attachment_cache_dir": str(self.root / ".file_cache"),
+            "attachment_cache_max_bytes": 1000,
+        }
+
+    def tearDown(self) -> None:
+        telegram_io._download_file = self._original_download_file
+        self._tmp.cleanup()
+
+    def _photo_message(self, message_id: int, file_id: str, unique_id: str) -> dict[str, object]:
+        files = telegram_io._attachment_placeholders({"photo": [{"file_id": file_id, "file_unique_id": unique_id}]})
+        return _user_message(message_id, files=files, download_pending=True)
+
+    def test_repeated_file_unique_id_is_copied_from_cache(self) -> None:
+        first = self._photo_message(1, "fileA", "uniqA")
+        second = self._photo_message(2, "fileA-resent", "uniqA")
+        telegram_io.resolve_pending_downloads(self.runtime, [first])
+        telegram_io.resolve_pending_downloads(self.runtime, [second])
+
+        self.assertEqual(self.downloads, ["fileA"])
+        path = Path(second["files"][0]["path"])
+        self.assertEqual(path, self.root / "msg_2" / "image_2.jpg")
+        self.assertEqual(path.read_bytes(), Path(first["files"][0]["path"]).read_bytes())
+        self.assertNotIn("file_unique_id", second["files"][0])
+        stats = telegram_io.attachment_cache_stats(self.runtime["attachment_cache_dir"])
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (1, 1, 1))
+
+    def test_editing_a_task_file_does_not_touch_the_cache(self) -> None:
+        first = self._photo_message(1, "fileA", "uniqA")
+        telegram_io.resolve_pending_downloads(self.runtime, [first])
+        original = Path(first["files"][0]["path"]).read_bytes()
+        Path(first["files"][0]["path"]).write_bytes(b"cropped")
+
+        second = self._photo_message(2, "fileA-resent", "uniqA")
+        telegram_io.resolve_pending_downloads(self.runtime, [second])
+        path = Path(second["files"][0]["path"])
+        path.write_bytes(b"annotated")
+
+        third = self._photo_message(3, "fileA-again", "uniqA")
+        telegram_io.resolve_pending_downloads(self.runtime, [third])
+        self.assertEqual(self.downloads, ["fileA"])
+        self.assertEqual(Path(third["files"][0]["path"]).read_bytes(), original)
+
+    def test_corrupt_blob_is_redownloaded(self) -> None:
+        first = self._photo_message(1, "fileA", "uniqA")
+        telegram_io.resolve_pending_downloads(self.runtime, [first])
+        blob = Path(self.runtime["attachment_cache_dir"]) / "un" / "uniqA"
+        blob.write_bytes(b"x" * blob.stat().st_size)
+
+        second = self._photo_message(2, "fileA-resent", "uniqA")
+        telegram_io.resolve_pending_downloads(self.runtime, [second])
+
+        self.assertEqual(self.downloads, ["fileA", "fileA-resent"])
+        self.assertEqual(Path(second["files"][0]["path"]).read_bytes(), b"fileA-resent" * 200)
+
+    def test_cache_evicts_least_recently_used(self) -> None:
+        for message_id, unique_id in enumerate(["u1", "u2", "u3"], start=1):
+            msg = self._photo_message(message_id, f"f{message_id}", unique_id)
+            telegram_io.resolve_pending_downloads(self.runtime, [msg])
+            time.sleep(0.01)
+
+        stats = telegram_io.attachment_cache_stats(self.runtime["attachment_cache_dir"])
+        self.assertEqual(stats["entries"], 2)
+        self.assertLessEqual(stats["bytes"], 1000)
+        again = self._photo_message(9, "f1-again", "u1")
+        telegram_io.resolve_pending_downloads(self.runtime, [again])
+        self.assertEqual(self.downloads[-1], "f1-again")
+
+
+class _FakeResponse:
+    def __init__(self, status_code: int, payload: dict[str, object]) -> None:
+        self.status_code = status_code
+        self._payload = payload
+        self.text = json.dumps(payload)
+        self.headers: dict[str, str] = {}
+
+    def json(self) -> dict[str, object]:
+        return self._payload
+
+
+class _FakeSession:
+    def __init__(self, responses: list[_FakeResponse]) -> None:
+        self.responses = responses
+        self.calls: list[float] = []
+
+    def post(self, url, json=None, data=None, files=None, timeout=None):
+        self.calls.append(time.monotonic())
+        return self.responses.pop(0)
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestSendScheduler(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._original_session = telegram_io._HTTP_SESSION
+        self.runtime = {
+            "api_base": f"https://example.invalid/bot-{id(self)}",
+            "api_timeout_sec": 5.0,
+            "logs_dir": self._tmp.name,
+        }
+
+    def tearDown(self) -> None:
+        telegram_io._HTTP_SESSION = self._original_session
+        telegram_io._SEND_SCHEDULERS.pop(self.runtime["api_base"], None)
+        self._tmp.cleanup()
+
+    def test_chat_bucket_spaces_sends_but_not_other_chats(self) -> None:
+        scheduler = telegram_io._SendScheduler(global_per_sec=30.0, chat_per_sec=2.0, group_per_min=20.0)
+        self.assertEqual(scheduler.reserve(1), 0.0)
+        self.assertAlmostEqual(scheduler.reserve(1), 0.5, delta=0.05)
+        self.assertEqual(scheduler.reserve(2), 0.0)
+        self.assertEqual(scheduler.reserve(-100), 0.0)
+        self.assertAlmostEqual(scheduler.reserve(-100), 3.0, delta=0.05)
+
+    def test_retry_after_blocks_only_that_chat(self) -> None:
+        scheduler = telegram_io._SendScheduler(global_per_sec=30.0, chat_per_sec=30.0, group_per_min=600.0)
+        scheduler.block(1, 5.0)
+        self.assertGreater(scheduler.reserve(1), 4.0)
+        self.assertLess(scheduler.reserve(2), 0.1)
+
+    def test_chat_action_does_not_take_a_send_slot(self) -> None:
+        telegram_io._HTTP_SESSION = _FakeSession([_FakeResponse(200, {"ok": True, "result": True})] * 3)
+        scheduler = telegram_io._SendScheduler(global_per_sec=30.0, chat_per_sec=0.5, group_per_min=20.0)
+        telegram_io._SEND_SCHEDULERS[self.runtime["api_base"]] = scheduler
+        for _ in range(3):
+            telegram_io._telegram_request(self.runtime, "sendChatAction", {"chat_id": 1, "action": "typing"})
+        self.assertEqual(scheduler.reserve(1), 0.0)
+
+    def test_429_is_retried_without_consuming_attempts(self) -> None:
+        session = _FakeSession(
+            [
+                _FakeResponse(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 0.2}}),
+                _FakeResponse(200, {"ok": True, "result": {"message_id": 5}}),
+            ]
+        )
+        telegram_io._HTTP_SESSION = session
+        result = telegram_io._telegram_request(
+            self.runtime, "sendMessage", {"chat_id": 1, "text": "hi"}, max_attempts_override=1
+        )
+        self.assertEqual(result["result"], {"message_id": 5})
+        self.assertEqual(len(session.calls), 2)
+        self.assertGreaterEqual(session.calls[1] - session.calls[0], 0.2)
+
+    def test_429_beyond_max_wait_fails_as_rate_limited(self) -> None:
+        telegram_io._HTTP_SESSION = _FakeSession(
+            [_FakeResponse(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 600}})]
+        )
+        result = telegram_io._telegram_request(self.runtime, "sendMessage", {"chat_id": 3, "text": "hi"})
+        self.assertIsNone(result)
+        last_error = self.runtime["_telegram_last_error"]
+        self.assertEqual((last_error["kind"], last_error["retry_after"]), ("rate_limited", 600.0))
+
+    def test_send_files_groups_media_and_reports_per_file(self) -> None:
+        class _UploadSession:
+            def __init__(self) -> None:
+                self.lock = threading.Lock()
+                self.calls: list[tuple[str, int]] = []
+
+            def post(self, url, json=None, data=None, files=None, timeout=None):
+                method = url.rsplit("/", 1)[-1]
+                with self.lock:
+                    self.calls.append((method, len(files or {})))
+                if method == "sendDocument" and "broken" in files["document"][0]:
+                    return _FakeResponse(400, {"ok": False, "description": "Bad Request"})
+                if method == "sendMediaGroup" and any("broken" in f[0] for f in files.values()):
+                    return _FakeResponse(400, {"ok": False, "description": "Bad Request"})
+                return _FakeResponse(200, {"ok": True, "result": {"message_id": 1}})
+
+        tmp = Path(self._tmp.name)
+        paths = []
+        for idx in range(12):
+            path = tmp / f"chart{idx}.png"
+            path.write_bytes(b"png")
+            paths.append(str(path))
+        for name in ("report.pdf", "broken.zip"):
+            (tmp / name).write_bytes(b"doc")
+            paths.append(str(tmp / name))
+        paths.append(str(tmp / "missing.txt"))
+
+        session = _UploadSession()
+        telegram_io._HTTP_SESSION = session
+        telegram_io._SEND_SCHEDULERS[self.runtime["api_base"]] = telegram_io._SendScheduler(
+            global_per_sec=1000.0, chat_per_sec=1000.0, group_per_min=60000.0
+        )
+        outcome = telegram_io.send_files(
+            self.runtime, chat_id=1, text="files", file_paths=paths, compress_photos=True
+        )
+
+        self.assertFalse(outcome["ok"])
+        self.assertEqual([r["path"] for r in outcome["results"]], paths)
+        self.assertEqual([r["method"] for r in outcome["results"][:10]], ["sendMediaGroup"] * 10)
+        self.assertEqual(
+            [(r["ok"], r["method"]) for r in outcome["results"][10:]],
+            [(True, "sendMediaGroup"), (True, "sendMediaGroup"), (True, "sendDocument"),
+             (False, "sendDocument"), (False, None)],
+        )
+        self.assertEqual(outcome["results"][-1]["error"], {"kind": "missing"})
+        self.assertIn(("sendMediaGroup", 10), session.calls)
+        self.assertIn(("sendMediaGroup", 2), session.calls)
+
+    def test_send_files_defaults_to_documents_and_resends_only_rejected_uploads(self) -> None:
+        class _UploadSession:
+            def __init__(self, status_code: int) -> None:
+                self.status_code = status_code
+                self.calls: list[str] = []
+
+            def post(self, url, json=None, data=None, files=None, timeout=None):
+                method = url.rsplit("/", 1)[-1]
+                self.calls.append(method)
+                if method in ("sendPhoto", "sendMediaGroup"):
+                    return _FakeResponse(self.status_code, {"ok": False, "description": "error"})
+                return _FakeResponse(200, {"ok": True, "result": {"message_id": 1}})
+
+        tmp = Path(self._tmp.name)
+        image = tmp / "chart.png"
+        image.write_bytes(b"png")
+        telegram_io._SEND_SCHEDULERS[self.runtime["api_base"]] = telegram_io._SendScheduler(
+            global_per_sec=1000.0, chat_per_sec=1000.0, group_per_min=60000.0
+        )
+
+        session = _UploadSession(400)
+        telegram_io._HTTP_SESSION = session
+        self.assertTrue(telegram_io.send_files_raw(self.runtime, chat_id=1, text="t", file_paths=[str(image)]))
+        self.assertEqual(session.calls, ["sendMessage", "sendDocument"])
+
+        session = _UploadSession(400)
+        telegram_io._HTTP_SESSION = session
+        outcome = telegram_io.send_files(
+            self.runtime, chat_id=1, text="t", file_paths=[str(image)], compress_photos=True
+        )
+        self.assertTrue(outcome["ok"])
+        self.assertEqual(session.calls, ["sendMessage", "sendPhoto", "sendDocument"])
+
+        # A 5xx may follow a delivered upload, so neither a photo nor a group is resent.
+        session = _UploadSession(502)
+        telegram_io._HTTP_SESSION = session
+        outcome = telegram_io.send_files(
+            self.runtime, chat_id=1, text="t", file_paths=[str(image), str(image)], compress_photos=True
+        )
+        self.assertFalse(outcome["ok"])
+        self.assertEqual(session.calls, ["sendMessage", "sendMediaGroup"])
+        self.assertEqual([r["method"] for r in outcome["results"]], ["sendMediaGroup"] * 2)
+        outcome = telegram_io.send_files(
+            self.runtime, chat_id=1, text="t", file_paths=[str(image)], compress_photos=True
+        )
+        self.assertFalse(outcome["ok"])
+        self.assertEqual(session.calls[-1], "sendPhoto")
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestHttpPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self._original = (telegram_io._HTTP_SESSION, telegram_io._HTTP_POOL)
+        telegram_io._HTTP_SESSION = None
+        telegram_io._HTTP_POOL = None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        telegram_io._HTTP_SESSION, telegram_io._HTTP_POOL = self._original
+
+    def test_api_and_file_pools_reuse_connections_and_reap_idle(self) -> None:
+        for _ in range(4):
+            for path in ("/botX/getMe", "/file/botX/doc.bin"):
+                url = self.base + path
+                telegram_io._get_http_session(url).get(url, timeout=5).close()
+        stats = telegram_io.http_pool_stats()
+        self.assertEqual(sorted(pool["kind"] for pool in stats["pools"]), ["api", "file"])
+        self.assertEqual((stats["requests"], stats["new_connections"]), (8, 2))
+        self.assertEqual(stats["reuse_rate"], 0.75)
+        self.assertNotIn("botX", json.dumps(stats))
+
+        telegram_io._HTTP_POOL.idle_timeout_sec = 0.01
+        telegram_io._HTTP_POOL._last_reap = 0.0
+        time.sleep(0.02)
+        telegram_io._get_http_session(self.base + "/botX/getMe")
+        stats = telegram_io.http_pool_stats()
+        self.assertEqual(stats["reaped"], 1)
+        file_pool = next(pool for pool in stats["pools"] if pool["kind"] == "file")
+        self.assertEqual(file_pool["open_connections"], 0)
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestTelegramHostCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.work_dir = Path(self._tmp.name)
+        self._saved = {
+            name: getattr(telegram_io, name)
+            for name in (
+                "_test_telegram_host",
+                "_start_host_reprobe",
+                "_resolve_via_doh_google",
+                "_resolve_via_doh_cloudflare",
+                "_HTTP_SESSION",
+            )
+        }
+        self.probed: list[str] = []
+        telegram_io._start_host_reprobe = lambda *args, **kwargs: False
+        self._pinned_host = os.environ.pop("TELEGRAM_API_HOST", None)
+
+    def tearDown(self) -> None:
+        if self._pinned_host is not None:
+            os.environ["TELEGRAM_API_HOST"] = self._pinned_host
+        for name, value in self._saved.items():
+            setattr(telegram_io, name, value)
+        telegram_io._HOST_CACHES.clear()
+        telegram_io._HOST_FAILOVER.clear()
+        self._tmp.cleanup()
+
+    def _probe(self, healthy: set[str]):
+        def probe(host: str, token: str, timeout_sec: float) -> bool:
+            self.probed.append(host)
+            return host in healthy
+
+        return probe
+
+    def test_fresh_cache_skips_probing(self) -> None:
+        fallback_ip = telegram_io.TELEGRAM_API_FALLBACK_IPS[0]
+        telegram_io._test_telegram_host = self._probe({fallback_ip})
+        telegram_io._resolve_via_doh_google = telegram_io._resolve_via_doh_cloudflare = lambda domain: None
+        host = telegram_io._determine_telegram_api_host(self.work_dir, "t", 1.0)
+        self.assertEqual(host, fallback_ip)
+        self.assertEqual(self.probed, [telegram_io.TELEGRAM_API_DOMAIN, fallback_ip])
+        cache_file = self.work_dir / telegram_io.HOST_CACHE_FILENAME
+        self.assertEqual(json.loads(cache_file.read_text(encoding="utf-8"))["hosts"][fallback_ip]["failures"], 0)
+
+        telegram_io._HOST_CACHES.clear()
+        self.probed.clear()
+        telegram_io._test_telegram_host = self._probe(set())
+        self.assertEqual(telegram_io._determine_telegram_api_host(self.work_dir, "t", 1.0), fallback_ip)
+        self.assertEqual(self.probed, [])
+
+    def test_connection_error_fails_over_within_one_request(self) -> None:
+        class _FlakyHostSession:
+            def __init__(self) -> None:
+                self.urls: list[str] = []
+
+            def post(self, url, json=None, data=None, files=None, timeout=None):
+                self.urls.append(url)
+                if "://bad.example/" in url:
+                    raise telegram_io.requests.exceptions.ConnectionError("unreachable")
+                return _FakeResponse(200, {"ok": True, "result": {"id": 1}})
+
+        cache = telegram_io._host_cache(self.work_dir / "hosts.json")
+        cache.record("bad.example", 20.0)
+        cache.record("good.example", 80.0)
+        session = _FlakyHostSession()
+        telegram_io._HTTP_SESSION = session
+        runtime = {
+            "api_host": "bad.example",
+            "api_host_cache_file": str(self.work_dir / "hosts.json"),
+            "api_base": "https://bad.example/botT",
+            "api_timeout_sec": 5.0,
+            "logs_dir": self._tmp.name,
+        }
+        result = telegram_io._telegram_request(runtime, "getMe", max_attempts_override=1)
+        self.assertEqual(result["result"], {"id": 1})
+        self.assertEqual(session.urls, ["https://bad.example/botT/getMe", "https://good.example/botT/getMe"])
+        self.assertEqual(telegram_io._effective_base(dict(runtime), "api_base"), "https://good.example/botT")
+        self.assertEqual(cache.best(), "good.example")
+
+    def test_shared_cache_file_keeps_other_writers_hosts(self) -> None:
+        path = self.work_dir / "shared_hosts.json"
+        first = telegram_io._TelegramHostCache(path, 60.0)
+        second = telegram_io._TelegramHostCache(path, 60.0)
+        first.record("a.example", 10.0)
+        first.save()
+        second.record("b.example", 20.0)
+        second.record("a.example", None)
+        second.save()
+        first.record("c.example", 30.0)
+        first.save()
+
+        hosts = json.loads(path.read_text(encoding="utf-8"))["hosts"]
+        self.assertEqual(sorted(hosts), ["a.example", "b.example", "c.example"])
+        self.assertEqual(hosts["a.example"]["failures"], 1)
+        self.assertFalse(first.is_healthy("a.example"))
+
+    def _failover_runtime(self) -> dict[str, object]:
+        return {
+            "api_host": "a.example",
+            "api_host_cache_file": str(self.work_dir / "hosts.json"),
+            "api_base": "https://a.example/botT",
+            "logs_dir": self._tmp.name,
+        }
+
+    def test_concurrent_failures_on_one_host_switch_once(self) -> None:
+        cache = telegram_io._host_cache(self.work_dir / "hosts.json")
+        for host, latency in (("a.example", 10.0), ("b.example", 20.0), ("c.example", 30.0)):
+            cache.record(host, latency)
+        cache.record("149.154.167.220", None)
+        runtime = self._failover_runtime()
+
+        targets = [telegram_io._telegram_host_failover(runtime, "a.example") for _ in range(3)]
+
+        self.assertEqual(targets, ["b.example"] * 3)
+        self.assertTrue(cache.is_healthy("b.example"))
+        self.assertTrue(cache.is_healthy("c.example"))
+        self.assertEqual(telegram_io._telegram_host_failover(runtime, "b.example"), "c.example")
+        self.assertEqual(telegram_io._active_api_host(runtime), "c.example")
+
+    def test_reprobe_clears_failover_when_origin_recovers(self) -> None:
+        cache = telegram_io._host_cache(self.work_dir / "hosts.json")
+        cache.record("a.example", 10.0)
+        cache.record("b.example", 20.0)
+        runtime = self._failover_runtime()
+        self.assertEqual(telegram_io._telegram_host_failover(runtime, "a.example"), "b.example")
+
+        telegram_io._test_telegram_host = self._probe({"a.example", "b.example"})
+        telegram_io._resolve_via_doh_google = telegram_io._resolve_via_doh_cloudflare = lambda domain: None
+        telegram_io._reprobe_telegram_hosts(cache, "t", 1.0)
+
+        self.assertEqual(telegram_io._active_api_host(runtime), "a.example")
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestNetworkDiagnostics(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self._original_collect = telegram_io._collect_network_diagnostics
+        self._original_state = dict(telegram_io._NETWORK_DIAG)
+        telegram_io._NETWORK_DIAG.update(id=None, collected_at=0.0, snapshot=None, thread=None)
+        self.collects = 0
+
+        def slow_collect() -> dict[str, object]:
+            self.collects += 1
+            time.sleep(0.2)
+            return {"dns_lookup_ok": False}
+
+        telegram_io._collect_network_diagnostics = slow_collect
+        self.runtime = {"logs_dir": self._tmp.name}
+
+    def tearDown(self) -> None:
+        thread = telegram_io._NETWORK_DIAG.get("thread")
+        if thread is not None:
+            thread.join(timeout=2)
+        telegram_io._collect_network_diagnostics = self._original_collect
+        telegram_io._NETWORK_DIAG.clear()
+        telegram_io._NETWORK_DIAG.update(self._original_state)
+        self._tmp.cleanup()
+
+    def test_reference_is_returned_without_waiting_and_cached(self) -> None:
+        started = time.monotonic()
+        first = [telegram_io._network_diagnostics_ref(self.runtime) for _ in range(5)]
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(first[0], {"diag_id": None, "age_sec": None, "refreshing": True})
+        telegram_io._NETWORK_DIAG["thread"].join(timeout=2)
+
+        ref = telegram_io._network_diagnostics_ref(self.runtime)
+        self.assertTrue(ref["diag_id"].startswith("netdiag-"))
+        self.assertFalse(ref["refreshing"])
+        self.assertFalse(ref["dns_lookup_ok"])
+        self.assertEqual(self.collects, 1)
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestBufferedLogWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.logs_dir = Path(self._tmp.name) / "logs"
+        self._original_writer = telegram_io._LOG_WRITER
+        telegram_io._LOG_WRITER = telegram_io._BufferedLogWriter(flush_interval_sec=60.0, max_buffer_bytes=1 << 20)
+
+    def tearDown(self) -> None:
+        telegram_io._LOG_WRITER = self._original_writer
+        self._tmp.cleanup()
+
+    def test_records_are_buffered_redacted_and_flushed_to_day_file(self) -> None:
+        self.logs_dir.mkdir()
+        stale = self.logs_dir / "2000-01-01.log"
+        stale.write_text("old\n", encoding="utf-8")
+        runtime = {"logs_dir": str(self.logs_dir)}
+        token = "123456789:" + "A" * 35
+        for idx in range(3):
+            telegram_io._write_log(runtime, "send", "send_text_ok", {"idx": idx, "note": f"leaked {token} here"})
+        day_file = self.logs_dir / f"{datetime.now().strftime('%Y-%m-%d')}.log"
+        self.assertFalse(day_file.exists())
+
+        telegram_io.flush_logs()
+        records = [json.loads(line) for line in day_file.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([record["details"]["idx"] for record in records], [0, 1, 2])
+        self.assertNotIn(token, day_file.read_text(encoding="utf-8"))
+        self.assertFalse(stale.exists())
+
+        stale.write_text("old\n", encoding="utf-8")
+        telegram_io._write_log(runtime, "send", "send_text_ok", {"idx": 3})
+        telegram_io.flush_logs()
+        self.assertTrue(stale.exists(), "retention cleanup runs once per day, not per flush")
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestSplitTelegramText(unittest.TestCase):
+    def test_html_tags_are_closed_and_reopened(self) -> None:
+        text = "<b>Report &amp; notes</b>\n\n<code>" + ("x" * 30 + "\n") * 20 + "</code>"
+        chunks = telegram_io.split_telegram_text(text, 200, parse_mode="HTML")
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(telegram_io.telegram_text_length(chunk), 200)
+            self.assertEqual(chunk.count("<code>"), chunk.count("</code>"))
+            self.assertNotRegex(chunk, r"&[a-z]*$|<[^>]*$")
+        self.assertTrue(all(chunk.endswith("\n</code>") for chunk in chunks[:-1]))
+        stripped = "".join(chunks).replace("<code>", "").replace("</code>", "")
+        self.assertEqual(stripped, text.replace("<code>", "").replace("</code>", ""))
+
+    def test_counts_utf16_units_and_prefers_paragraphs(self) -> None:
+        emoji_chunks = telegram_io.split_telegram_text("\U0001F600" * 150, 100)
+        self.assertEqual([len(chunk) for chunk in emoji_chunks], [50, 50, 50])
+        text = "a" * 60 + "\n\n" + "b" * 30 + "\n" + "c" * 30
+        self.assertEqual(telegram_io.split_telegram_text(text, 100)[0], "a" * 60 + "\n\n")
+
+
+@unittest.skipIf(telegram_io is None, f"telegram_io import failed: {_IMPORT_ERROR}")
+class TestTelegramOutbox(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.outbox = telegram_io.TelegramOutbox(Path(self._tmp.name) / "outbox.sqlite3")
+        self.runtime = {"logs_dir": self._tmp.name}
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_idempotency_key_dedupes(self) -> None:
+        key = telegram_io.outbox_idempotency_key("final", 1, 10, 11, "done")
+        first = self.outbox.enqueue(1, {"text": "done"}, idem_key=key)
+        second = self.outbox.enqueue(1, {"text": "done"}, idem_key=key)
+        self.assertEqual(first, second)
+        self.assertEqual(self.outbox.backlog(), 1)
+
+    def test_claims_only_chat_heads(self) -> None:
+        for chat_id, text in [(1, "a1"), (1, "a2"), (2, "b1")]:
+            self.outbox.enqueue(chat_id, {"text": text})
+        claimed = self.outbox.claim(limit=10)
+        self.assertEqual(sorted(item["payload"]["text"] for item in claimed), ["a1", "b1"])
+        self.assertEqual(self.outbox.claim(limit=10), [])
+        self.assertEqual(self.outbox.recover(), 2)
+        self.assertEqual([item["payload"]["text"] for item in self.outbox.claim(limit=1)], ["a1"])
+
+    def test_coalesce_key_replaces_pending_update(self) -> None:
+        first = self.outbox.enqueue(1, {"text": "10%"}, coalesce_key="progress:1:t")
+        second = self.outbox.enqueue(1, {"text": "50%"}, coalesce_key="progress:1:t")
+        self.assertEqual(first, second)
+        claimed = self.outbox.claim(limit=10)
+        self.assertEqual([item["payload"]["text"] for item in claimed], ["50%"])
+        third = self.outbox.enqueue(1, {"text": "90%"}, coalesce_key="progress:1:t")
+        self.assertNotEqual(third, first)
+
+    def test_worker_retries_in_chat_order(self) -> None:
+        for text in ["first", "second"]:
+            self.outbox.enqueue(1, {"text": text})
+        delivered: list[str] = []
+        failures = {"first": 1}
+
+        def deliver(item):
+            text = item["payload"]["text"]
+            if failures.get(text, 0) > 0:
+                failures[text] -= 1
+                raise ConnectionError("network down")
+            delivered.append(text)
+            return True
+
+        worker = telegram_io.TelegramOutboxWorker(
+            self.outbox, deliver, self.runtime, max_attempts=3, retry_delay_sec=0.05
+        )
+        worker.run_once()
+        self.assertEqual(delivered, [])
+        time.sleep(0.06)
+        worker.run_once()
+        self.assertEqual(delivered, ["first", "second"])
+        self.assertEqual(self.outbox.counts()["sent"], 2)
+
+    def test_worker_gives_up_after_max_attempts(self) -> None:
+        self.outbox.enqueue(1, {"text": "doomed"})
+        self.outbox.enqueue(1, {"text": "next"})
+        delivered: list[str] = []
+
+        def deliver(item):
+            if item["payload"]["text"] == "doomed":
+                return False
+            delivered.append(item["payload"]["text"])
+            return True
+
+        worker = telegram_io.TelegramOutboxWorker(self.outbox, deliver, self.runtime, max_attempts=1)
+        worker.run_once()
+        self.assertEqual(delivered, ["next"])
+        self.assertEqual(self.outbox.counts()["failed"], 1)
+
+    def test_worker_keeps_retrying_replies_past_max_attempts(self) -> None:
+        self.outbox.enqueue(1, {"text": "answer", "reply_to_message_ids": [10]})
+
+        worker = telegram_io.TelegramOutboxWorker(
+            self.outbox, lambda item: False, self.runtime, max_attempts=1, retry_delay_sec=0.05
+        )
+        worker.run_once()
+        time.sleep(0.06)
+        worker.run_once()
+
+        counts = self.outbox.counts()
+        self.assertEqual(counts["failed"], 0)
+        self.assertEqual(counts["pending"], 1)
+
+    def test_rejected_reply_fails_at_once_and_unblocks_the_chat(self) -> None:
+        self.outbox.enqueue(1, {"text": "answer", "reply_to_message_ids": [10]})
+        self.outbox.enqueue(1, {"text": "next"})
+        delivered: list[str] = []
+        failed: list[tuple[str, str]] = []
+
+        def deliver(item):
+            runtime = {"_telegram_last_error": {"kind": "http", "status_code": 403}}
+            if item["payload"]["text"] == "answer":
+                if telegram_io.is_permanent_send_error(runtime["_telegram_last_error"]):
+                    raise telegram_io.OutboxDeliveryRejected("Forbidden: bot was blocked by the user")
+                return False
+            delivered.append(item["payload"]["text"])
+            return True
+
+        worker = telegram_io.TelegramOutboxWorker(
+            self.outbox,
+            deliver,
+            self.runtime,
+            max_attempts=3,
+            on_failed=lambda item, error: failed.append((item["payload"]["text"], error)),
+        )
+        worker.run_once()
+
+        self.assertEqual(delivered, ["next"])
+        self.assertEqual(failed, [("answer", "rejected: Forbidden: bot was blocked by the user")])
+        self.assertEqual(self.outbox.backlog(), 0)
+        self.assertFalse(telegram_io.is_permanent_send_error({"kind": "http", "status_code": 429}))
+        self.assertFalse(telegram_io.is_permanent_send_error({"kind": "http", "status_code": 502}))
+
+    def test_background_worker_delivers_on_notify(self) -> None:
+        delivered = threading.Event()
+        worker = telegram_io.TelegramOutboxWorker(
+            self.outbox, lambda item: delivered.set() or True, self.runtime
+        )
+        worker.start()
+        try:
+            self.outbox.enqueue(5, {"text": "hi"})
+            worker.notify()
+            self.assertTrue(delivered.wait(5.0))
+        finally:
+            worker.stop(timeout=2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()